@@ -452,6 +452,9 @@ eg("""
  canvas.doForm()
  canvas.beginForm(name, lowerx=0, lowery=0, upperx=None, uppery=None)
  canvas.endForm()
+ canvas.deferForm(name, func, lowerx=0, lowery=0, upperx=None, uppery=None)
+ canvas.drawDeferredString(x, y, text, align='left')
+ canvas.setDeferredValue(name, value)
  canvas.linkAbsolute(contents, destinationname, Rect=None, addtopage=1, name=None, **kw)
  canvas.linkRect(contents, destinationname, Rect=None, addtopage=1, relative=1, name=None, **kw)
  canvas.getPageNumber()
@@ -463,6 +466,15 @@ eg("""
                         direction=0,dimension='H',motion='I')
 """)
 
+disc("""
+$drawDeferredString$ draws text whose $%(name)s$ fields are only filled in when the
+document is saved, so a footer such as $"Page %(page)s of %(pageCount)s"$ no
+longer needs the whole document buffered in a canvas subclass.  $page$ and
+$pageCount$ are always available; other fields are set with $setDeferredValue$,
+whose value may be a callable taking the canvas.  Each distinct text and style
+shares a single form, and pages can still be streamed out as they are finished.
+""")
+
 
 heading2('Coordinates (default user space)')
 
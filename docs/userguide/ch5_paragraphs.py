@@ -158,7 +158,12 @@ TA_LEFT, TA_CENTER or TA_CENTRE, TA_RIGHT and
 TA_JUSTIFY, with values of 0, 1, 2 and 4 respectively.  These
 do exactly what you would expect.""")
 
-disc("""Set $wordWrap$ to $'CJK'$ to get Asian language linewrapping. For normal western text you can change the way
+disc("""Set $wordWrap$ to $'CJK'$ to get Asian language linewrapping. Setting $wordWrap$ to $'KP'$ uses Knuth-Plass
+line breaking which chooses the breaks for the whole paragraph at once to get more even spacing; if $hyphenation$
+is also set and the $pyHnj$ extension is available words may be hyphenated; $hyphenation$ may instead be a function
+returning the positions at which a lower case word may be hyphenated. Paragraphs which fit on one line or are neither
+justified nor hyphenated are broken as usual; even so $'KP'$ is several times slower than the normal line breaking so
+it is best kept for text which needs it rather than used for bulk output. For normal western text you can change the way
 the line breaking algorithm handles <i>widows</i> and <i>orphans</i> with the $allowWidows$ and $allowOrphans$ values.
 Both should normally be set to $0$, but for historical reasons we have allowed <i>widows</i>.
 The default color of the text can be set with $textColor$ and the paragraph background
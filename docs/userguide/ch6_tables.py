@@ -12,6 +12,24 @@ as a simple textual gridding mechanisms. The $longTable$ class uses a greedy alg
 when calculating column widths and is intended for long tables where speed counts.
 $Table$ cells can hold anything which can be converted to
 a <b>Python</b> $string$ or $Flowables$ (or lists of $Flowables$).
+When a table is split across frames the parts share the rows of the original
+table rather than copying them, so the work done for each page depends on the rows
+placed there and not on the length of the whole table.
+""")
+
+disc("""
+For listings too long to hold in memory, $StreamingTable$ takes an iterator of rows,
+such as a database cursor or $csv.reader$, and only reads as many rows as are needed
+to fill the current frame.  Each part is laid out as a $LongTable$ with the
+$repeatRows$ header rows at the top, and the rows are dropped once drawn.
+The $style$ applies to each part as if it were a table of its own;
+$rowStyles$ gives $(test, commands)$ pairs applied to each body row for which
+$test(i,row)$ is true, with row 0 in the commands meaning that row.
+""")
+eg("""
+t = StreamingTable(csv.reader(open('listing.csv')), repeatRows=1,
+        style=[('GRID',(0,0),(-1,-1),0.25,colors.grey)],
+        rowStyles=[(lambda i,row: i%2, [('BACKGROUND',(0,0),(-1,0),colors.whitesmoke)])])
 """)
 
 disc("""
@@ -165,6 +183,9 @@ ROWBACKGROUNDS          - takes a list of colors to be used cyclically.
 COLBACKGROUNDS          - takes a list of colors to be used cyclically.
 VALIGN                  - takes one of TOP, MIDDLE or the default BOTTOM
 """)
+disc("""The cell formatting commands are kept as ranges; cells covered by the
+same commands share one cell style, so a large table costs memory in proportion
+to its style commands rather than its number of cells.""")
 disc("""This sets the background cell color in the relevant cells.
 The following example shows the $BACKGROUND$, and $TEXTCOLOR$ commands in action:""")
 EmbeddedCode("""
@@ -574,6 +595,17 @@ eg("""
 doc.multiBuild(story)
 """)
 
+disc("""With $incremental=1$ the passes after the first do not start again from page one; the layout restarts at the
+beginning of the last page before the first table of contents or index whose entries changed and the earlier pages are kept.
+Pages which start inside a split flowable, a $KeepTogether$ or $keepWithNext$ group or while a page template
+cycle is running are not used as restart points.
+This helps most when the indexes are at the back of a long document. It relies on page numbers only being used
+through indexing flowables, and a full pass is made when a restart page is not known.""")
+
+eg("""
+doc.multiBuild(story, incremental=1)
+""")
+
 disc("""Below is a simple but working example of a document with a table of contents:""")
 
 eg('''
@@ -632,6 +664,12 @@ doc = MyDocTemplate('mintoc.pdf')
 doc.multiBuild(story)
 ''')
 
+disc("""If $toc.deferPageNumbers$ is set, the page numbers are drawn in fixed width fields (wide enough for
+$toc.pageNumberDigits$ figures, default 3) whose contents are form XObjects filled in only when the document is saved.
+Extra passes are then needed only when the entries themselves change and a table of contents preloaded with
+$addEntries$ needs just one pass. $SimpleIndex$ and $ReferenceText$ accept the same settings;
+an index placed after everything it indexes then needs a single pass.""")
+
 CPage(1)
 heading2("""$SimpleIndex()$""")
 disc("""
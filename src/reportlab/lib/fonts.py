@@ -86,8 +86,12 @@ def tt2ps(fn,b,i):
             return _tt2ps_map[K]
     raise ValueError("Can't find concrete font for family=%s, bold=%d, italic=%d" % (fn, b, i))
 
+mappingGeneration = 0  #changed by each addMapping so caches of mapped names can tell
+
 def addMapping(face, bold, italic, psname):
     'allow a custom font to be put in the mapping'
+    global mappingGeneration
     k = face.lower(), bold, italic
     _tt2ps_map[k] = psname
     _ps2tt_map[psname.lower()] = k
+    mappingGeneration += 1
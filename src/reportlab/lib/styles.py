@@ -113,6 +113,7 @@ class ParagraphStyle(PropertySet):
         'textColor': black,
         'backColor':None,
         'wordWrap':None,
+        'hyphenation':0,        #true (uses pyHnj) or word->hyphen positions function; needs wordWrap 'KP'
         'borderWidth': 0,
         'borderPadding': 0,
         'borderColor': None,
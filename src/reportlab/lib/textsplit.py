@@ -220,6 +220,200 @@ def kinsokuShoriSplit(word, widths, availWidth):
                 pass
     #to be completed
 
+#Knuth & Plass "Breaking Paragraphs into Lines" total fit line breaking.
+#A paragraph is a list of boxes (fixed width material), glues (stretchable space)
+#and penalties (possible breaks with a cost); the C versions live in _rl_accel.
+try:
+    from _rl_accel import Box, Glue, Penalty
+except ImportError:
+    try:
+        from reportlab.lib._rl_accel import Box, Glue, Penalty
+    except ImportError:
+        #if you modify these you need to modify _rl_accel Box
+        class _BoxItem:
+            is_box = is_glue = is_penalty = 0
+            width = stretch = shrink = penalty = 0
+            flagged = 0
+            character = None
+
+            def compute_width(self,r):
+                return self.width
+
+        class Box(_BoxItem):
+            'fixed width material eg a word'
+            is_box = 1
+            def __init__(self,width,character=None):
+                self.width = float(width)
+                self.character = character
+
+        class Glue(_BoxItem):
+            'space with a natural width which may stretch or shrink'
+            is_glue = 1
+            def __init__(self,width,stretch,shrink):
+                self.width = float(width)
+                self.stretch = float(stretch)
+                self.shrink = float(shrink)
+
+            def compute_width(self,r):
+                if r<0: return self.width+r*self.shrink
+                return self.width+r*self.stretch
+
+        class Penalty(_BoxItem):
+            'a possible break costing penalty; width is added to the line if we break here'
+            is_penalty = 1
+            def __init__(self,width,penalty,flagged=0):
+                self.width = float(width)
+                self.penalty = float(penalty)
+                self.flagged = int(flagged)
+
+KP_INFINITY = 10000     #penalties at least this big prevent a break; -KP_INFINITY forces one
+
+def knuthPlassBreaks(items, lineWidths, tolerance=200, linePenalty=10, flaggedDemerits=100, fitnessDemerits=100):
+    '''return the indices of the items chosen as breaks, minimizing the total demerits
+    of the paragraph, or None if no set of breaks has every line within tolerance.
+    items should end with a forced break; lineWidths is a width or a list of widths
+    whose last element is repeated as needed.
+    >>> items = [Box(10),Glue(5,5,0),Box(10),Glue(5,5,0),Box(10),Glue(0,1e5,0),Penalty(0,-KP_INFINITY)]
+    >>> knuthPlassBreaks(items, 25)
+    [3, 6]
+    '''
+    if not isinstance(lineWidths,(list,tuple)): lineWidths = [lineWidths]
+    lastLine = len(lineWidths)-1
+    n = len(items)
+
+    #running totals of width stretch and shrink before each item
+    W = [0]*(n+1)
+    Y = [0]*(n+1)
+    Z = [0]*(n+1)
+    B = []      #the possible breaks as (index, width, penalty, flagged)
+    w = y = z = 0
+    for i in xrange(n):
+        b = items[i]
+        W[i] = w
+        Y[i] = y
+        Z[i] = z
+        if b.is_box:
+            w += b.width
+        elif b.is_glue:
+            if i and items[i-1].is_box: B.append((i,0,0,0))  #glue is only a break after a box
+            w += b.width
+            y += b.stretch
+            z += b.shrink
+        elif b.penalty<KP_INFINITY:
+            B.append((i,b.width,b.penalty,b.flagged))
+    W[n] = w
+    Y[n] = y
+    Z[n] = z
+
+    rMax = (tolerance/100.0)**(1/3.0)   #the adjustment ratio giving badness tolerance
+    #an active node is [start, line, fitness, totalDemerits, previous, flagged]
+    active = [[0,0,1,0,None,0]]
+    for i, pw, p, fl in B:
+        Wi = W[i]+pw
+        Yi = Y[i]
+        Zi = Z[i]
+        best = {}
+        keep = []
+        for j in xrange(len(active)):
+            a = active[j]
+            s = a[0]
+            lw = lineWidths[a[1]]
+            L = Wi-W[s]
+            if L>lw:
+                z = Zi-Z[s]
+                if z<=0 or L-lw>z: continue     #overfull so no longer active
+                r = (lw-L)/z
+            elif L<lw:
+                y = Yi-Y[s]
+                if y>0:
+                    r = (lw-L)/y
+                else:
+                    r = KP_INFINITY
+            else:
+                r = 0
+            if p>-KP_INFINITY: keep.append(a)
+            if r>rMax:
+                if a[1]==lastLine<=1 and p>-KP_INFINITY:
+                    #later nodes start later on a line of the same width so are also too short
+                    keep.extend(active[j+1:])
+                    break
+                continue
+            if r<0:
+                badness = -100*r*r*r
+            else:
+                badness = 100*r*r*r
+            d = (linePenalty+badness)**2
+            if p>=0:
+                d += p*p
+            elif p>-KP_INFINITY:
+                d -= p*p
+            if fl and a[5]: d += flaggedDemerits
+            if r<-0.5:
+                c = 0
+            elif r<=0.5:
+                c = 1
+            elif r<=1:
+                c = 2
+            else:
+                c = 3
+            if c-a[2]>1 or a[2]-c>1: d += fitnessDemerits
+            d += a[3]
+            line = a[1]+1
+            if line>lastLine: line = lastLine
+            key = c,line
+            if key not in best or d<best[key][3]:
+                best[key] = [i+1,line,c,d,a,fl]
+        if best:
+            #a node ending here can only gain fitnessDemerits over another on the same line,
+            #so the worse ones can't be part of the best breaks and are dropped
+            least = {}
+            for a in best.itervalues():
+                if a[1] not in least or a[3]<least[a[1]]: least[a[1]] = a[3]
+            keys = best.keys()
+            keys.sort()
+            keep.extend([best[k] for k in keys if best[k][3]<=least[k[1]]+fitnessDemerits])
+        active = keep
+        if not active: return None
+
+    best = None
+    for a in active:
+        if a[0]==n and (best is None or a[3]<best[3]): best = a
+    if best is None: return None
+    breaks = []
+    while best[4] is not None:
+        breaks.append(best[0]-1)
+        best = best[4]
+    breaks.reverse()
+    return breaks
+
+_hyphenators = {}
+def getHyphenator(fn=None):
+    '''return a function giving the positions at which a lower case word may be hyphenated
+    or None if pyHnj or its pattern file is not available'''
+    if fn not in _hyphenators:
+        hyphenator = None
+        try:
+            import pyHnj
+        except ImportError:
+            pyHnj = None
+        if pyHnj:
+            import os
+            fnx = fn
+            if fnx is None:
+                fnx = os.path.join(os.path.dirname(__file__),'hyphen.mashed')
+            try:
+                if os.path.isfile(fnx):
+                    getCodes = pyHnj.Hyphen(fnx).getCodes
+                else:
+                    getCodes = pyHnj.Hyphen().getCodes
+            except IOError:
+                getCodes = None
+            if getCodes:
+                def hyphenator(word,getCodes=getCodes):
+                    return [i+1 for i,c in enumerate(getCodes(word)) if c in '13579']
+        _hyphenators[fn] = hyphenator
+    return _hyphenators[fn]
+
 # This recipe refers:
 #
 #  http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/148061
@@ -85,6 +85,7 @@ LINEENDDICT = {"LINEEND": LINEEND, "PERCENT": "%"}
 PDF_VERSION_DEFAULT = (1, 3)
 PDF_SUPPORT_VERSION = dict(     #map keyword to min version that supports it
     transparency = (1, 4),
+    objectStreams = (1, 5),
     )
 
 from types import InstanceType
@@ -142,12 +143,16 @@ class PDFDocument:
     # set this to define filters
     defaultStreamFilters = None
     encrypt = NoEncryption() # default no encryption
+    # set this false to stop identical streams, functions etc sharing one object
+    interning = 1
     def __init__(self,
                  dummyoutline=0,
                  compression=rl_config.pageCompression,
                  invariant=rl_config.invariant,
                  filename=None,
                  pdfVersion=PDF_VERSION_DEFAULT,
+                 streaming=0,
+                 objectStreams=0,
                  ):
         self._ID = None
         self.objectcounter = 0
@@ -162,6 +167,15 @@ class PDFDocument:
             self.invariant = invariant
         self.setCompression(compression)
         self._pdfVersion = pdfVersion
+        # if streaming is set finished pages are written to filename as they are added
+        self.streaming = streaming
+        self._filename = filename
+        self._File = self._sink = None
+        self._streamPending = []    #names of added pages not yet streamed out
+        # if objectStreams is set non-stream objects are packed into compressed
+        # object streams and the xref is written as a cross reference stream
+        self.objectStreams = objectStreams
+        self.compressionPolicy = compressionProfiles[rl_config.compressionProfile]
         # signature for creating PDF ID
         sig = self.signature = md5()
         sig.update("a reportlab document")
@@ -178,6 +192,10 @@ class PDFDocument:
         self.idToOffset = {}
         # number to id
         self.numberToId = {}
+        # content key to id for objects that may be shared
+        self._interned = {}
+        # id to object number for objects which will be defined later
+        self._reserved = {}
         cat = self.Catalog = self._catalog = PDFCatalog()
         pages = self.Pages = PDFPages()
         cat.Pages = pages
@@ -232,8 +250,9 @@ class PDFDocument:
         else :
             myfile = 1
             filename = utf8str(filename)
-            f = open(filename, "wb")
-        f.write(self.GetPDFData(canvas))
+            f = self._sink or open(filename, "wb")
+        # write the pieces directly rather than joining them into one big string
+        f.writelines(self._formatFile(canvas).strings)
         if myfile:
             f.close()
             import os
@@ -243,6 +262,14 @@ class PDFDocument:
         if getattr(canvas,'_verbosity',None): print 'saved', filename
 
     def GetPDFData(self, canvas):
+        return self._formatFile(canvas).format(self)
+
+    def _formatFile(self, canvas):
+        "prepare and format the document returning the PDFFile output collector"
+        self._flushPages()
+        # draw forms whose content was deferred until now; they may use fonts
+        drawDeferredForms = getattr(canvas,'_drawDeferredForms',None)
+        if drawDeferredForms: drawDeferredForms()
         # realize delayed fonts
         for fnt in self.delayedFonts:
             fnt.addObjects(self)
@@ -255,7 +282,7 @@ class PDFDocument:
         self.Reference(self.info)
         outline = self.outline
         outline.prepare(self, canvas)
-        return self.format()
+        return self._format()
 
     def inPage(self):
         """specify the current object as a page (enables reference binding and other page features)"""
@@ -300,6 +327,134 @@ class PDFDocument:
         self.Pages.addPage(page)
         self.pageCounter += 1
         self.inObject = None
+        pool = None
+        if page.compression and page.stream and not page.Override_default_compilation:
+            pool = _getCompressionPool()
+            if pool:
+                # start compressing now, layout carries on while it runs
+                page._zcompress = PDFStreamFilterZPending(pool.submit(self.compressionPolicy.compress, page.stream, 'page'))
+        if self.streaming:
+            # with background compression a page is written only when the next
+            # pages have been submitted so the threads compress several at once
+            self._streamPending.append(name)
+            self._flushPages(pool and pool.nThreads or 0)
+
+    def _getCheckpoint(self):
+        """return a snapshot of the document state from which layout can be
+        resumed with _restoreCheckpoint; only possible between pages"""
+        if self.streaming:
+            raise ValueError("cannot checkpoint a streaming document")
+        if self.inObject is not None:
+            raise ValueError("cannot checkpoint a document inside %s" % self.inObject)
+        from copy import deepcopy
+        fontStates = {}
+        for font in pdfmetrics._fonts.values():
+            state = getattr(font,'state',None)
+            if state is not None and self in state:
+                fontStates[font] = state[self].copy()
+        return dict(
+                objectcounter=self.objectcounter,
+                shadingCounter=self.shadingCounter,
+                pageCounter=self.pageCounter,
+                signature=self.signature.copy(),
+                idToObject=self.idToObject.copy(),
+                idToObjectNumberAndVersion=self.idToObjectNumberAndVersion.copy(),
+                numberToId=self.numberToId.copy(),
+                _interned=self._interned.copy(),
+                _reserved=self._reserved.copy(),
+                fontMapping=self.fontMapping.copy(),
+                delayedFonts=self.delayedFonts[:],
+                basicFonts=self.idToObject[BasicFonts].dict.copy(),
+                pages=self.Pages.pages[:],
+                catalog=self.Catalog.__dict__.copy(),
+                outline=deepcopy(self.outline.__dict__),
+                fontStates=fontStates,
+                )
+
+    def _restoreCheckpoint(self, cp):
+        "return the document to the state recorded by _getCheckpoint"
+        from copy import deepcopy
+        idToObject = cp['idToObject']
+        for name, obj in self.idToObject.iteritems():
+            if name not in idToObject and getattr(obj,__InternalName__,None)==name:
+                del obj.__InternalName__
+        for k in ('objectcounter','shadingCounter','pageCounter'):
+            setattr(self,k,cp[k])
+        self.signature = cp['signature'].copy()
+        for k in ('idToObject','idToObjectNumberAndVersion','numberToId','_interned','_reserved','fontMapping'):
+            setattr(self,k,cp[k].copy())
+        self.delayedFonts = cp['delayedFonts'][:]
+        self.idToObject[BasicFonts].dict = cp['basicFonts'].copy()
+        self.Pages.pages = cp['pages'][:]
+        self.Catalog.__dict__.clear()
+        self.Catalog.__dict__.update(cp['catalog'])
+        self.outline.__dict__.clear()
+        self.outline.__dict__.update(deepcopy(cp['outline']))
+        fontStates = cp['fontStates']
+        for font in pdfmetrics._fonts.values():
+            state = getattr(font,'state',None)
+            if state is not None:
+                if font in fontStates:
+                    state[self] = fontStates[font].copy()
+                elif self in state:
+                    del state[self]
+        self.inObject = None
+
+    def _streamingFile(self):
+        "return the output collector for streamed output, opening the sink if needed"
+        File = self._File
+        if File is None:
+            filename = self._filename
+            if hasattr(getattr(filename, "write",None),'__call__'):
+                sink = filename
+            else:
+                sink = self._sink = open(utf8str(filename), "wb")
+            File = self._File = PDFFile(self._pdfVersion,sink=sink)
+        return File
+
+    def _flushPages(self, keep=0):
+        "stream out all but the last keep pages waiting to be written"
+        P = self._streamPending
+        while len(P)>keep:
+            self._flushPage(P.pop(0))
+
+    def _flushPage(self, name):
+        """write a finished page and its content stream to the output sink
+        and release them. Only the xref offsets are kept."""
+        if not isinstance(self.encrypt,NoEncryption):
+            return  # the encryption key isn't known until the document is complete
+        idToOb = self.idToObject
+        page = idToOb[name]
+        try:
+            IOf = PDFIndirectObject(name, page).format(self)
+        except KeyError:
+            return  # forward reference eg to a later form; leave it for the final pass
+        File = self._streamingFile()
+        self._addIndirect(File, name, page, IOf)
+        contents = page.Contents
+        cname = getattr(contents,__InternalName__,None)
+        if cname is not None:
+            # the contents may be shared with an earlier identical stream
+            cname = self.numberToId[self.idToObjectNumberAndVersion[cname][0]]
+        if cname is not None and cname not in self.idToOffset:
+            self._addIndirect(File, cname, contents, PDFIndirectObject(cname, contents).format(self))
+            del idToOb[cname]
+        del idToOb[name]
+        pages = self.Pages.pages
+        for i in xrange(len(pages)-1,-1,-1):
+            if pages[i] is page:
+                pages[i] = PDFObjectReference(name)
+                break
+
+    def _addIndirect(self, File, id, obj, IOf):
+        "add a formatted indirect object to File recording its offset"
+        if not rl_config.invariant and DoComments:
+            try:
+                classname = obj.__class__.__name__
+            except:
+                classname = repr(obj)
+            File.add("%% %s: class %s %s" % (repr(id), classname[:50], LINEEND))
+        self.idToOffset[id] = File.add(IOf)
 
     def addForm(self, name, form):
         """add a Form XObject."""
@@ -402,6 +557,9 @@ class PDFDocument:
         return fontnames
 
     def format(self):
+        return self._format().format(self)
+
+    def _format(self):
         # register the Catalog/INfo and then format the objects one by one until exhausted
         # (possible infinite loop if there is a bug that continually makes new objects/refs...)
         # Prepare encryption
@@ -415,6 +573,12 @@ class PDFDocument:
         encryptinfo = self.encrypt.info()
         if encryptinfo:
             encryptref = self.Reference(encryptinfo)
+        # object streams can't be used with encryption
+        objectStreams = self.objectStreams and isinstance(self.encrypt,NoEncryption)
+        if objectStreams:
+            self.ensureMinPdfVersion('objectStreams')
+            objStm = PDFObjectStream()
+            compressed = {} # object number --> (object stream, index)
         # make std fonts (this could be made optional
         counter = 0 # start at first object (object 1 after preincrement)
         ids = [] # the collection of object ids in object number order
@@ -424,33 +588,68 @@ class PDFDocument:
         idToOf = self.idToOffset
         ### note that new entries may be "appended" DURING FORMATTING
         done = None
-        File = PDFFile(self._pdfVersion) # output collector
+        File = self._File
+        if File is None:
+            File = PDFFile(self._pdfVersion) # output collector
+        elif self._pdfVersion>File.pdfVersion:
+            # the streamed header was written too early; override it in the catalog
+            cat.Version = PDFName("%s.%s" % self._pdfVersion)
         while done is None:
             counter += 1 # do next object...
             if counter in numbertoid:
                 id = numbertoid[counter]
+                ids.append(id)
+                if id in idToOf: continue   # already streamed out
                 #printidToOb
                 obj = idToOb[id]
-                IO = PDFIndirectObject(id, obj)
-                # register object number and version
-                #encrypt.register(id,
-                IOf = IO.format(self)
+                if objectStreams:
+                    n, v = idToNV[id]
+                    fcontent = format(obj, self, toplevel=1)
+                    if not fcontent.endswith("endstream"+LINEEND):
+                        # only non-stream objects may go into an object stream
+                        compressed[n] = objStm, objStm.add(n, fcontent)
+                        if objStm.isFull():
+                            self.Reference(objStm)
+                            objStm = PDFObjectStream()
+                        continue
+                    IOf = indirectObjectFormat(n, v, fcontent)
+                else:
+                    IO = PDFIndirectObject(id, obj)
+                    # register object number and version
+                    #encrypt.register(id,
+                    IOf = IO.format(self)
                 # add a comment to the PDF output
-                if not rl_config.invariant and DoComments:
-                    try:
-                        classname = obj.__class__.__name__
-                    except:
-                        classname = repr(obj)
-                    File.add("%% %s: class %s %s" % (repr(id), classname[:50], LINEEND))
-                offset = File.add(IOf)
-                idToOf[id] = offset
-                ids.append(id)
+                self._addIndirect(File, id, obj, IOf)
+            elif objectStreams and objStm.numbers:
+                # register the last partly filled object stream and go round again
+                self.Reference(objStm)
+                objStm = PDFObjectStream()
+                counter -= 1
             else:
                 done = 1
         # sanity checks (must happen AFTER formatting)
         lno = len(numbertoid)
         if counter-1!=lno:
             raise ValueError, "counter %s doesn't match number to id dictionary %s" %(counter, lno)
+        if objectStreams:
+            # the xref stream replaces both the xref table and the trailer
+            entries = [(0, 0, 65535)]
+            for n in xrange(1, lno+1):
+                if n in compressed:
+                    objStm, i = compressed[n]
+                    entries.append((2, idToNV[objStm.__InternalName__][0], i))
+                else:
+                    entries.append((1, idToOf[numbertoid[n]], 0))
+            xrefoffset = File.offset
+            entries.append((1, xrefoffset, 0))  # the xref stream itself
+            xref = PDFCrossReferenceStream(entries,
+                Root = self.Reference(cat),
+                Info = self.Reference(info),
+                ID = self.ID(),
+                )
+            File.add(indirectObjectFormat(lno+1, 0, format(xref, self, toplevel=1)))
+            File.add(STARTXREFFMT % dict(LINEENDDICT, startxref=xrefoffset))
+            return File
         # now add the xref
         xref = PDFCrossReferenceTable()
         xref.addsection(0, ids)
@@ -467,8 +666,18 @@ class PDFDocument:
             )
         trailerf = trailer.format(self)
         File.add(trailerf)
-        # return string format for pdf file
-        return File.format(self)
+        # return the output collector for the pdf file
+        return File
+
+    def reserveForm(self, name):
+        """allocate the object number of a form which will be defined later
+        so that pages using it can be written out before it exists"""
+        internalname = xObjectName(name)
+        if internalname in self.idToObject or internalname in self._reserved: return
+        n = self.objectcounter = self.objectcounter+1
+        self._reserved[internalname] = n
+        self.idToObjectNumberAndVersion[internalname] = (n, 0)
+        self.numberToId[n] = internalname
 
     def hasForm(self, name):
         """test for existence of named form"""
@@ -526,8 +735,23 @@ class PDFDocument:
             if intname not in idToObject:
                 raise ValueError, "object named but not registered"
             return PDFObjectReference(intname)
+        # share an existing identical object if we can
+        key = iob and self._internKey(object)
+        if key:
+            other = self._interned.get(key)
+            if other is not None and (name is None or (name not in idToObject and name not in self._reserved)):
+                if name is None:
+                    name = other
+                else:
+                    self.idToObjectNumberAndVersion[name] = self.idToObjectNumberAndVersion[other]
+                    idToObject[name] = object
+                object.__InternalName__ = name
+                return PDFObjectReference(name)
         # otherwise register the new object
-        objectcounter = self.objectcounter = self.objectcounter+1
+        if name in self._reserved:
+            objectcounter = self._reserved.pop(name)
+        else:
+            objectcounter = self.objectcounter = self.objectcounter+1
         if name is None:
             name = "R"+repr(objectcounter)
         if name in idToObject:
@@ -541,8 +765,20 @@ class PDFDocument:
         self.idToObjectNumberAndVersion[name] = (objectcounter, 0)
         self.numberToId[objectcounter] = name
         idToObject[name] = object
+        if key:
+            self._interned[key] = name
         return PDFObjectReference(name)
 
+    def _internKey(self, object):
+        "return a key shared by objects which would format identically or None"
+        internKey = getattr(object,'internKey',None)
+        if internKey is None or not self.interning: return None
+        try:
+            key = internKey(self)
+        except KeyError:
+            return None # unresolved forward reference; can't compare yet
+        return key is not None and (object.__class__.__name__, key) or None
+
 ### chapter 4 Objects
 PDFtrue = "true"
 PDFfalse = "false"
@@ -750,6 +986,10 @@ class PDFStreamFilterZCompress:
         zlib = import_zlib()
         if not zlib: raise ImportError, "cannot z-compress zlib unavailable"
         return zlib.compress(text)
+    def policyEncode(self, text, kind, document):
+        "compress as the document's policy says; None means leave text uncompressed"
+        policy = getattr(document,'compressionPolicy',None) or compressionProfiles['default']
+        return policy.compress(text, kind)
     def decode(self, encoded):
         from reportlab.lib.utils import import_zlib
         zlib = import_zlib()
@@ -774,6 +1014,105 @@ class PDFStreamFilterBase85Encode:
 # need only one of these too
 PDFBase85Encode = PDFStreamFilterBase85Encode()
 
+class PDFStreamFilterZPending(PDFStreamFilterZCompress):
+    """a FlateDecode filter for content already being compressed in the
+    background; result is called to wait for the compressed data"""
+    def __init__(self, result):
+        self.result = result
+    def encode(self, text):
+        return self.result()
+    def policyEncode(self, text, kind, document):
+        return self.result()
+
+class PDFCompressionPolicy:
+    """Decides how streams get compressed.  level is the zlib level used for
+    any kind of stream not given its own level as a keyword, the kinds being
+    page, form, font, image and cmap.  A level of 0 leaves that kind
+    uncompressed as do lengths below minSize (images are always compressed
+    when their level is non zero)."""
+    def __init__(self, level=6, minSize=0, **levels):
+        self.defaultLevel = level
+        self.minSize = minSize
+        self.levels = levels
+
+    def level(self, kind):
+        return self.levels.get(kind, self.defaultLevel)
+
+    def compress(self, text, kind=None):
+        "return text compressed or None if compression isn't worthwhile"
+        level = self.level(kind)
+        if not level or len(text)<self.minSize: return None
+        zlib = import_zlib()
+        if not zlib: raise ImportError, "cannot z-compress zlib unavailable"
+        return zlib.compress(text, level)
+
+#rl_config.compressionProfile selects one of these
+compressionProfiles = dict(
+        default = PDFCompressionPolicy(),
+        speed = PDFCompressionPolicy(level=1, minSize=256),
+        size = PDFCompressionPolicy(level=9),
+        )
+
+class _CompressionJob:
+    def __init__(self, func, args):
+        import threading
+        self.func = func
+        self.args = args
+        self.done = threading.Event()
+    def run(self):
+        try:
+            self.value = self.func(*self.args)
+            self.exc = None
+        except:
+            import sys
+            self.exc = sys.exc_info()
+        del self.func, self.args
+        self.done.set()
+    def __call__(self):
+        self.done.wait()
+        if self.exc: raise self.exc[0], self.exc[1], self.exc[2]
+        return self.value
+
+class _CompressionPool:
+    "daemon threads which run compression jobs (zlib releases the GIL)"
+    def __init__(self, nThreads):
+        import threading, Queue
+        self.nThreads = nThreads
+        self.queue = Queue.Queue()
+        self.threads = []
+        for i in xrange(nThreads):
+            t = threading.Thread(target=self._work)
+            t.setDaemon(True)
+            t.start()
+            self.threads.append(t)
+    def _work(self):
+        get = self.queue.get
+        while 1:
+            job = get()
+            if job is None: break
+            job.run()
+    def submit(self, func, *args):
+        job = _CompressionJob(func, args)
+        self.queue.put(job)
+        return job
+    def close(self):
+        "stop the threads once the jobs already submitted have run"
+        for t in self.threads:
+            self.queue.put(None)
+
+_compressionPool = None
+def _getCompressionPool():
+    "return the shared pool if rl_config.compressionThreads asks for one"
+    global _compressionPool
+    n = rl_config.compressionThreads
+    if _compressionPool is not None and _compressionPool.nThreads!=n:
+        _compressionPool.close()
+        _compressionPool = None
+    if n<=0: return None
+    if _compressionPool is None:
+        _compressionPool = _CompressionPool(n)
+    return _compressionPool
+
 STREAMFMT = ("%(dictionary)s%(LINEEND)s" # dictionary
              "stream" # stream keyword
              "%(LINEEND)s" # a line end (could be just a \n)
@@ -785,6 +1124,7 @@ class PDFStream:
     __PDFObject__ = True
     ### compression stuff not implemented yet
     __RefOnly__ = 1 # must be at top level
+    kind = None # page, form, font, image or cmap for the compression policy
     def __init__(self, dictionary=None, content=None, filters=None):
         if dictionary is None:
             dictionary = PDFDictionary()
@@ -810,25 +1150,37 @@ class PDFStream:
             for f in rf:
                 #print "*****************content:"; print repr(content[:200])
                 #print "*****************filter", f.pdfname
-                content = f.encode(content)
+                policyEncode = getattr(f,'policyEncode',None)
+                if policyEncode:
+                    encoded = policyEncode(content, self.kind, document)
+                    if encoded is None: continue
+                    content = encoded
+                else:
+                    content = f.encode(content)
                 fnames.insert(0, PDFName(f.pdfname))
             #print "*****************finally:"; print content[:200]
             #print "****** FILTERS", fnames
             #stop
-            dictionary["Filter"] = PDFArray(fnames)
+            if fnames:
+                dictionary["Filter"] = PDFArray(fnames)
         # "stream encoding is done after all filters have been applied"
         content = document.encrypt.encode(content)
-        fc = format(content, document)
-        #print "type(content)", type(content), len(content), type(self.dictionary)
-        lc = len(content)
-        #if fc!=content: burp
         # set dictionary length parameter
-        dictionary["Length"] = lc
+        dictionary["Length"] = len(content)
         fd = format(dictionary, document)
-        sdict = LINEENDDICT.copy()
-        sdict["dictionary"] = fd
-        sdict["content"] = fc
-        return STREAMFMT % sdict
+        # binary content goes straight through; equivalent to STREAMFMT
+        return ''.join((fd, LINEEND, "stream", LINEEND, str(content), "endstream", LINEEND))
+
+    def internKey(self, document):
+        "digest of everything which affects the formatted stream"
+        if self.content is None: return None
+        filters = self.filters
+        if filters is None:
+            filters = document.defaultStreamFilters
+        L = [format(self.dictionary, document)]
+        L.extend([f.pdfname for f in filters or ()])
+        L.append(self.content)
+        return _digester(LINEEND.join(L))
 
 def teststream(content=None):
     #content = "" # test
@@ -875,6 +1227,15 @@ class PDFArrayCompact(PDFArray):
     multiline=False
 
 INDIRECTOBFMT = "%(n)s %(v)s obj%(LINEEND)s%(content)s%(CLINEEND)sendobj%(LINEEND)s"
+def indirectObjectFormat(n, v, fcontent):
+    "wrap already formatted top level content as indirect object n v"
+    D = LINEENDDICT.copy()
+    D["n"] = n
+    D["v"] = v
+    D["content"] = fcontent
+    D['CLINEEND'] = (LINEEND,'')[fcontent.endswith(LINEEND)]
+    return INDIRECTOBFMT % D
+
 class PDFIndirectObject:
     __PDFObject__ = True
     __RefOnly__ = 1
@@ -887,12 +1248,57 @@ class PDFIndirectObject:
         # set encryption parameters
         document.encrypt.register(n, v)
         fcontent = format(self.content, document, toplevel=1) # yes this is at top level
-        D = LINEENDDICT.copy()
-        D["n"] = n
-        D["v"] = v
-        D["content"] = fcontent
-        D['CLINEEND'] = (LINEEND,'')[fcontent.endswith(LINEEND)]
-        return INDIRECTOBFMT % D
+        return indirectObjectFormat(n, v, fcontent)
+
+class PDFObjectStream(PDFStream):
+    """a compressed /ObjStm stream holding already formatted non-stream
+    objects (PDF 1.5)"""
+    __Comment__ = "object stream"
+    maxObjects = 100
+    def __init__(self):
+        PDFStream.__init__(self, filters=[PDFZCompress])
+        self.numbers = []
+        self.objects = []
+    def internKey(self, document):
+        return None # the content is only known at the end
+    def add(self, n, fcontent):
+        "add formatted object number n and return its index in the stream"
+        self.numbers.append(n)
+        self.objects.append(fcontent)
+        return len(self.numbers)-1
+    def isFull(self):
+        return len(self.numbers)>=self.maxObjects
+    def format(self, document):
+        L = []
+        offset = 0
+        for n, fcontent in zip(self.numbers, self.objects):
+            L.append("%d %d" % (n, offset))
+            offset += len(fcontent)+len(LINEEND)
+        header = " ".join(L)+LINEEND
+        self.dictionary = PDFDictionary(dict(Type=PDFName("ObjStm"), N=len(L), First=len(header)))
+        self.content = header+LINEEND.join(self.objects)
+        return PDFStream.format(self, document)
+
+class PDFCrossReferenceStream(PDFStream):
+    """a compressed binary /XRef stream (PDF 1.5); entries is a list of
+    (type, field2, field3) tuples one for each object number from 0"""
+    __Comment__ = "cross reference stream"
+    W = (1, 4, 2)
+    def __init__(self, entries, **trailer):
+        PDFStream.__init__(self, filters=[PDFZCompress])
+        self.entries = entries
+        self.trailer = trailer
+    def internKey(self, document):
+        return None
+    def format(self, document):
+        from struct import pack
+        D = PDFDictionary(self.trailer)
+        D["Type"] = PDFName("XRef")
+        D["Size"] = len(self.entries)
+        D["W"] = PDFArrayCompact(self.W)
+        self.dictionary = D
+        self.content = ''.join([pack('>BLH', *e) for e in self.entries])
+        return PDFStream.format(self, document)
 
 class PDFObjectReference:
     __PDFObject__ = True
@@ -917,10 +1323,12 @@ PDFHeader = (
 class PDFFile:
     __PDFObject__ = True
     ### just accumulates strings: keeps track of current offset
-    def __init__(self,pdfVersion=PDF_VERSION_DEFAULT):
+    ### if sink is given the strings are written to it immediately
+    def __init__(self,pdfVersion=PDF_VERSION_DEFAULT,sink=None):
         self.strings = []
-        self.write = self.strings.append
+        self.write = sink is None and self.strings.append or sink.write
         self.offset = 0
+        self.pdfVersion = pdfVersion
         self.add(PDFHeader % pdfVersion)
 
     def closeOrReset(self):
@@ -933,8 +1341,7 @@ class PDFFile:
         self.write(s)
         return result
     def format(self, document):
-        strings = map(str, self.strings) # final conversion, in case of lazy objects
-        return string.join(strings, "")
+        return "".join(self.strings)
 
 XREFFMT = '%0.10d %0.5d n'
 
@@ -1000,6 +1407,10 @@ class PDFCrossReferenceTable:
             L.append(fs)
         return string.join(L, "")
 
+STARTXREFFMT = ("startxref%(LINEEND)s"
+                "%(startxref)s%(LINEEND)s"
+                "%(PERCENT)s%(PERCENT)sEOF%(LINEEND)s")
+
 TRAILERFMT = ("trailer%(LINEEND)s"
               "%(dict)s%(LINEEND)s"
               "startxref%(LINEEND)s"
@@ -1043,6 +1454,7 @@ class PDFCatalog:
         ViewerPreferences PageLabels PageLayout JavaScript StructTreeRoot SpiderInfo"""
                                  )
     __Refs__ = __NoDefault__ # make these all into references, if present
+    __NoDefault__ = __NoDefault__ + ["Version"]
 
     def format(self, document):
         self.check_format(document)
@@ -1138,6 +1550,7 @@ class PDFPage(PDFCatalog):
     XObjects = None
     _colorsUsed = {}
     _shadingsUsed = {}
+    _zcompress = PDFZCompress   #replaced by a pending filter for background compression
     Trans = None
     # transitionstring?
     # xobjects?
@@ -1178,8 +1591,10 @@ class PDFPage(PDFCatalog):
             else:
                 S = PDFStream()
                 if self.compression:
-                    S.filters = rl_config.useA85 and [PDFBase85Encode, PDFZCompress] or [PDFZCompress]
+                    Z = self._zcompress
+                    S.filters = rl_config.useA85 and [PDFBase85Encode, Z] or [Z]
                 S.content = stream
+                S.kind = 'page'
                 S.__Comment__ = "page stream"
                 self.Contents = S
         if not self.Resources:
@@ -1961,6 +2376,16 @@ class PDFType1Font:
         PD = PDFDictionary(D)
         return PD.format(document)
 
+class PDFPreformatted:
+    "an indirect object whose formatted text is already known"
+    __PDFObject__ = True
+    __RefOnly__ = 1
+    def __init__(self, text, comment=None):
+        self.text = text
+        if comment: self.__Comment__ = comment
+    def format(self, document):
+        return self.text
+
 ## These attribute listings will be useful in future, even if we
 ## put them elsewhere
 
@@ -2042,6 +2467,7 @@ class PDFFormXObject:
             else:
                 S = PDFStream()
                 S.content = stream
+                S.kind = 'form'
                 # need to add filter stuff (?)
                 S.__Comment__ = "xobject form stream"
                 self.Contents = S
@@ -2068,6 +2494,15 @@ class PDFFormXObject:
         sdict["Resources"] = self.Resources
         return self.Contents.format(document)
 
+    def internKey(self, document):
+        if self.Contents or self.Resources or self.Annots or not self.stream:
+            return None # explicitly set up; don't try to share
+        L = [repr((self.BBoxList(), self.compression, self.hasImages))]
+        for x in self.Matrix, self.XObjects:
+            L.append(x and format(x, document) or '')
+        L.append(self.stream)
+        return _digester(LINEEND.join(L))
+
 class PDFPostScriptXObject:
     "For embedding PD (e.g. tray commands) in PDF"
     __PDFObject__ = True
@@ -2091,8 +2526,10 @@ class PDFImageXObject:
     # and filters.  So the job of this thing is to construct the
     # right PDFStream instance and ask it to format itself.
     __PDFObject__ = True
-    def __init__(self, name, source=None, mask=None):
+    compressionPolicy = None
+    def __init__(self, name, source=None, mask=None, compressionPolicy=None):
         self.name = name
+        if compressionPolicy is not None: self.compressionPolicy = compressionPolicy
         self.width = 24
         self.height = 23
         self.bitsPerComponent = 1
@@ -2160,22 +2597,15 @@ class PDFImageXObject:
         return True
 
     def loadImageFromRaw(self,source):
-        IMG=[]
-        imagedata = pdfutils.makeRawImage(source,IMG=IMG)
-        words = string.split(imagedata[1])
-        self.width, self.height = map(string.atoi,(words[1],words[3]))
-        self.colorSpace = {'/RGB':'DeviceRGB', '/G':'DeviceGray', '/CMYK':'DeviceCMYK'}[words[7]]
-        self.bitsPerComponent = 8
-        self._filters = 'FlateDecode', #'Fl'
-        if IMG: self._checkTransparency(IMG[0])
-        elif self.mask=='auto': self.mask = None
-        self.streamContent = string.join(imagedata[3:-1],'')
+        from reportlab.lib.utils import ImageReader
+        self.loadImageFromSRC(ImageReader(source))
 
     def _checkTransparency(self,im):
         if self.mask=='auto':
             if im._dataA:
                 self.mask = None
-                self._smask = PDFImageXObject(_digester(im._dataA.getRGBData()),im._dataA,mask=None)
+                self._smask = PDFImageXObject(_digester(im._dataA.getRGBData()),im._dataA,mask=None,
+                                    compressionPolicy=self.compressionPolicy)
                 self._smask._decode = [0,1]
             else:
                 tc = im.getTransparent()
@@ -2198,18 +2628,24 @@ class PDFImageXObject:
             self.width, self.height = im.getSize()
             raw = im.getRGBData()
             #assert len(raw) == self.width*self.height, "Wrong amount of data for image expected %sx%s=%s got %s" % (self.width,self.height,self.width*self.height,len(raw))
-            self.streamContent = zlib.compress(raw)
+            policy = self.compressionPolicy or compressionProfiles[rl_config.compressionProfile]
+            level = policy.level('image')
+            if level:
+                self.streamContent = zlib.compress(raw, level)
+                self._filters = 'FlateDecode', #'Fl'
+            else:
+                self.streamContent = raw
+                self._filters = ()
             if rl_config.useA85:
                 self.streamContent = pdfutils._AsciiBase85Encode(self.streamContent)
-                self._filters = 'ASCII85Decode','FlateDecode' #'A85','Fl'
-            else:
-                self._filters = 'FlateDecode', #'Fl'
+                self._filters = ('ASCII85Decode',)+self._filters #'A85','Fl'
             self.colorSpace= _mode2CS[im.mode]
             self.bitsPerComponent = 8
             self._checkTransparency(im)
 
     def format(self, document):
-        S = PDFStream(content = self.streamContent)
+        #the content is already encoded so the document's default filters mustn't be applied
+        S = PDFStream(content = self.streamContent, filters = ())
         dict = S.dictionary
         dict["Type"] = PDFName("XObject")
         dict["Subtype"] = PDFName("Image")
@@ -2221,7 +2657,8 @@ class PDFImageXObject:
             dict["Decode"] = PDFArray([1,0,1,0,1,0,1,0])
         elif getattr(self,'_decode',None):
             dict["Decode"] = PDFArray(self._decode)
-        dict["Filter"] = PDFArray(map(PDFName,self._filters))
+        if self._filters:
+            dict["Filter"] = PDFArray(map(PDFName,self._filters))
         dict["Length"] = len(self.streamContent)
         if self.mask: dict["Mask"] = PDFArray(self.mask)
         if getattr(self,'smask',None): dict["SMask"] = self.smask
@@ -2304,6 +2741,9 @@ class PDFFunction:
         D = self.Dict(document)
         return D.format(document)
 
+    def internKey(self, document):
+        return self.format(document)
+
 class PDFExponentialFunction(PDFFunction):
     defaults = PDFFunction.defaults + [("Domain", PDFArrayCompact((0.0, 1.0)))]
     required = PDFFunction.required + ("N",)
@@ -2365,6 +2805,9 @@ class PDFShading:
         D = self.Dict(document)
         return D.format(document)
 
+    def internKey(self, document):
+        return self.format(document)
+
 class PDFFunctionShading(PDFShading):
     required = PDFShading.required + ("Function",)
     permitted = PDFShading.permitted + ("Domain", "Matrix", "Function")
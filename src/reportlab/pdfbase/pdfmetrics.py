@@ -34,6 +34,7 @@ standardEncodings = _fontdata.standardEncodings
 _typefaces = {}
 _encodings = {}
 _fonts = {}
+_standardFontObjects = {}   #(face, encoding, internal name) --> (vector, formatted text)
 
 def _py_unicode2T1(utext,fonts):
     '''return a list of (font,string) pairs representing the unicode text'''
@@ -411,6 +412,11 @@ class Font:
         return sum([sum(map(f.widths.__getitem__,map(ord,t))) for f, t in unicode2T1(text,[self]+self.substitutionFonts)])*0.001*size
     stringWidth = _py_stringWidth
 
+    def stringWidths(self, texts, size, encoding='utf8'):
+        "returns the list of widths of the sequence texts"
+        sw = self.stringWidth
+        return [sw(t, size, encoding) for t in texts]
+
     def _formatWidths(self):
         "returns a pretty block in PDF Array format to aid inspection"
         text = '['
@@ -429,16 +435,19 @@ class Font:
         # avoid circular imports - this cannot go at module level
         from reportlab.pdfbase import pdfdoc
 
-        # construct a Type 1 Font internal object
         internalName = 'F' + repr(len(doc.fontMapping)+1)
-        pdfFont = pdfdoc.PDFType1Font()
-        pdfFont.Name = internalName
-        pdfFont.BaseFont = self.face.name
-        pdfFont.__Comment__ = 'Font %s' % self.fontName
-        pdfFont.Encoding = self.encoding.makePDFObject()
-
-        # is it a built-in one?  if not, need more stuff.
-        if not self.face.name in standardFonts:
+        if self.face.name in standardFonts:
+            # the standard 14 need no widths or descriptor so their formatted
+            # text depends only on the encoding; share it between documents
+            key = self.face.name, self.encoding.name, internalName
+            vector = tuple(self.encoding.vector)
+            cached = _standardFontObjects.get(key)
+            if cached is None or cached[0]!=vector:
+                text = self._makePDFFont(internalName).format(pdfdoc.DummyDoc())
+                cached = _standardFontObjects[key] = vector, text
+            pdfFont = pdfdoc.PDFPreformatted(cached[1], 'Font %s' % self.fontName)
+        else:
+            pdfFont = self._makePDFFont(internalName)
             pdfFont.FirstChar = 0
             pdfFont.LastChar = 255
             pdfFont.Widths = pdfdoc.PDFArray(self.widths)
@@ -453,6 +462,16 @@ class Font:
         # and in the font mappings
         doc.fontMapping[self.fontName] = '/' + internalName
 
+    def _makePDFFont(self, internalName):
+        "construct a Type 1 Font internal object"
+        from reportlab.pdfbase import pdfdoc
+        pdfFont = pdfdoc.PDFType1Font()
+        pdfFont.Name = internalName
+        pdfFont.BaseFont = self.face.name
+        pdfFont.__Comment__ = 'Font %s' % self.fontName
+        pdfFont.Encoding = self.encoding.makePDFObject()
+        return pdfFont
+
 PFB_MARKER=chr(0x80)
 PFB_ASCII=chr(1)
 PFB_BINARY=chr(2)
@@ -613,11 +632,15 @@ def registerFontFamily(family,normal=None,bold=None,italic=None,boldItalic=None)
     fonts.addMapping(family, 0, 1, italic)
     fonts.addMapping(family, 1, 1, boldItalic)
 
+fontGeneration = 0  #changed by each registerFont so caches of font metrics can tell
+
 def registerFont(font):
     "Registers a font, including setting up info for accelerated stringWidth"
     #assert isinstance(font, Font), 'Not a Font: %s' % font
+    global fontGeneration
     fontName = font.fontName
     _fonts[fontName] = font
+    fontGeneration += 1
     if font._multiByte:
         # CID fonts don't need to have typeface registered.
         #need to set mappings so it can go in a paragraph even if within
@@ -722,6 +745,11 @@ def stringWidth(text, fontName, fontSize, encoding='utf8'):
     not accelerated as fast enough because of _instanceStringWidthU"""
     return getFont(fontName).stringWidth(text, fontSize, encoding=encoding)
 
+def stringWidths(texts, fontName, fontSize, encoding='utf8'):
+    """Compute the widths of a sequence of strings in points; this saves
+    the per call font lookup when many strings share a font"""
+    return getFont(fontName).stringWidths(texts, fontSize, encoding)
+
 try:
     from _rl_accel import _instanceStringWidthU
     import new
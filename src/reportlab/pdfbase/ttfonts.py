@@ -51,8 +51,13 @@ Oh, and that 14 up there is font size.)
 Canvas and TextObject have special support for dynamic fonts.
 """
 
-import string
+import string, os, marshal
+from array import array
 from struct import pack, unpack, error as structError
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
 from reportlab.lib.utils import getStringIO
 from reportlab.pdfbase import pdfmetrics, pdfdoc
 from reportlab import rl_config
@@ -174,6 +179,19 @@ def TTFOpenFile(fn):
                     return tfn, f
         raise TTFError('Can\'t open file "%s"' % fn)
 
+def _mapFile(f):
+    """return the contents of f as a string like object; if possible a real file
+    is memory mapped so only the parts used get read and the pages are shared
+    between processes"""
+    if rl_config.ttfMmap:
+        try:
+            if f.tell()==0:
+                import mmap
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, ImportError, ValueError, EnvironmentError):
+            pass
+    return f.read()
+
 class TTFontParser:
     "Basic TTF file parser"
     ttfVersions = (0x00010000,0x74727565,0x74746366)
@@ -259,10 +277,13 @@ class TTFontParser:
     def readFile(self,f):
         if hasattr(f,'read'):
             self.filename = '(ttf)'
+            self._ttf_data = _mapFile(f)
         else:
             self.filename, f = TTFOpenFile(f)
-
-        self._ttf_data = f.read()
+            try:
+                self._ttf_data = _mapFile(f)
+            finally:
+                f.close()
         self._pos = 0
 
     def checksumTables(self):
@@ -279,7 +300,7 @@ class TTFontParser:
 
     def checksumFile(self):
         # Check the checksums for the whole file
-        checksum = calcChecksum(self._ttf_data)
+        checksum = calcChecksum(self._ttf_data[:])
         if 0xB1B0AFBAL!=checksum:
             raise TTFError('TTF file "%s": invalid checksum %s (expected 0xB1B0AFBA) len: %d &3: %d' % (self.filename,hex32(checksum),len(self._ttf_data),(len(self._ttf_data)&3)))
 
@@ -681,41 +702,53 @@ class TTFontFile(TTFontParser):
 
         # hmtx - Horizontal metrics table
         # (needs data from hhea, maxp, and cmap tables)
-        self.seek_table("hmtx")
-        aw = None
-        self.charWidths = {}
-        self.hmetrics = []
-        for glyph in xrange(numberOfHMetrics):
-            # advance width and left side bearing.  lsb is actually signed
-            # short, but we don't need it anyway (except for subsetting)
-            aw, lsb = self.read_ushort(), self.read_ushort()
-            self.hmetrics.append((aw, lsb))
-            aw = scale(aw)
-            if glyph == 0:
-                self.defaultWidth = aw
-            if glyph in glyphToChar:
-                for char in glyphToChar[glyph]:
-                    self.charWidths[char] = aw
-        for glyph in xrange(numberOfHMetrics, numGlyphs):
-            # the rest of the table only lists advance left side bearings.
-            # so we reuse aw set by the last iteration of the previous loop
-            lsb = self.read_ushort()
-            self.hmetrics.append((aw, lsb))
-            if glyph in glyphToChar:
-                for char in glyphToChar[glyph]:
-                    self.charWidths[char] = aw
+        # only the advance widths are needed here; the full per glyph metrics and
+        # the loca table are read on demand by __getattr__ when subsetting
+        hmtx_offset = self.seek_table("hmtx")
+        aws = unpack('>%dH' % (2*numberOfHMetrics), self.get_chunk(hmtx_offset, 4*numberOfHMetrics))[0::2]
+        self.defaultWidth = scale(aws[0])
+        lastWidth = scale(aws[-1])
+        charWidths = self.charWidths = {}
+        for glyph, chars in glyphToChar.iteritems():
+            if glyph < numberOfHMetrics:
+                aw = scale(aws[glyph])
+            elif glyph < numGlyphs:
+                aw = lastWidth
+            else:
+                continue
+            for char in chars:
+                charWidths[char] = aw
 
         # loca - Index to location
-        self.seek_table('loca')
-        self.glyphPos = []
-        if indexToLocFormat == 0:
-            for n in xrange(numGlyphs + 1):
-                self.glyphPos.append(self.read_ushort() << 1)
-        elif indexToLocFormat == 1:
-            for n in xrange(numGlyphs + 1):
-                self.glyphPos.append(self.read_ulong())
-        else:
+        if indexToLocFormat not in (0, 1):
             raise TTFError, 'Unknown location table format (%d)' % indexToLocFormat
+        self._lazyTables = dict(
+                hmetrics=(hmtx_offset, numberOfHMetrics, numGlyphs),
+                glyphPos=(self.get_table_pos('loca')[0], indexToLocFormat, numGlyphs),
+                )
+
+    def __getattr__(self, name):
+        "read the subsetting tables hmetrics and glyphPos on first use"
+        L = self.__dict__.get('_lazyTables',{}).get(name,None)
+        if L is None:
+            raise AttributeError(name)
+        if name=='hmetrics':
+            offset, numberOfHMetrics, numGlyphs = L
+            M = unpack('>%dH' % (2*numberOfHMetrics), self.get_chunk(offset, 4*numberOfHMetrics))
+            value = zip(M[0::2],M[1::2])
+            n = numGlyphs-numberOfHMetrics
+            if n>0:
+                aw = value[-1][0]
+                lsbs = unpack('>%dH' % n, self.get_chunk(offset+4*numberOfHMetrics, 2*n))
+                value.extend([(aw,lsb) for lsb in lsbs])
+        else:
+            offset, indexToLocFormat, numGlyphs = L
+            if indexToLocFormat == 0:
+                value = [x<<1 for x in unpack('>%dH' % (numGlyphs+1), self.get_chunk(offset, 2*(numGlyphs+1)))]
+            else:
+                value = list(unpack('>%dL' % (numGlyphs+1), self.get_chunk(offset, 4*(numGlyphs+1))))
+        self.__dict__[name] = value
+        return value
 
     # Subsetting
 
@@ -909,15 +942,104 @@ class TTFontFace(TTFontFile, pdfmetrics.TypeFace):
     Conceptually similar to a single byte typeface, but the glyphs are
     identified by UCS character codes instead of glyph names."""
 
+    #everything set by extractInfo; see _loadMetrics
+    _metricsAttrs = string.split("""name familyName styleName fullName uniqueFontID fontRevision
+        unitsPerEm bbox ascent descent capHeight stemV italicAngle underlinePosition
+        underlineThickness flags charToGlyph defaultWidth charWidths _lazyTables""")
+    _metricsVersion = 1
+
     def __init__(self, filename, validate=0, subfontIndex=0):
         "Loads a TrueType font from filename."
         pdfmetrics.TypeFace.__init__(self, None)
         TTFontFile.__init__(self, filename, validate=validate, subfontIndex=subfontIndex)
 
+    def extractInfo(self, charInfo=1):
+        """As TTFontFile.extractInfo, but if rl_config.ttfMetricsCache is set the
+        results are kept in a marshal file in the FastTTFMetrics temporary folder
+        and reloaded from there when the same font is seen again."""
+        if not rl_config.ttfMetricsCache:
+            return TTFontFile.extractInfo(self, charInfo)
+        from reportlab.lib.utils import get_rl_tempdir
+        fn = os.path.join(get_rl_tempdir('FastTTFMetrics'), self._metricsKey(charInfo) + '.fastmetrics')
+        if not self._loadMetrics(fn):
+            TTFontFile.extractInfo(self, charInfo)
+            self._saveMetrics(fn)
+
+    def _metricsKey(self, charInfo):
+        "a key identifying the font data; the table directory holds a checksum of every table"
+        h = md5()
+        h.update(repr((len(self._ttf_data), self.subfontNameX, charInfo)))
+        for t in self.tables:
+            h.update(repr((t['tag'], t['checksum'], t['offset'], t['length'])))
+        h.update(self.get_table('head'))
+        return h.hexdigest()
+
+    def _loadMetrics(self, fn):
+        if not os.path.isfile(fn): return 0
+        try:
+            f = open(fn, 'rb')
+            try:
+                version, D = marshal.load(f)
+            finally:
+                f.close()
+        except:
+            return 0    # unreadable so just parse again
+        if version!=self._metricsVersion: return 0
+        self.__dict__.update(D)
+        return 1
+
+    def _saveMetrics(self, fn):
+        D = {}
+        for k in self._metricsAttrs:
+            if k in self.__dict__:
+                D[k] = self.__dict__[k]
+        tfn = '%s.%d' % (fn, os.getpid())
+        try:
+            f = open(tfn, 'wb')
+            try:
+                marshal.dump((self._metricsVersion, D), f)
+            finally:
+                f.close()
+            try:
+                os.rename(tfn, fn)
+            except OSError:
+                os.remove(fn)   #windows won't rename over an existing file
+                os.rename(tfn, fn)
+        except (IOError, OSError):
+            # the cache is optional; carry on if it can't be written
+            try:
+                os.remove(tfn)
+            except OSError:
+                pass
+
+    widthTable = None
+
     def getCharWidth(self, code):
         "Returns the width of character U+<code>"
         return self.charWidths.get(code, self.defaultWidth)
 
+    def makeWidthTable(self):
+        """Sets and returns widthTable, an array of advance widths in font units
+        indexed by BMP code point; astral code points fall back to charWidths"""
+        scale = self.unitsPerEm/1000.
+        W = array('H',[int(round(self.defaultWidth*scale))])*0x10000
+        for c, w in self.charWidths.iteritems():
+            if c<0x10000: W[c] = int(round(w*scale))
+        self.widthTable = W
+        return W
+
+    def _sumWidths(self, text):
+        "sum of the widths of the characters of unicode text in font units"
+        W = self.widthTable or self.makeWidthTable()
+        try:
+            return sum(map(W.__getitem__,map(ord,text)))
+        except IndexError:
+            n = len(W)
+            g = self.charWidths.get
+            dw = self.defaultWidth
+            scale = self.unitsPerEm/1000.
+            return sum([c<n and W[c] or int(round(g(c,dw)*scale)) for c in map(ord,text)])
+
     def addSubsetObjects(self, doc, fontname, subset):
         """Generate a TrueType font subset and add it to the PDF document.
         Returns a PDFReference to the new FontDescriptor object."""
@@ -925,6 +1047,7 @@ class TTFontFace(TTFontFile, pdfmetrics.TypeFace):
         fontFile = pdfdoc.PDFStream()
         fontFile.content = self.makeSubset(subset)
         fontFile.dictionary['Length1'] = len(fontFile.content)
+        fontFile.kind = 'font'
         if doc.compression:
             fontFile.filters = [pdfdoc.PDFZCompress]
         fontFileRef = doc.Reference(fontFile, 'fontFile:%s(%s)' % (self.filename, fontname))
@@ -996,6 +1119,14 @@ class TTFont:
                 self.subsets = [[32]*33]
                 self.assignments[32] = 32
 
+        def copy(self):
+            "return an independent copy of this state"
+            from copy import copy
+            x = copy(self)
+            x.assignments = self.assignments.copy()
+            x.subsets = [s[:] for s in self.subsets]
+            return x
+
     _multiByte = 1      # We want our own stringwidth
     _dynamicFont = 1    # We want dynamic subsetting
 
@@ -1018,11 +1149,22 @@ class TTFont:
         "Calculate text width"
         if not isinstance(text,unicode):
             text = unicode(text, encoding or 'utf-8')   # encoding defaults to utf-8
-        g = self.face.charWidths.get
-        dw = self.face.defaultWidth
-        return 0.001*size*sum([g(ord(u),dw) for u in text])
+        face = self.face
+        return size*face._sumWidths(text)/float(face.unitsPerEm)
     stringWidth = _py_stringWidth
 
+    def stringWidths(self, texts, size, encoding='utf-8'):
+        "Calculate the widths of a sequence of texts"
+        face = self.face
+        sumWidths = face._sumWidths
+        scale = size/float(face.unitsPerEm)
+        encoding = encoding or 'utf-8'
+        R = []
+        for t in texts:
+            if not isinstance(t,unicode): t = unicode(t,encoding)
+            R.append(scale*sumWidths(t))
+        return R
+
     def _assignState(self,doc,asciiReadable=None,namePrefix=None):
         '''convenience function for those wishing to roll their own state properties'''
         if asciiReadable is None:
@@ -1121,6 +1263,7 @@ class TTFont:
 
             cmapStream = pdfdoc.PDFStream()
             cmapStream.content = makeToUnicodeCMap(baseFontName, subset)
+            cmapStream.kind = 'cmap'
             if doc.compression:
                 cmapStream.filters = [pdfdoc.PDFZCompress]
             pdfFont.ToUnicode = doc.Reference(cmapStream, 'toUnicodeCMap:' + baseFontName)
@@ -243,6 +243,8 @@ class Canvas(textobject._PDFColorSetter):
                  cropMarks=None,
                  pdfVersion=None,
                  enforceColorSpace=None,
+                 streaming=0,
+                 objectStreams=0,
                  ):
         """Create a canvas of a given size. etc.
 
@@ -258,6 +260,14 @@ class Canvas(textobject._PDFColorSetter):
         if enforceColorSpace is in ('cmyk', 'rgb', 'sep','sep_black','sep_cmyk') then one of
         the standard _PDFColorSetter callables will be used to enforce appropriate color settings.
         If it is a callable then that will be used.
+
+        If streaming is true each page is written to filename as soon as showPage
+        completes and is then released, so memory use does not grow with the
+        number of pages.  getpdfdata cannot be used with a streaming canvas.
+
+        If objectStreams is true a PDF 1.5 file is produced with the small
+        non-stream objects packed into compressed object streams and a binary
+        cross reference stream in place of the xref table.
         """
         if pagesize is None: pagesize = rl_config.defaultPageSize
         if invariant is None: invariant = rl_config.invariant
@@ -266,6 +276,8 @@ class Canvas(textobject._PDFColorSetter):
         self._doc = pdfdoc.PDFDocument(compression=pageCompression,
                                        invariant=invariant, filename=filename,
                                        pdfVersion=pdfVersion or pdfdoc.PDF_VERSION_DEFAULT,
+                                       streaming=streaming,
+                                       objectStreams=objectStreams,
                                        )
 
         self._enforceColorSpace = _chooseEnforceColorSpace(enforceColorSpace)
@@ -283,6 +295,9 @@ class Canvas(textobject._PDFColorSetter):
         self._pageTransition = None
         self._pageDuration = None
         self._destinations = {} # dictionary of destinations for cross indexing.
+        self._deferredForms = {} # forms to be drawn when the document is formatted
+        self._deferredStrings = {} # (text, font, colour, alignment) --> form name
+        self._deferredValues = {} # values for drawDeferredString
 
         self.setPageCompression(pageCompression)
         self._pageNumber = 1   # keep a count
@@ -662,6 +677,34 @@ class Canvas(textobject._PDFColorSetter):
         self.init_graphics_state()
         self.state_stack = []
 
+    def _getCheckpoint(self):
+        """return a snapshot of the canvas and its document which
+        _restoreCheckpoint can later return to; used by incremental
+        multiBuild at page boundaries"""
+        from copy import copy
+        d = {}
+        for k, v in self.__dict__.iteritems():
+            if isinstance(v,(list,dict)):
+                v = copy(v)
+            d[k] = v
+        x = self._extgstate.__class__()
+        x._d = self._extgstate._d.copy()
+        x._c = self._extgstate._c.copy()
+        d['_extgstate'] = x
+        return d, self._doc._getCheckpoint()
+
+    def _restoreCheckpoint(self, cp):
+        from copy import copy
+        d, dcp = cp
+        self._doc._restoreCheckpoint(dcp)
+        self.__dict__.clear()
+        for k, v in d.iteritems():
+            if isinstance(v,(list,dict)):
+                v = copy(v)
+            self.__dict__[k] = v
+        x = self._extgstate = d['_extgstate'].pushCopy()
+        x._c = x._c.copy()
+
     def setPageCallBack(self, func):
         """func(pageNum) will be called on each page end.
 
@@ -923,7 +966,7 @@ class Canvas(textobject._PDFColorSetter):
         imgObj = self._doc.idToObject.get(regName, None)
         if not imgObj:
             #first time seen, create and register the PDFImageXobject
-            imgObj = pdfdoc.PDFImageXObject(name, image, mask=mask)
+            imgObj = pdfdoc.PDFImageXObject(name, image, mask=mask, compressionPolicy=self._doc.compressionPolicy)
             imgObj.name = name
             self._setXObjects(imgObj)
             self._doc.Reference(imgObj, regName)
@@ -1026,6 +1069,72 @@ class Canvas(textobject._PDFColorSetter):
         self._restartAccumulators()
         self.pop_state_stack()
 
+    def deferForm(self, name, func, lowerx=0, lowery=0, upperx=None, uppery=None):
+        """arrange for func(canvas) to draw the content of the named form when
+           the document is formatted, ie at save time.  The form may be used with
+           doForm before then so content which depends on the whole document
+           (page numbers etc) can be placed on pages without a second pass.
+           The bounding box arguments are as for beginForm.  Deferring
+           a name again replaces the earlier function."""
+        D = self._deferredForms
+        D[name] = len(D), func, (lowerx, lowery, upperx, uppery)
+        self._doc.reserveForm(name)
+
+    def setDeferredValue(self, name, value):
+        """set the value used for %(name)s by drawDeferredString; value may be
+           a callable taking the canvas which is called when the document is saved"""
+        self._deferredValues[name] = value
+
+    def drawDeferredString(self, x, y, text, align='left'):
+        """draw text at (x,y) in the current font and fill colour with the
+           %(name)s format fields filled in when the document is saved, eg
+           canvas.drawDeferredString(x, y, 'Page %(page)s of %(pageCount)s', 'right')
+           Besides the values set with setDeferredValue, page is the current page
+           number and pageCount the number of pages in the document.  Each
+           distinct text and style is drawn once as a form shared by the pages.
+           align may be 'left', 'right' or 'centre'."""
+        if align not in ('left','right','centre','center'):
+            raise ValueError('bad align value %r' % align)
+        page = '%(page)' in text and self._pageNumber or None
+        fontName, fontSize, color = self._fontname, self._fontsize, self._fillColorObj
+        key = text, page, fontName, fontSize, repr(color), align
+        D = self._deferredStrings
+        name = D.get(key,None)
+        if name is None:
+            name = D[key] = 'DeferredString%d' % len(D)
+            def drawString(canv):
+                values = dict(page=page, pageCount=len(canv._doc.Pages.pages))
+                for k, v in canv._deferredValues.iteritems():
+                    if callable(v): v = v(canv)
+                    values[k] = v
+                canv.setFont(fontName, fontSize)
+                canv.setFillColor(color)
+                t = text % values
+                if align=='right':
+                    canv.drawRightString(0, 0, t)
+                elif align=='left':
+                    canv.drawString(0, 0, t)
+                else:
+                    canv.drawCentredString(0, 0, t)
+            w = self._pagesize[0]
+            self.deferForm(name, drawString, -w, -fontSize, w, 2*fontSize)
+        self.saveState()
+        self.translate(x, y)
+        self.doForm(name)
+        self.restoreState()
+
+    def _drawDeferredForms(self):
+        "draw the forms set up by deferForm"
+        D = self._deferredForms
+        while D:
+            L = [(v[0],k,v[1],v[2]) for k,v in D.iteritems()]
+            L.sort()
+            D.clear()
+            for i, name, func, bbox in L:
+                self.beginForm(name, *bbox)
+                func(self)
+                self.endForm()
+
     def addPostScriptCommand(self, command, position=1):
         """Embed literal Postscript in the document.
 
@@ -1197,6 +1306,8 @@ class Canvas(textobject._PDFColorSetter):
         """Returns the PDF data that would normally be written to a file.
         If there is current data a ShowPage is executed automatically.
         After this operation the canvas must not be used further."""
+        if self._doc.streaming:
+            raise ValueError("getpdfdata cannot be used with a streaming canvas")
         if len(self._code): self.showPage()
         return self._doc.GetPDFData(self)
 
@@ -9,7 +9,7 @@ from reportlab.platypus.flowables import Flowable, Image, Macro, PageBreak, Pref
                         KeepInFrame, ParagraphAndImage, ImageAndFlowables, ListFlowable, ListItem
 from reportlab.platypus.paragraph import Paragraph, cleanBlockQuotedText, ParaLines
 from reportlab.platypus.paraparser import ParaFrag
-from reportlab.platypus.tables import Table, TableStyle, CellStyle, LongTable
+from reportlab.platypus.tables import Table, TableStyle, CellStyle, LongTable, StreamingTable
 from reportlab.platypus.frames import Frame
 from reportlab.platypus.doctemplate import BaseDocTemplate, NextPageTemplate, PageTemplate, ActionFlowable, \
                         SimpleDocTemplate, FrameBreak, PageBegin, Indenter, NotAtTopPageBreak
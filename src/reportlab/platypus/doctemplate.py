@@ -35,6 +35,8 @@ from reportlab.platypus.frames import Frame
 from reportlab.rl_config import defaultPageSize, verbose
 import reportlab.lib.sequencer
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfbase.pdfmetrics import getFont
 try:
     set
 except NameError:
@@ -49,7 +51,8 @@ dumps = pickle.dumps
 loads = pickle.loads
 
 from types import *
-import sys
+import sys, re, os, time
+from itertools import imap
 import logging
 logger = logging.getLogger("reportlab.platypus")
 
@@ -76,6 +79,8 @@ def _fSizeString(f):
         return '(%s x %s)%s' % (w,h,c)
     return ''
 
+_tfRe = re.compile(r'(/\S+) \S+ Tf')
+
 def _doNothing(canvas, doc):
     "Dummy callback for onPage"
     pass
@@ -119,6 +124,16 @@ class IndexingFlowable(Flowable):
         """Called after build ends but before isSatisfied"""
         pass
 
+    def getBuildState(self):
+        """Return a copy of the state gathered so far in the current pass,
+        or None if the flowable can't support incremental multiBuild"""
+        return None
+
+    def setBuildState(self, state):
+        """Return to a state obtained from getBuildState; the state
+        must be copied as it may be restored more than once"""
+        pass
+
 class ActionFlowable(Flowable):
     '''This Flowable is never drawn, it can be used for data driven controls
        For example to change a page template (from one column to two, for example)
@@ -248,9 +263,14 @@ class PageTemplate:
     essentially a list of Frames and an onPage routine to call at the start
     of a page when this is selected. onPageEnd gets called at the end.
     derived classes can also implement beforeDrawPage and afterDrawPage if they want
+
+    If staticOnPage is true the onPage output is taken to be the same on every page;
+    it is then recorded once as a form XObject which later pages (and later builds
+    in the same process, when possible) reuse instead of redrawing.
     """
+    _staticCount = 0
     def __init__(self,id=None,frames=[],onPage=_doNothing, onPageEnd=_doNothing,
-                 pagesize=None, autoNextPageTemplate=None):
+                 pagesize=None, autoNextPageTemplate=None, staticOnPage=0):
         frames = frames or []
         if type(frames) not in (ListType,TupleType): frames = [frames]
         assert filter(lambda x: not isinstance(x,Frame), frames)==[], "frames argument error"
@@ -260,6 +280,57 @@ class PageTemplate:
         self.onPageEnd = onPageEnd
         self.pagesize = pagesize
         self.autoNextPageTemplate = autoNextPageTemplate
+        self.staticOnPage = staticOnPage
+        self._staticRecording = None
+
+    def drawOnPage(self,canv,doc):
+        """call onPage, via the recorded form if staticOnPage is set"""
+        if not self.staticOnPage or self.onPage is _doNothing:
+            self.onPage(canv,doc)
+            return
+        name = getattr(self,'_staticFormName',None)
+        if name is None:
+            name = self._staticFormName = 'PageTemplate.static%d' % PageTemplate._staticCount
+            PageTemplate._staticCount += 1
+        if not canv.hasForm(name) and not self._replayStaticForm(canv,name):
+            self._recordStaticForm(canv,doc,name)
+        canv.doForm(name)
+
+    def _recordStaticForm(self,canv,doc,name):
+        canv.beginForm(name)
+        self.onPage(canv,doc)
+        #anything held in per document/canvas resources can't be replayed elsewhere
+        reusable = not (canv._formsinuse or canv._annotationrefs or canv._colorsUsed
+                        or canv._shadingUsed or canv._extgstate._c)
+        canv.endForm()
+        pdf = canv._doc
+        form = pdf.idToObject[pdf.getXObjectName(name)]
+        fonts = []
+        if reusable:
+            fm = dict([(v,k) for k,v in pdf.fontMapping.iteritems()])
+            for iname in set(_tfRe.findall(form.stream)):
+                fontName = fm.get(iname)
+                if fontName is None or getFont(fontName)._dynamicFont:
+                    reusable = 0
+                    break
+                fonts.append((iname,fontName))
+        fonts.sort(key=lambda x: (len(x[0]),x[0]))
+        self._staticRecording = reusable and (canv._pagesize, canv._preamble,
+                form.BBoxList(), form.stream, fonts) or None
+
+    def _replayStaticForm(self,canv,name):
+        R = self._staticRecording
+        if not R: return 0
+        pagesize, preamble, bbox, stream, fonts = R
+        if pagesize!=canv._pagesize or preamble!=canv._preamble: return 0
+        pdf = canv._doc
+        for iname, fontName in fonts:
+            if pdf.getInternalFontName(fontName)!=iname: return 0
+        form = pdfdoc.PDFFormXObject(*bbox)
+        form.compression = canv._pageCompression
+        form.setStreamList(stream)
+        pdf.addForm(name,form)
+        return 1
 
     def beforeDrawPage(self,canv,doc):
         """Override this if you want additional functionality or prefer
@@ -302,6 +373,34 @@ def _addGeneratedContent(flowables,frame):
         del frame._generated_content
 
 
+#attributes of the document template which are not part of a layout checkpoint
+_mbNoCheckpoint = ('canv','_indexingFlowables','_doSave','_multiBuildEdits',
+                    '_mbEdits','_mbCheckpoints','_mbPending','_mbPage','_mbStory',
+                    '_mbStart','_mbHead','_mbEdited')
+#attributes which build or the first page start always reset
+_mbStartReset = ('seq','_savedInfo','_hanging','pageTemplate','page','frame',
+                    '_curPageFlowableCount','_nextFrameIndex')
+
+def _mbCopyState(d):
+    '''copy a document template state dict, containers are copied one level deep'''
+    from copy import copy, deepcopy
+    r = {}
+    for k, v in d.iteritems():
+        if k in _mbNoCheckpoint: continue
+        if isinstance(v,(list,dict,set)): v = copy(v)
+        r[k] = v
+    if 'seq' in r: r['seq'] = deepcopy(r['seq'])
+    if '_lifetimes' in r: r['_lifetimes'] = dict([(k,copy(v)) for k,v in r['_lifetimes'].iteritems()])
+    return r
+
+def _mbStartState(d):
+    '''the part of a document template state left over from an earlier build
+    which the next build does not reset'''
+    r = _mbCopyState(d)
+    for k in _mbStartReset:
+        if k in r: del r[k]
+    return r
+
 class onDrawStr(str):
     def __new__(cls,value,onDraw,label,kind=None):
         self = str.__new__(cls,value)
@@ -453,6 +552,7 @@ class BaseDocTemplate:
                     }
     _invalidInitArgs = ()
     _firstPageTemplateIndex = 0
+    _mbPending = None
 
     def __init__(self, filename, **kw):
         """create a document template bound to a filename (see class documentation for keyword arguments)"""
@@ -539,7 +639,7 @@ class BaseDocTemplate:
         if self._debug: logger.debug("beginning page %d" % self.page)
         self.pageTemplate.beforeDrawPage(self.canv,self)
         self.pageTemplate.checkPageSize(self.canv,self)
-        self.pageTemplate.onPage(self.canv,self)
+        self.pageTemplate.drawOnPage(self.canv,self)
         for f in self.pageTemplate.frames: f._reset()
         self.beforePage()
         #keep a count of flowables added to this page.  zero indicates bad stuff
@@ -881,11 +981,24 @@ class BaseDocTemplate:
         #to take priority, so cache and reapply our own info dictionary after the build.
         canv = self.canv
         self._savedInfo = canv._doc.info
+        self._buildFlowables(flowables,flowableCount)
+
+        #reapply pagecatcher info
+        canv._doc.info = self._savedInfo
+
+        self._endBuild()
+        if self._onProgress:
+            self._onProgress('FINISHED',0)
+
+    def _buildFlowables(self, flowables, flowableCount):
+        '''the main layout loop of build'''
+        canv = self.canv
         handled = 0
 
         try:
             canv._doctemplate = self
             while len(flowables):
+                if self._mbPending: self._mbCheckpoint(flowables)
                 self.clean_hanging()
                 try:
                     first = flowables[0]
@@ -911,14 +1024,6 @@ class BaseDocTemplate:
         finally:
             del canv._doctemplate
 
-
-        #reapply pagecatcher info
-        canv._doc.info = self._savedInfo
-
-        self._endBuild()
-        if self._onProgress:
-            self._onProgress('FINISHED',0)
-
     def _allSatisfied(self):
         """Called by multi-build - are all cross-references resolved?"""
         allHappy = 1
@@ -941,11 +1046,22 @@ class BaseDocTemplate:
 
     def multiBuild(self, story,
                    maxPasses = 10,
+                   incremental = 0,
                    **buildKwds
                    ):
         """Makes multiple passes until all indexing flowables
         are happy.
-        
+
+        If incremental is true the passes after the first restart the
+        layout at the last page start before the first unsatisfied indexing
+        flowable and keep the earlier pages of the previous pass.  Only page
+        starts where the rest of the story is untouched (no split parts,
+        KeepTogether or keepWithNext groups pending) and no page template
+        cycle is running can be restart points.  Everything which changes
+        between passes must then be carried by indexing flowables which
+        support getBuildState; when no restart page is known a full pass
+        is made.
+
         Returns number of passes"""
         self._indexingFlowables = []
         #scan the story and keep a copy
@@ -958,41 +1074,156 @@ class BaseDocTemplate:
         passes = 0
         mbe = []
         self._multiBuildEdits = mbe.append
-        while 1:
-            passes += 1
-            if self._onProgress:
-                self._onProgress('PASS', passes)
-            if verbose: print 'building pass '+str(passes) + '...',
-
-            for fl in self._indexingFlowables:
-                fl.beforeBuild()
-
-            # work with a copy of the story, since it is consumed
-            tempStory = story[:]
-            self.build(tempStory, **buildKwds)
-            #self.notify('debug',None)
+        self._mbEdits = mbe
+        resume = None
+        try:
+            while 1:
+                passes += 1
+                if self._onProgress:
+                    self._onProgress('PASS', passes)
+                if verbose: print 'building pass '+str(passes) + '...',
+
+                for fl in self._indexingFlowables:
+                    fl.beforeBuild()
+
+                if resume is None:
+                    if incremental:
+                        self._mbStory = story
+                        self._mbCheckpoints = []
+                        self._mbPending = dict([(id(fl),fl) for fl in self._indexingFlowables])
+                        self._mbPage = self._mbHead = None
+                        self._mbEdited = [0,{}]
+                        self._mbStart = _mbStartState(self.__dict__)
+                    # work with a copy of the story, since it is consumed
+                    tempStory = story[:]
+                    self.build(tempStory, **buildKwds)
+                else:
+                    self._mbResume(resume,len(story))
+                #self.notify('debug',None)
+
+                for fl in self._indexingFlowables:
+                    fl.afterBuild()
+
+                happy = self._allSatisfied()
+
+                if happy:
+                    self._doSave = 0
+                    self.canv.save()
+                    break
+                if passes > maxPasses:
+                    raise IndexError, "Index entries not resolved after %d passes" % maxPasses
+
+                resume = None
+                n = 0
+                if incremental and _mbStartState(self.__dict__)==self._mbStart:
+                    #the next pass would start as the last full one did
+                    resume = self._mbResumePoint()
+                    if resume is not None:
+                        #edits made before the restart page stay in force
+                        n = self._mbCheckpoints[resume][1][-1]
+
+                #work through any edits
+                while len(mbe)>n:
+                    e = mbe.pop(n)
+                    e[0](*e[1:])
+        finally:
+            self._mbPending = None
+            for a in ('_mbCheckpoints','_mbPage','_mbEdits','_mbStory','_mbStart','_mbHead','_mbEdited'):
+                if hasattr(self,a): delattr(self,a)
 
-            for fl in self._indexingFlowables:
-                fl.afterBuild()
+        del self._multiBuildEdits
+        if verbose: print 'saved'
+        return passes
 
-            happy = self._allSatisfied()
+    def _mbCheckpoint(self, flowables):
+        '''called at the top of the layout loop during an incremental multiBuild
+        to record the last restartable page start before each indexing flowable'''
+        f = flowables[0]
+        if PageBegin in self._hanging and f is not self._mbHead:
+            cp = self._getCheckpoint(flowables)
+            if cp is not None: self._mbPage = cp
+        self._mbHead = f
+        pending = self._mbPending
+        if id(f) in pending:
+            del pending[id(f)]
+            self._mbCheckpoints.append((f,self._mbPage))
+
+    def _mbResumePoint(self):
+        '''return the index of the checkpoint to restart from or None'''
+        C = self._mbCheckpoints
+        found = {}
+        for i, (f, cp) in enumerate(C):
+            found[id(f)] = i
+        r = None
+        for f in self._indexingFlowables:
+            if f.isSatisfied(): continue
+            i = found.get(id(f),None)
+            if i is None or C[i][1] is None: return None
+            if r is None or i<r: r = i
+        return r
 
-            if happy:
-                self._doSave = 0
-                self.canv.save()
-                break
-            if passes > maxPasses:
-                raise IndexError, "Index entries not resolved after %d passes" % maxPasses
+    def _mbResume(self, i, flowableCount):
+        '''lay out the document again starting at checkpoint i'''
+        C = self._mbCheckpoints
+        cp = C[i][1]
+        #earlier checkpoints remain good
+        del C[i:]
+        seen = dict([(id(f),1) for f, x in C])
+        self._mbPending = dict([(id(f),f) for f in self._indexingFlowables if id(f) not in seen])
+        if self._onProgress:
+            self._onProgress('STARTED',0)
+            self._onProgress('SIZE_EST', flowableCount)
+        flowables = self._restoreCheckpoint(cp)
+        self._mbPage = cp
+        self._mbHead = None
+        self._mbEdited = [0,{}]
+        canv = self.canv
+        self._buildFlowables(flowables,flowableCount)
+        canv._doc.info = self._savedInfo
+        self._endBuild()
+        if self._onProgress:
+            self._onProgress('FINISHED',0)
 
-            #work through any edits
-            while mbe:
-                e = mbe.pop(0)
-                e[0](*e[1:])
+    def _getCheckpoint(self, flowables):
+        '''return the layout state at the start of a page or None if layout can't restart there'''
+        canv = self.canv
+        if not hasattr(canv,'_getCheckpoint') or canv._doc.streaming or canv._doc.inObject is not None:
+            return None
+        if getattr(self,'_nextPageTemplateCycle',None) is not None:
+            return None     #the cycle's position can't be saved
+        story = self._mbStory
+        k = len(story)-len(flowables)
+        if k<0 or flowables[0] is not story[k] or flowables[-1] is not story[-1]:
+            return None     #split parts or grouped flowables are pending
+        E = self._mbEdited
+        mbe = self._mbEdits
+        for e in mbe[E[0]:]:
+            E[1][id(e[1])] = 1
+        E[0] = len(mbe)
+        if id(flowables[0]) in E[1]:
+            return None     #eg it was postponed or held back by keepWithNext
+        states = []
+        for f in self._indexingFlowables:
+            state = f.getBuildState()
+            if state is None: return None
+            states.append((f,state))
+        return (_mbCopyState(self.__dict__), k, states, canv._getCheckpoint(), len(self._mbEdits))
+
+    def _restoreCheckpoint(self, cp):
+        '''return to a state recorded by _getCheckpoint, returns the flowables still to be laid out'''
+        d, k, states, ccp, n = cp
+        self.canv._restoreCheckpoint(ccp)
+        D = self.__dict__
+        keep = dict([(a,D[a]) for a in _mbNoCheckpoint if a in D])
+        D.clear()
+        D.update(_mbCopyState(d))
+        D.update(keep)
+        #the rest of the story was untouched when the checkpoint was made, so
+        #its flowables are left as the last pass left them, as a full pass would
+        for f, state in states:
+            f.setBuildState(state)
+        return self._mbStory[k:]
 
-        del self._multiBuildEdits
-        if verbose: print 'saved'
-        return passes
-        
     #these are pure virtuals override in derived classes
     #NB these get called at suitable places by the base class
     #so if you derive and override the handle_xxx methods
@@ -1128,6 +1359,124 @@ class SimpleDocTemplate(BaseDocTemplate):
             self.pageTemplates[1].beforeDrawPage = self.onLaterPages
         BaseDocTemplate.build(self,flowables, canvasmaker=canvasmaker)
 
+class BatchResult:
+    """outcome of one job in a buildBatch run
+
+    index   position of the job in the input
+    target  the output target; None if the pdf bytes are returned in data
+    error   None on success else a one line description of the failure
+    """
+    data = error = traceback = None
+    pages = size = 0
+    elapsed = 0.0
+    def __init__(self, index, target):
+        self.index = index
+        self.target = target
+
+    def __repr__(self):
+        return '<BatchResult %d %s %s>' % (self.index, self.error and 'failed' or 'ok', self.target)
+
+class BatchStats:
+    """throughput statistics accumulated by buildBatch"""
+    def __init__(self):
+        self.jobs = self.failed = self.pages = self.bytes = 0
+        self.jobTime = 0.0     #summed time spent building in the workers
+        self.started = time.time()
+        self.elapsed = 0.0     #wall clock time
+
+    def add(self, result):
+        self.jobs += 1
+        if result.error: self.failed += 1
+        self.pages += result.pages
+        self.bytes += result.size
+        self.jobTime += result.elapsed
+        self.elapsed = time.time()-self.started
+
+    def jobsPerSecond(self):
+        return self.elapsed and self.jobs/self.elapsed or 0.0
+
+    def __str__(self):
+        return '%d jobs (%d failed), %d pages, %d bytes in %.2fs: %.1f jobs/s' % (
+                self.jobs, self.failed, self.pages, self.bytes, self.elapsed, self.jobsPerSecond())
+
+def _batchInit(fonts, initializer, initargs):
+    "worker start up: register fonts once so each job starts warm"
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    for fontName, fileName in fonts:
+        pdfmetrics.registerFont(TTFont(fontName, fileName))
+    if initializer: initializer(*initargs)
+
+def _batchBuild(job):
+    "build one batch job, never raising"
+    index, storyFactory, target, docTemplate, docKwds = job
+    R = BatchResult(index, target)
+    t = time.time()
+    try:
+        if target is None:
+            from reportlab.lib.utils import getStringIO
+            f = getStringIO()
+        else:
+            f = target
+        doc = docTemplate(f, **docKwds)
+        doc.build(storyFactory())
+        R.pages = doc.canv._doc.pageCounter-1
+        if target is None:
+            R.data = f.getvalue()
+            R.size = len(R.data)
+        elif isinstance(target,basestring):
+            R.size = os.path.getsize(target)
+    except:
+        import traceback
+        t_, v = sys.exc_info()[:2]
+        R.error = '%s: %s' % (getattr(t_,'__name__',t_), v)
+        R.traceback = traceback.format_exc()
+    R.elapsed = time.time()-t
+    return R
+
+def buildBatch(jobs, processes=None, docTemplate=None, docKwds={}, fonts=(),
+                initializer=None, initargs=(), stats=None, chunksize=1):
+    """build many independent documents in a pool of worker processes.
+
+    jobs is an iterable of (storyFactory, target) pairs; storyFactory is called
+    with no arguments in the worker and must return the list of flowables, target
+    is a filename or None to have the pdf bytes returned.  Both must be picklable
+    (eg module level functions).  Each document is made with docTemplate(target,**docKwds)
+    (default SimpleDocTemplate).
+
+    Workers are started once; fonts is a sequence of (fontName, ttfFileName) pairs
+    registered in each worker and initializer(*initargs) is then called there. Fonts
+    already registered in the parent are inherited where the platform forks.
+
+    BatchResults are yielded in completion order.  A failing job does not stop the
+    others; its result has error and traceback set.  If a BatchStats instance is
+    passed as stats it is updated as results arrive.  processes=0 builds everything
+    in this process.
+    """
+    docTemplate = docTemplate or SimpleDocTemplate
+    tasks = ((i, factory, target, docTemplate, docKwds) for i, (factory, target) in enumerate(jobs))
+    if processes==0:
+        _batchInit(fonts, initializer, initargs)
+        results = imap(_batchBuild, tasks)
+        pool = None
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes, _batchInit, (fonts, initializer, initargs))
+        results = pool.imap_unordered(_batchBuild, tasks, chunksize)
+    try:
+        for R in results:
+            if stats is not None: stats.add(R)
+            yield R
+    except:
+        if pool:
+            pool.terminate()
+            pool = None
+        raise
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
 def progressCB(typ, value):
     """Example prototype for progress monitoring.
 
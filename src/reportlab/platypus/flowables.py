@@ -33,6 +33,7 @@ from reportlab.lib.styles import _baseFontName
 from reportlab.pdfbase import pdfutils
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.rl_config import _FUZZ, overlapAttachedSpace, ignoreContainerActions
+from reportlab import rl_config
 
 __all__=('TraceInfo','Flowable','XBox','Preformatted','Image','Spacer','PageBreak','SlowPageBreak',
         'CondPageBreak','KeepTogether','Macro','CallerMacro','ParagraphAndImage',
@@ -65,6 +66,7 @@ class Flowable:
     """
     _fixedWidth = 0         #assume wrap results depend on arguments?
     _fixedHeight = 0
+    _wrapCacheHeight = 1    #does a cached wrap depend on availHeight?
 
     def __init__(self):
         self.width = 0
@@ -127,6 +129,24 @@ class Flowable:
         size actually used."""
         return (self.width, self.height)
 
+    def _getCachedWrap(self, aW, aH):
+        """return the size from the last wrap if it was made with the same
+        arguments (see rl_config.wrapCaching) else None"""
+        C = self.__dict__.get('_wrapCache',None)
+        if C and C[0]==(aW, self._wrapCacheHeight and aH):
+            return C[1]
+
+    def _setCachedWrap(self, aW, aH, size):
+        "remember the result of a wrap if caching is on; returns size"
+        if getattr(self,'cacheWrap',rl_config.wrapCaching):
+            self._wrapCache = (aW, self._wrapCacheHeight and aH), size
+        return size
+
+    def clearWrapCache(self):
+        """forget any cached wrap; call this after changing anything the
+        result of wrap depends on"""
+        self.__dict__.pop('_wrapCache',None)
+
     def minWidth(self):
         """This should return the minimum required width"""
         return getattr(self,'_minWidth',self.width)
@@ -331,10 +351,14 @@ class Preformatted(Flowable):
             H = "Preformatted(bulletText=%s," % repr(bT)
         return "%s'''\\ \n%s''')" % (H, '\n'.join(self.lines))
 
+    _wrapCacheHeight = 0
+
     def wrap(self, availWidth, availHeight):
+        size = self._getCachedWrap(availWidth, availHeight)
+        if size: return size
         self.width = availWidth
         self.height = self.style.leading*len(self.lines)
-        return (self.width, self.height)
+        return self._setCachedWrap(availWidth, availHeight, (self.width, self.height))
 
     def minWidth(self):
         style = self.style
@@ -344,6 +368,7 @@ class Preformatted(Flowable):
 
     def split(self, availWidth, availHeight):
         #returns two Preformatted objects
+        self.clearWrapCache()
 
         #not sure why they can be called with a negative height
         if availHeight < self.style.leading:
@@ -8,19 +8,73 @@ from operator import truth
 from types import StringType, ListType
 from unicodedata import category
 from reportlab.pdfbase.pdfmetrics import stringWidth, getFont, getAscentDescent
-from reportlab.platypus.paraparser import ParaParser
+from reportlab.pdfbase import pdfmetrics
+from reportlab.platypus.paraparser import ParaParser, _copyFrag
 from reportlab.platypus.flowables import Flowable
 from reportlab.lib.colors import Color
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER, TA_JUSTIFY
 from reportlab.lib.utils import _className
 from reportlab.lib.geomutils import normalizeTRBL
-from reportlab.lib.textsplit import wordSplit, ALL_CANNOT_START
+from reportlab.lib.textsplit import wordSplit, ALL_CANNOT_START, Box, Glue, Penalty, KP_INFINITY, knuthPlassBreaks, getHyphenator
 from copy import deepcopy
 from reportlab.lib.abag import ABag
 from reportlab.rl_config import platypus_link_underline
 from reportlab import rl_config
+from reportlab.lib import fonts
 import re
 
+class WordWidthCache:
+    """Bounded cache of string widths shared by the paragraph line breaking code.
+
+    Entries are kept in two generations; when the current one holds maxSize/2
+    entries it becomes the old one and the previous old one is dropped.  Words
+    found in the old generation are promoted so frequently used words survive,
+    giving an approximate LRU without any per lookup bookkeeping.  The cache
+    empties itself when a font is registered as that may replace the metrics
+    of a font name already seen.  hits and misses count the lookups;
+    maxSize=0 disables caching."""
+    def __init__(self, maxSize=None):
+        if maxSize is None: maxSize = rl_config.wordWidthCacheSize
+        self.maxSize = maxSize
+        self.clear()
+
+    def clear(self):
+        self._new = {}
+        self._old = {}
+        self.hits = self.misses = 0
+        self._fontGeneration = pdfmetrics.fontGeneration
+
+    def __len__(self):
+        return len(self._new)+len(self._old)
+
+    def stringWidth(self, text, fontName, fontSize, encoding='utf8'):
+        "cached equivalent of pdfmetrics.stringWidth"
+        if self._fontGeneration!=pdfmetrics.fontGeneration: self.clear()
+        key = text, fontName, fontSize, encoding
+        try:
+            w = self._new[key]
+            self.hits += 1
+            return w
+        except KeyError:
+            pass
+        w = self._old.get(key)
+        if w is None:
+            self.misses += 1
+            w = stringWidth(text, fontName, fontSize, encoding)
+            if not self.maxSize: return w
+        else:
+            self.hits += 1
+        new = self._new
+        if len(new)>=self.maxSize//2:
+            self._old = new
+            new = self._new = {}
+        new[key] = w
+        return w
+
+wordWidthCache = WordWidthCache()
+_wordWidth = wordWidthCache.stringWidth
+rl_config.register_reset(wordWidthCache.clear)
+
 #on UTF8 branch, split and strip must be unicode-safe!
 #thanks to Dirk Holtwick for helpful discussions/insight
 #on this one
@@ -443,7 +497,7 @@ def _getFragWords(frags,maxWidth=None):
 
             for w in S[:-1]:
                 W.append((f,w))
-                n += stringWidth(w, f.fontName, f.fontSize)
+                n += _wordWidth(w, f.fontName, f.fontSize)
                 W.insert(0,n)
                 R.append(W)
                 W = []
@@ -451,7 +505,7 @@ def _getFragWords(frags,maxWidth=None):
 
             w = S[-1]
             W.append((f,w))
-            n += stringWidth(w, f.fontName, f.fontSize)
+            n += _wordWidth(w, f.fontName, f.fontSize)
             if text and text[-1] in whitespace:
                 W.insert(0,n)
                 R.append(W)
@@ -592,7 +646,7 @@ def splitLines0(frags,widths):
         while cLen<maxW:
             j = text.find(' ',start)
             if j<0: j==lim
-            w = stringWidth(text[start:j],f.fontName,f.fontSize)
+            w = _wordWidth(text[start:j],f.fontName,f.fontSize)
             cLen += w
             if cLen>maxW and line!=[]:
                 cLen = cLen-w
@@ -728,6 +782,71 @@ def textTransformFrags(frags,style):
                 if not t: continue
                 f.text = tt(t.decode('utf8')).encode('utf8')
 
+_re_noFragCache = re.compile(r'<\s*seq',re.I)
+class ParaFragCache:
+    """Bounded cache of parsed paragraph markup used by Paragraph._setup.
+
+    Entries are keyed on the raw text, its type, caseSensitive, the style
+    identity and the font mapping generation, so addMapping and
+    registerFontFamily invalidate them; the style's attribute dictionary is
+    remembered too so a style changed in place since the parse is a miss.
+    Each paragraph gets its own copies of the cached frags so they may be
+    changed freely.  Text using <seq> tags is never cached as its content
+    depends on the sequencer state.  Like WordWidthCache this keeps two
+    generations; maxSize=0 disables it."""
+    def __init__(self, maxSize=None):
+        if maxSize is None: maxSize = rl_config.paraFragCacheSize
+        self.maxSize = maxSize
+        self.clear()
+
+    def clear(self):
+        self._new = {}
+        self._old = {}
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._new)+len(self._old)
+
+    def parse(self, text, style, caseSensitive):
+        """cached equivalent of parsing cleanBlockQuotedText(text) with
+        our parser and applying textTransformFrags; returns
+        (text, style, frags, bulletTextFrags)"""
+        key = text, type(text), id(style), caseSensitive, fonts.mappingGeneration
+        sd = style.__dict__
+        new = self._new
+        v = new.get(key)
+        if v is not None and v[1]==sd:
+            self.hits += 1
+            return self._copy(v[2])
+        v = self._old.get(key)
+        if v is not None and v[1]==sd:
+            self.hits += 1
+        else:
+            self.misses += 1
+            text = cleanBlockQuotedText(text)
+            _parser.caseSensitive = caseSensitive
+            pStyle, frags, bulletTextFrags = _parser.parse(text,style)
+            if frags is None:
+                raise ValueError("xml parser error (%s) in paragraph beginning\n'%s'"\
+                    % (_parser.errors[0],text[:min(30,len(text))]))
+            textTransformFrags(frags,pStyle)
+            v = style, sd.copy(), (text, pStyle, frags, bulletTextFrags)
+            if not self.maxSize or _re_noFragCache.search(text): return v[2]
+        if len(new)>=self.maxSize//2 and key not in new:
+            self._old = new
+            new = self._new = {}
+        new[key] = v
+        return self._copy(v[2])
+
+    def _copy(self, v):
+        text, pStyle, frags, bulletTextFrags = v
+        frags = map(_copyFrag,frags)
+        if bulletTextFrags: bulletTextFrags = map(_copyFrag,bulletTextFrags)
+        return text, pStyle, frags, bulletTextFrags
+
+paraFragCache = ParaFragCache()
+rl_config.register_reset(paraFragCache.clear)
+
 class cjkU(unicode):
     '''simple class to hold the frag corresponding to a str'''
     def __new__(cls,value,frag,encoding):
@@ -737,7 +856,7 @@ class cjkU(unicode):
             w = getattr(frag.cbDefn,'width',0)
             self._width = w
         else:
-            self._width = stringWidth(value,frag.fontName,frag.fontSize)
+            self._width = _wordWidth(value,frag.fontName,frag.fontSize)
         return self
     frag = property(lambda self: self._frag)
     width = property(lambda self: self._width)
@@ -913,6 +1032,8 @@ class Paragraph(Flowable):
 
         It will also be able to handle any MathML specified Greek characters.
     """
+    _wrapCacheHeight = 0    #the lines don't depend on the available height
+
     def __init__(self, text, style, bulletText = None, frags=None, caseSensitive=1, encoding='utf8'):
         self.caseSensitive = caseSensitive
         self.encoding = encoding
@@ -929,13 +1050,16 @@ class Paragraph(Flowable):
 
     def _setup(self, text, style, bulletText, frags, cleaner):
         if frags is None:
-            text = cleaner(text)
-            _parser.caseSensitive = self.caseSensitive
-            style, frags, bulletTextFrags = _parser.parse(text,style)
-            if frags is None:
-                raise ValueError("xml parser error (%s) in paragraph beginning\n'%s'"\
-                    % (_parser.errors[0],text[:min(30,len(text))]))
-            textTransformFrags(frags,style)
+            if cleaner is cleanBlockQuotedText:
+                text, style, frags, bulletTextFrags = paraFragCache.parse(text,style,self.caseSensitive)
+            else:
+                text = cleaner(text)
+                _parser.caseSensitive = self.caseSensitive
+                style, frags, bulletTextFrags = _parser.parse(text,style)
+                if frags is None:
+                    raise ValueError("xml parser error (%s) in paragraph beginning\n'%s'"\
+                        % (_parser.errors[0],text[:min(30,len(text))]))
+                textTransformFrags(frags,style)
             if bulletTextFrags: bulletText = bulletTextFrags
 
         #AR hack
@@ -946,6 +1070,9 @@ class Paragraph(Flowable):
         self.debug = 0  #turn this on to see a pretty one with all the margins etc.
 
     def wrap(self, availWidth, availHeight):
+        if 'blPara' in self.__dict__:
+            size = self._getCachedWrap(availWidth, availHeight)
+            if size: return size
         # work out widths array for breaking
         self.width = availWidth
         style = self.style
@@ -956,6 +1083,9 @@ class Paragraph(Flowable):
         if style.wordWrap == 'CJK':
             #use Asian text wrap algorithm to break characters
             blPara = self.breakLinesCJK([first_line_width, later_widths])
+        elif style.wordWrap == 'KP':
+            #total fit line breaking
+            blPara = self.breakLinesKP([first_line_width, later_widths])
         else:
             blPara = self.breakLines([first_line_width, later_widths])
         self.blPara = blPara
@@ -981,7 +1111,7 @@ class Paragraph(Flowable):
                 leading = blPara.ascent-blPara.descent
             height = len(blPara.lines) * leading
         self.height = height
-        return self.width, height
+        return self._setCachedWrap(availWidth, availHeight, (self.width, height))
 
     def minWidth(self):
         'Attempt to determine a minimum sensible width'
@@ -993,7 +1123,7 @@ class Paragraph(Flowable):
             fS = f.fontSize
             fN = f.fontName
             words = hasattr(f,'text') and split(f.text, ' ') or f.words
-            func = lambda w, fS=fS, fN=fN: stringWidth(w,fN,fS)
+            func = lambda w, fS=fS, fN=fN: _wordWidth(w,fN,fS)
         else:
             words = _getFragWords(frags)
             func  = lambda x: x[0]
@@ -1003,6 +1133,7 @@ class Paragraph(Flowable):
         return self.blPara.kind==0 and _split_blParaSimple or _split_blParaHard
 
     def split(self,availWidth, availHeight):
+        self.clearWrapCache()
         if len(self.frags)<=0: return []
 
         #the split information is all inside self.blPara
@@ -1088,7 +1219,7 @@ class Paragraph(Flowable):
         #so not doing it here makes it easier to switch.
         self.drawPara(self.debug)
 
-    def breakLines(self, width):
+    def breakLines(self, width, frags=None):
         """
         Returns a broken line structure. There are two cases
 
@@ -1117,7 +1248,7 @@ class Paragraph(Flowable):
         You can supply either a single width or a list of widths; the latter will have its
         last item repeated until necessary. A 2-element list is useful when there is a
         different first line indent; a longer list could be created to facilitate custom wraps
-        around irregular objects."""
+        around irregular objects. frags may be given to break something other than self.frags."""
 
         if not isinstance(width,(tuple,list)): maxWidths = [width]
         else: maxWidths = width
@@ -1132,7 +1263,7 @@ class Paragraph(Flowable):
 
         autoLeading = getattr(self,'autoLeading',getattr(style,'autoLeading',''))
         calcBounds = autoLeading not in ('','off')
-        frags = self.frags
+        if frags is None: frags = self.frags
         nFrags= len(frags)
         if nFrags==1 and not hasattr(frags[0],'cbDefn') and not style.endDots:
             f = frags[0]
@@ -1151,12 +1282,12 @@ class Paragraph(Flowable):
                     if strip(w): break
                 else:
                     return f.clone(kind=0, lines=[],ascent=ascent,descent=descent,fontSize=fontSize)
-            spaceWidth = stringWidth(' ', fontName, fontSize, self.encoding)
+            spaceWidth = _wordWidth(' ', fontName, fontSize, self.encoding)
             cLine = []
             currentWidth = -spaceWidth   # hack to get around extra space for word 1
             for word in words:
                 #this underscores my feeling that Unicode throughout would be easier!
-                wordWidth = stringWidth(word, fontName, fontSize, self.encoding)
+                wordWidth = _wordWidth(word, fontName, fontSize, self.encoding)
                 newWidth = currentWidth + spaceWidth + wordWidth
                 if newWidth <= maxWidth or not len(cLine):
                     # fit one more on this line
@@ -1195,7 +1326,7 @@ class Paragraph(Flowable):
                 f=w[-1][0]
                 fontName = f.fontName
                 fontSize = f.fontSize
-                spaceWidth = stringWidth(' ',fontName, fontSize)
+                spaceWidth = _wordWidth(' ',fontName, fontSize)
 
                 if not words:
                     currentWidth = -spaceWidth   # hack to get around extra space for word 1
@@ -1344,6 +1475,196 @@ class Paragraph(Flowable):
 
         return lines
 
+    def _getKPWords(self, simple, maxWidth):
+        '''return the words seen by breakLines as lists
+        [width, spaceWidth, lineBreak, fontName, fontSize, text, key]
+        where key locates the word text in self.frags for hyphenation'''
+        frags = self.frags
+        W = []
+        if simple:
+            f = frags[0]
+            if hasattr(f,'text'):
+                words = split(strip(f.text))
+            else:
+                words = f.words
+            fontName = f.fontName
+            fontSize = f.fontSize
+            spaceWidth = _wordWidth(' ', fontName, fontSize, self.encoding)
+            for i, word in enumerate(words):
+                W.append([_wordWidth(word, fontName, fontSize, self.encoding),spaceWidth,0,fontName,fontSize,word,i])
+        else:
+            pieces = {}
+            for w in _getFragWords(frags,maxWidth):
+                f = w[-1][0]
+                word = [w[0],_wordWidth(' ',f.fontName,f.fontSize),hasattr(w[1][0],'lineBreak'),f.fontName,f.fontSize,None,None]
+                for f, t in w[1:]:
+                    i = pieces.get(id(f),0)
+                    pieces[id(f)] = i+1
+                    if len(w)==2 and t: word[5:] = [t,(id(f),i)]
+                W.append(word)
+        return W
+
+    def _getKPItems(self, W, justify, hyphenator):
+        '''convert words to boxes, glues and penalties; returns the items and
+        a list of the words or (word,hyphen position) each item breaks before'''
+        items = []
+        refs = []
+        hasWidth = 0
+        for k, (width, spaceWidth, lineBreak, fontName, fontSize, text, key) in enumerate(W):
+            if lineBreak:
+                items.append(Glue(0,KP_INFINITY*1000,0))
+                items.append(Penalty(0,-KP_INFINITY))
+                refs.append(None)
+                refs.append(None)
+                hasWidth = 0
+                continue
+            if width>0:
+                if hasWidth:
+                    if justify:
+                        items.append(Glue(spaceWidth,spaceWidth,0))
+                    else:
+                        items.append(Glue(spaceWidth,3*spaceWidth,0))
+                    refs.append(k)
+                hasWidth = 1
+            H = None
+            if hyphenator and text and len(text)>4 and isinstance(text,str):
+                core = text.rstrip('.,;:!?\'")]')
+                if core.isalpha():
+                    H = [i for i in hyphenator(core.lower()) if 1<i<len(core)-2]
+            if H:
+                hyphenWidth = _wordWidth('-',fontName,fontSize,self.encoding)
+                j = 0
+                for i in H:
+                    items.append(Box(_wordWidth(text[j:i],fontName,fontSize,self.encoding)))
+                    items.append(Penalty(hyphenWidth,50,1))
+                    refs.append(None)
+                    refs.append((k,i))
+                    j = i
+                items.append(Box(_wordWidth(text[j:],fontName,fontSize,self.encoding)))
+            else:
+                items.append(Box(width))
+            refs.append(None)
+        if W and not W[-1][2]:
+            items.append(Glue(0,KP_INFINITY*1000,0))
+            items.append(Penalty(0,-KP_INFINITY))
+            refs.append(None)
+            refs.append(None)
+        return items, refs
+
+    def _hyphenateKPFrags(self, simple, W, H):
+        '''return a copy of self.frags with the words W[k] split at the positions H[k]'''
+        def hyphenate(text,P):
+            R = []
+            j = 0
+            for i in P:
+                R.append(text[j:i]+'-')
+                j = i
+            R.append(text[j:])
+            return R
+
+        frags = self.frags
+        if simple:
+            f = frags[0]
+            words = []
+            for k, w in enumerate(W):
+                if k in H:
+                    words.extend(hyphenate(w[5],H[k]))
+                else:
+                    words.append(w[5])
+            g = f.clone()
+            if hasattr(g,'text'): del g.text
+            g.words = words
+            return [g]
+        P = {}
+        for k in H:
+            fid, i = W[k][6]
+            P.setdefault(fid,{})[i] = hyphenate(W[k][5],H[k])
+        F = []
+        for f in frags:
+            if id(f) in P:
+                text = f.text
+                g = f.clone()
+                R = []
+                for i, t in enumerate(split(text)):
+                    R.extend(P[id(f)].get(i,[t]))
+                g.text = join(R,' ')
+                if text[0] in whitespace: g.text = ' '+g.text
+                if text[-1] in whitespace: g.text += ' '
+                f = g
+            F.append(f)
+        return F
+
+    def breakLinesKP(self, maxWidths):
+        """Knuth-Plass total fit line breaking; the breaks are chosen to minimize the demerits
+        of the whole paragraph and the lines are then built by breakLines.  If style.hyphenation
+        is set words may be hyphenated using pyHnj or, if it is callable, the positions it returns
+        for a lower case word. We fall back to breakLines when there is no acceptable set of breaks
+        and for paragraphs which fit on one line or are neither justified nor hyphenated; this is
+        still several times slower than breakLines so is best kept for text which needs it."""
+        if not isinstance(maxWidths,(list,tuple)): maxWidths = [maxWidths]
+        style = self.style
+        frags = self.frags
+        nFrags = len(frags)
+        simple = nFrags==1 and not hasattr(frags[0],'cbDefn') and not style.endDots
+        if hasattr(self,'blPara') and getattr(self,'_splitpara',0):
+            if not simple: return self.blPara
+            f = frags[0]
+            ascent, descent = getAscentDescent(f.fontName,f.fontSize)
+            return f.clone(kind=0, lines=self.blPara.lines, ascent=ascent, descent=descent, fontSize=f.fontSize)
+        if nFrags<=0: return self.breakLines(maxWidths)
+
+        justify = style.alignment==TA_JUSTIFY
+        hyphenator = getattr(style,'hyphenation',0)
+        if not (justify or hyphenator): return self.breakLines(maxWidths)
+        widths = list(maxWidths)
+        _handleBulletWidth(self.bulletText,style,widths)
+        W = self._getKPWords(simple,widths[0])
+        if W and sum([w[0]+w[1] for w in W])-W[-1][1]<=widths[0] and not [w for w in W if w[2]]:
+            return self.breakLines(maxWidths)
+        if hyphenator and not callable(hyphenator): hyphenator = getHyphenator()
+        items, refs = self._getKPItems(W,justify,hyphenator)
+        #the tolerance is raised in steps as looser passes keep more active breaks
+        breaks = (knuthPlassBreaks(items,widths) or knuthPlassBreaks(items,widths,KP_INFINITY)
+                    or knuthPlassBreaks(items,widths,1e30))
+        if not breaks: return self.breakLines(maxWidths)
+
+        #work out a width for each line which makes breakLines break where we chose
+        G = []
+        H = {}
+        s = 0
+        nWidths = len(widths)
+        for i, b in enumerate(breaks):
+            lineWidth = widths[min(i,nWidths-1)]
+            natural = 0
+            for item in items[s:b]:
+                if not item.is_penalty: natural += item.width
+            item = items[b]
+            if item.is_penalty:
+                natural += item.width
+            if item.is_penalty and item.penalty<=-KP_INFINITY:
+                G.append(natural+lineWidth)
+            else:
+                G.append(natural+0.5*items[b+1].width)
+                if refs[b].__class__ is tuple:
+                    k, j = refs[b]
+                    H.setdefault(k,[]).append(j)
+            s = b+1
+        frags = H and self._hyphenateKPFrags(simple,W,H) or None
+        delta = maxWidths[0]-widths[0]
+        blPara = self.breakLines([G[0]+delta]+G[1:],frags)
+        lines = blPara.lines
+        if len(lines)!=len(G): return self.breakLines(maxWidths)
+
+        #the lines now get their real widths
+        for i, l in enumerate(lines):
+            lineWidth = widths[min(i,nWidths-1)]
+            if blPara.kind==0:
+                lines[i] = (l[0]+lineWidth-G[i],l[1])
+            else:
+                l.extraSpace += lineWidth-G[i]
+                l.maxWidth = lineWidth
+        return blPara
+
     def breakLinesCJK(self, maxWidths):
         """Initially, the dumbest possible wrapping algorithm.
         Cannot handle font variations."""
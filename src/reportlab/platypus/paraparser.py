@@ -5,7 +5,7 @@ __version__=''' $Id$ '''
 __doc__='''The parser used to process markup within paragraphs'''
 import string
 import re
-from types import TupleType, UnicodeType, StringType
+from types import TupleType, UnicodeType, StringType, InstanceType
 import sys
 import os
 import copy
@@ -26,6 +26,8 @@ from reportlab.lib.fonts import tt2ps, ps2tt
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER, TA_JUSTIFY
 from reportlab.lib.units import inch,mm,cm,pica
 _re_para = re.compile(r'^\s*<\s*para(?:\s+|>|/>)')
+_re_fastToken = re.compile(r'''(?P<data>[^<&]+)|<(?P<end>/?)(?P<tag>[a-z_][a-z0-9_]*)(?P<attrs>(?:[ \t\r\n]+[a-zA-Z_:][-a-zA-Z0-9._:]*[ \t\r\n]*=[ \t\r\n]*(?:"[^"<>&]*"|'[^'<>&]*'|[-a-zA-Z0-9.:+*%?!()_#=~]+))*)[ \t\r\n]*(?P<slash>/?)>|&(?:#(?P<char>[0-9]+|x[0-9a-fA-F]+)|(?P<entity>[a-zA-Z_:][-a-zA-Z0-9._:]*));''')
+_re_fastAttr = re.compile(r'''([a-zA-Z_:][-a-zA-Z0-9._:]*)[ \t\r\n]*=[ \t\r\n]*(?:"([^"<>&]*)"|'([^'<>&]*)'|([-a-zA-Z0-9.:+*%?!()_#=~]+))''')
 
 sizeDelta = 2       # amount to reduce font size by for super and sub script
 subFraction = 0.5   # fraction of font size that a sub script should be lowered
@@ -494,6 +496,12 @@ class ParaFrag(ABag):
     fontname, fontSize, rise, textColor, cbDefn
     """
 
+def _copyFrag(frag):
+    "a cheaper copy.copy for the frags pushed and emitted by the parser"
+    if frag.__class__ is ParaFrag:
+        return InstanceType(ParaFrag,frag.__dict__.copy())
+    return copy.copy(frag)
+
 
 _greek2Utf8=None
 def _greekConvert(data):
@@ -965,7 +973,7 @@ class ParaParser(xmllib.XMLParser):
 
     #---------------------------------------------------------------
     def _push(self,**attr):
-        frag = copy.copy(self._stack[-1])
+        frag = _copyFrag(self._stack[-1])
         _applyAttributes(frag,attr)
         self._stack.append(frag)
 
@@ -994,6 +1002,8 @@ class ParaParser(xmllib.XMLParser):
 
     #----------------------------------------------------------------
 
+    fastParse = 1   #try _fastTokenize before the full xmllib parser
+
     def __init__(self,verbose=0):
         self.caseSensitive = 0
         xmllib.XMLParser.__init__(self,verbose=verbose)
@@ -1015,7 +1025,7 @@ class ParaParser(xmllib.XMLParser):
     def handle_data(self,data):
         "Creates an intermediate representation of string segments."
 
-        frag = copy.copy(self._stack[-1])
+        frag = _copyFrag(self._stack[-1])
         if hasattr(frag,'cbDefn'):
             kind = frag.cbDefn.kind
             if data: self._syntax_error('Only empty <%s> tag allowed' % kind)
@@ -1080,10 +1090,69 @@ class ParaParser(xmllib.XMLParser):
         # given string
         if not(len(text)>=6 and text[0]=='<' and _re_para.match(text)):
             text = "<para>"+text+"</para>"
-        self.feed(text)
-        self.close()    # force parsing to complete
+        events = self.fastParse and self._fastTokenize(text)
+        if events:
+            self._fastFeed(events)
+        else:
+            self.feed(text)
+            self.close()    # force parsing to complete
         return self._complete_parse()
 
+    def _fastTokenize(self, text):
+        '''Split text into a list of parse events if it uses only properly
+        nested tags we have handlers for, attribute values without references
+        and terminated entity/char references; else return None so the full
+        xmllib parser (with its error reporting) is used.'''
+        events = []
+        tags = []
+        klass = self.__class__
+        pos = 0
+        for m in _re_fastToken.finditer(text):
+            if m.start()!=pos or not (tags or m.group('tag')): return None
+            pos = m.end()
+            kind = m.lastgroup
+            if kind=='data':
+                events.append((0,m.group(kind)))
+            elif kind=='slash':
+                tag = m.group('tag')
+                if m.group('end'):
+                    if m.group('attrs') or m.group(kind) or not tags or tags.pop()!=tag: return None
+                    events.append((2,tag))
+                else:
+                    if not hasattr(klass,'start_'+tag): return None
+                    attrs = {}
+                    A = m.group('attrs')
+                    if A:
+                        for k, v1, v2, v3 in _re_fastAttr.findall(A):
+                            if k in attrs: return None
+                            attrs[k] = v1 or v2 or v3
+                    events.append((1,tag,attrs))
+                    if m.group(kind):
+                        events.append((2,tag))
+                    else:
+                        tags.append(tag)
+            elif kind=='char':
+                events.append((4,m.group(kind)))
+            else:
+                events.append((3,m.group(kind)))
+        if tags or pos!=len(text): return None
+        return events
+
+    def _fastFeed(self, events):
+        '''call the handlers for events made by _fastTokenize'''
+        for e in events:
+            k = e[0]
+            if k==0:
+                self.handle_data(e[1])
+            elif k==1:
+                self.finish_starttag(e[1],e[2])
+            elif k==2:
+                self.finish_endtag(e[1])
+            elif k==3:
+                self.handle_entityref(e[1])
+            else:
+                self.handle_charref(e[1])
+
     def _complete_parse(self):
         del self._seq
         style = self._style
@@ -129,6 +129,104 @@ def drawPageNumbers(canvas, style, pages, availWidth, availHeight, dot=' . '):
         canvas.linkRect('', key, (pagex, y, pagex+w, y+style.leading), relative=1)
         pagex += w + commaw
 
+def deferredPrefix(flowable, canvas, kind):
+    '''return a form name prefix for the deferred page numbers of flowable'''
+    D = canvas.__dict__.setdefault('_deferredPrefixes',{})
+    try:
+        return D[id(flowable)]
+    except KeyError:
+        p = D[id(flowable)] = '%s%d' % (kind,len(D))
+        return p
+
+def deferredFontSize(canvas, style, n, availWidth, digits=3):
+    '''
+    Returns the font size at which n deferred page number fields for digits
+    figures fit between the current position and availWidth, shrinking in
+    10% steps as drawPageNumbers does.
+    '''
+    x = canvas._curr_tx_info['cur_x']
+    fontName = style.fontName
+    fontSize = style.fontSize
+    pagestrw = n*stringWidth('0'*digits, fontName, fontSize) + (n-1)*stringWidth(', ', fontName, fontSize)
+    freeWidth = availWidth-x
+    while pagestrw > freeWidth and fontSize >= 1.0:
+        fontSize = 0.9 * fontSize
+        pagestrw = n*stringWidth('0'*digits, fontName, fontSize) + (n-1)*stringWidth(', ', fontName, fontSize)
+    return fontSize
+
+def deferPageNumber(canvas, name, style, digits, getPage, fontSize=None):
+    '''
+    Defines the form name as a right aligned page number slot wide enough
+    for digits figures. getPage is called when the document is saved and
+    should return (pagestr, key); if key is not None the destination name
+    is made to point where key does. fontSize defaults to style.fontSize.
+    '''
+    fontName = style.fontName
+    if fontSize is None: fontSize = style.fontSize
+    slotw = stringWidth('0'*digits, fontName, fontSize)
+    def drawSlot(canv):
+        pagestr, key = getPage()
+        pagestr = str(pagestr)
+        fs = fontSize
+        while stringWidth(pagestr, fontName, fs)>slotw and fs>=1.0:
+            fs = 0.9 * fs
+        canv.setFont(fontName, fs)
+        canv.setFillColor(style.textColor)
+        canv.drawRightString(0, 0, pagestr)
+        if key is not None:
+            d = canv._bookmarkReference(name)
+            t = canv._bookmarkReference(key)
+            d.fmt, d.page = t.fmt, t.page
+    canvas.deferForm(name, drawSlot, -slotw, -fontSize, 0, style.leading)
+
+def drawDeferredPageNumbers(canvas, style, slots, availWidth, digits=3, dot=' . ', fontSize=None):
+    '''
+    Like drawPageNumbers, but the page numbers are not known yet. slots is a
+    list of (name, key) and for each a field wide enough for digits figures
+    is left in which the form name is drawn; the forms should be set up with
+    deferPageNumber at the same fontSize, which defaults to the size given by
+    deferredFontSize. If key is not None the field links to it.
+    '''
+    x, y = canvas._curr_tx_info['cur_x'], canvas._curr_tx_info['cur_y']
+    if fontSize is None: fontSize = deferredFontSize(canvas, style, len(slots), availWidth, digits)
+    slotw = stringWidth('0'*digits, style.fontName, fontSize)
+    commaw = stringWidth(', ', style.fontName, fontSize)
+    n = len(slots)
+    pagestrw = n*slotw + (n-1)*commaw
+
+    if isinstance(dot, basestring):
+        if dot:
+            dotw = stringWidth(dot, style.fontName, fontSize)
+            dotsn = int((availWidth-x-pagestrw)/dotw)
+        else:
+            dotsn = dotw = 0
+        text = dotsn * dot
+        newx = availWidth - dotsn*dotw - pagestrw
+        pagex = availWidth - pagestrw
+    elif dot is None:
+        text = ',  '
+        newx = x
+        pagex = newx + stringWidth(text, style.fontName, fontSize)
+    else:
+        raise TypeError('Argument dot should either be None or an instance of basestring.')
+
+    tx = canvas.beginText(newx, y)
+    tx.setFont(style.fontName, fontSize)
+    tx.setFillColor(style.textColor)
+    tx.textOut(text)
+    for i, (name, key) in enumerate(slots):
+        if i:
+            tx.setTextOrigin(pagex-commaw, y)
+            tx.textOut(', ')
+        canvas.saveState()
+        canvas.translate(pagex+slotw, y)
+        canvas.doForm(name)
+        canvas.restoreState()
+        if key:
+            canvas.linkRect('', key, (pagex, y, pagex+slotw, y+style.leading), relative=1)
+        pagex += slotw + commaw
+    canvas.drawText(tx)
+
 # Default paragraph styles for tables of contents.
 # (This could also be generated automatically or even
 # on-demand if it is not known how many levels the
@@ -163,7 +261,15 @@ class TableOfContents(IndexingFlowable):
     Set dotsMinLevel to determine from which level on a line of
     dots should be drawn between the text and the page number.
     If dotsMinLevel is set to a negative value, no dotted lines are drawn.
+
+    If deferPageNumbers is set the page numbers are drawn in fields wide
+    enough for pageNumberDigits figures whose content is only filled in when
+    the document is saved. Further passes are then needed only when the
+    entries themselves change, so a table preloaded with the right entries
+    needs a single pass.
     """
+    deferPageNumbers = 0
+    pageNumberDigits = 3
 
     def __init__(self):
         self.rightColumnWidth = 72
@@ -183,6 +289,8 @@ class TableOfContents(IndexingFlowable):
         return 1
 
     def isSatisfied(self):
+        if self.deferPageNumbers:
+            return [e[:2]+e[3:] for e in self._entries]==[e[:2]+e[3:] for e in self._lastEntries]
         return (self._entries == self._lastEntries)
 
     def notify(self, kind, stuff):
@@ -196,6 +304,12 @@ class TableOfContents(IndexingFlowable):
     def clearEntries(self):
         self._entries = []
 
+    def getBuildState(self):
+        return self._entries[:]
+
+    def setBuildState(self, state):
+        self._entries = state[:]
+
     def getLevelStyle(self, n):
         '''Returns the style for level n, generating and caching styles on demand if not present.'''
         try:
@@ -250,11 +364,24 @@ class TableOfContents(IndexingFlowable):
                 dot = ' . '
             else:
                 dot = ''
-            drawPageNumbers(canvas, style, [(page, key)], availWidth, availHeight, dot)
+            if self.deferPageNumbers:
+                #page is the entry index; the number comes from the final entries
+                name = '%s.%d' % (deferredPrefix(self,canvas,'TOC'),page)
+                def getPage(i=page,guess=_tempEntries[page][2]):
+                    if i<len(self._entries):
+                        return self._entries[i][2], None
+                    return guess, None
+                digits = self.pageNumberDigits
+                fontSize = deferredFontSize(canvas, style, 1, availWidth, digits)
+                deferPageNumber(canvas, name, style, digits, getPage, fontSize)
+                drawDeferredPageNumbers(canvas, style, [(name, key)], availWidth, digits, dot, fontSize)
+            else:
+                drawPageNumbers(canvas, style, [(page, key)], availWidth, availHeight, dot)
         self.canv.drawTOCEntryEnd = drawTOCEntryEnd
 
         tableData = []
-        for (level, text, pageNum, key) in _tempEntries:
+        for i, (level, text, pageNum, key) in enumerate(_tempEntries):
+            if self.deferPageNumbers: pageNum = i
             style = self.getLevelStyle(level)
             if key:
                 text = '<a href="#%s">%s</a>' % (key, text)
@@ -306,6 +433,7 @@ class SimpleIndex(IndexingFlowable):
         #keep stuff in a dictionary while building
         self._entries = {}
         self._lastEntries = {}
+        self._layoutCounts = None
         self._flowable = None
         self.setup(**kwargs)
 
@@ -316,7 +444,8 @@ class SimpleIndex(IndexingFlowable):
             raise ValueError('Unknown format %r' % format)
         return formatFunc
 
-    def setup(self, style=None, dot=None, tableStyle=None, headers=True, name=None, format='123', offset=0):
+    def setup(self, style=None, dot=None, tableStyle=None, headers=True, name=None, format='123', offset=0,
+                deferPageNumbers=0, pageNumberDigits=3):
         """
         This method makes it possible to change styling and other parameters on an existing object.
         
@@ -335,6 +464,10 @@ class SimpleIndex(IndexingFlowable):
                 <index item="term" name="myindex" />
 
         format can be 'I', 'i', '123',  'ABC', 'abc'
+        deferPageNumbers if true draws each page number in a field wide enough for pageNumberDigits
+            figures which is only filled in when the document is saved. Further passes are then
+            needed only if the terms or their number of pages change; an index placed after
+            everything it indexes needs a single pass.
         """
         
         if style is None:
@@ -350,6 +483,8 @@ class SimpleIndex(IndexingFlowable):
         self.name = name
         self.formatFunc = self.getFormatFunc(format)
         self.offset = offset
+        self.deferPageNumbers = deferPageNumbers
+        self.pageNumberDigits = pageNumberDigits
 
     def __call__(self,canv,kind,label):
         try:
@@ -386,16 +521,25 @@ class SimpleIndex(IndexingFlowable):
         return 1
 
     def isSatisfied(self):
+        if self.deferPageNumbers and self._layoutCounts is not None:
+            return self._layoutCounts==dict([(k,len(v)) for k,v in self._entries.iteritems()])
         return (self._entries == self._lastEntries)
 
     def beforeBuild(self):
         # keep track of the last run
         self._lastEntries = self._entries.copy()
+        self._layoutCounts = None
         self.clearEntries()
 
     def clearEntries(self):
         self._entries = {}
 
+    def getBuildState(self):
+        return dict([(k,v.copy()) for k,v in self._entries.iteritems()])
+
+    def setBuildState(self, state):
+        self._entries = dict([(k,v.copy()) for k,v in state.iteritems()])
+
     def notify(self, kind, stuff):
         """The notification hook called to register all kinds of events.
 
@@ -433,18 +577,41 @@ class SimpleIndex(IndexingFlowable):
         #was: _tempEntries.sort(lambda a,b: cmp([x.upper() for x in a[0]], [x.upper() for x in b[0]]))
         leveloffset = self.headers and 1 or 0
 
+        deferred = self.deferPageNumbers and (self._lastEntries or self._entries)
+        if deferred:
+            #the layout is right if the final entries have the same numbers of pages
+            self._layoutCounts = dict([(k,len(v)) for k,v in _tempEntries])
+        digits = self.pageNumberDigits
+
         def drawIndexEntryEnd(canvas, kind, label):
             '''Callback to draw dots and page numbers after each entry.'''
             style = self.getLevelStyle(leveloffset)
             pages = loads(decodestring(label))
-            drawPageNumbers(canvas, style, pages, availWidth, availHeight, self.dot)
+            if deferred:
+                j, terms, pages = pages
+                pages.sort()
+                prefix = deferredPrefix(self,canvas,'IX')
+                fontSize = deferredFontSize(canvas, style, len(pages), availWidth, digits)
+                slots = []
+                for k in xrange(len(pages)):
+                    name = '%s.%d.%d' % (prefix,j,k)
+                    def getPage(k=k,terms=terms,guess=pages[k]):
+                        P = sorted(self._entries.get(terms,()))
+                        if k<len(P): return P[k]
+                        return guess
+                    deferPageNumber(canvas, name, style, digits, getPage, fontSize)
+                    slots.append((name,name))
+                drawDeferredPageNumbers(canvas, style, slots, availWidth, digits, self.dot, fontSize)
+            else:
+                drawPageNumbers(canvas, style, pages, availWidth, availHeight, self.dot)
         self.canv.drawIndexEntryEnd = drawIndexEntryEnd
 
         alpha = ''
         tableData = []
         lastTexts = []
         alphaStyle = self.getLevelStyle(0)
-        for texts, pageNumbers in _tempEntries:
+        for j, (texts, pageNumbers) in enumerate(_tempEntries):
+            terms = texts
             texts = list(texts)
             #track when the first character changes; either output some extra
             #space, or the first letter on a row of its own.  We cannot do
@@ -465,7 +632,10 @@ class SimpleIndex(IndexingFlowable):
             if diff:
                 lastTexts = texts
                 texts = texts[i:]
-            label = encodestring(dumps(list(pageNumbers))).strip()
+            if deferred:
+                label = encodestring(dumps((j,terms,list(pageNumbers)))).strip()
+            else:
+                label = encodestring(dumps(list(pageNumbers))).strip()
             texts[-1] = '%s<onDraw name="drawIndexEntryEnd" label="%s"/>' % (texts[-1], label)
             for text in texts:
                 #Platypus and RML differ on how parsed XML attributes are escaped.  
@@ -533,7 +703,13 @@ def listdiff(l1, l2):
 
 class ReferenceText(IndexingFlowable):
     """Fakery to illustrate how a reference would work if we could
-    put it in a paragraph."""
+    put it in a paragraph.
+
+    If deferPageNumbers is set, space for pageNumberDigits figures is
+    left in the text and the page number is filled in when the document
+    is saved so no further pass is needed."""
+    deferPageNumbers = 0
+    pageNumberDigits = 3
     def __init__(self, textPattern, targetKey):
         self.textPattern = textPattern
         self.target = targetKey
@@ -545,6 +721,12 @@ class ReferenceText(IndexingFlowable):
     def beforeBuild(self):
         self._lastPageNum = self._pageNum
 
+    def getBuildState(self):
+        return self._pageNum
+
+    def setBuildState(self, state):
+        self._pageNum = state
+
     def notify(self, kind, stuff):
         if kind == 'Target':
             (key, pageNum) = stuff
@@ -552,10 +734,31 @@ class ReferenceText(IndexingFlowable):
                 self._pageNum = pageNum
 
     def wrap(self, availWidth, availHeight):
-        text = self.textPattern % self._lastPageNum
+        if self.deferPageNumbers:
+            text = self.textPattern % self._deferredSlot()
+        else:
+            text = self.textPattern % self._lastPageNum
         self._para = Paragraph(text, self.paraStyle)
         return self._para.wrap(availWidth, availHeight)
 
+    def _deferredSlot(self):
+        '''return paragraph markup for a deferred page number slot'''
+        canv = self.canv
+        style = self.paraStyle
+        name = deferredPrefix(self,canv,'REF')
+        digits = self.pageNumberDigits
+        slotw = stringWidth('0'*digits, style.fontName, style.fontSize)
+        spacew = stringWidth(' ', style.fontName, style.fontSize)
+        def drawSlot(canvas, kind, label):
+            x, y = canvas._curr_tx_info['cur_x'], canvas._curr_tx_info['cur_y']
+            deferPageNumber(canvas, name, style, digits, lambda: (self._pageNum, None))
+            canvas.saveState()
+            canvas.translate(x+slotw, y)
+            canvas.doForm(name)
+            canvas.restoreState()
+        setattr(canv, 'draw'+name, drawSlot)
+        return '<onDraw name="draw%s" label=""/>%s' % (name, '&nbsp;'*int(slotw/spacew+0.999))
+
     def drawOn(self, canvas, x, y, _sW=0):
         self._para.drawOn(canvas, x, y, _sW)
 
@@ -23,9 +23,11 @@ from reportlab.lib.styles import PropertySet, ParagraphStyle, _baseFontName
 from reportlab.lib import colors
 from reportlab.lib.utils import fp_str, annotateException, IdentStr, flatten
 from reportlab.lib.abag import ABag as CellFrame
-from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfbase.pdfmetrics import stringWidth, getFont
 from reportlab.platypus.doctemplate import Indenter
 from reportlab.platypus.flowables import LIIndenter
+from bisect import bisect_right
+from itertools import izip
 
 LINECAPS={None: None, 'butt':0,'round':1,'projecting':2,'squared':2}
 LINEJOINS={None: None, 'miter':0, 'mitre':0, 'round':1,'bevel':2}
@@ -153,6 +155,30 @@ def _hLine(canvLine, scp, ecp, y, hBlocks, FUZZ=rl_config._FUZZ):
             scp = i1
         if scp<ecp-FUZZ: canvLine(scp,y,ecp,y)
 
+def _sameColor(a,b):
+    return a is b or (a.__class__ is b.__class__ and a.__dict__==b.__dict__)
+
+def _colorRuns(colorCycle,n):
+    '''cycle colorCycle over n rows or columns; returns a list of
+    (color, runs) where runs are the [start,stop) index ranges of that
+    color with adjacent ones joined; None colors are dropped'''
+    R = []
+    last = None
+    count = len(colorCycle)
+    for i in xrange(n):
+        color = colorCycle[i%count]
+        if not color: continue
+        if last and last[1][-1][1]==i and _sameColor(last[0],color):
+            last[1][-1][1] = i+1
+            continue
+        for last in R:
+            if _sameColor(last[0],color): break
+        else:
+            last = color, []
+            R.append(last)
+        last[1].append([i,i+1])
+    return R
+
 def _multiLine(scp,ecp,y,canvLine,ws,count):
     offset = 0.5*(count-1)*ws
     y += offset
@@ -199,6 +225,158 @@ def spanFixDim(V0,V,spanCons,lim=None,FUZZ=rl_config._FUZZ):
 class _ExpandedCellTuple(tuple):
     pass
 
+class _RowWindow:
+    '''The rows of a table left over after a split.
+
+    Rather than being copied, the cell values, styles and row heights are
+    shared with the table the rows came from.  The first repeatRows rows
+    are the repeated rows at the start of the shared lists; any later
+    row i is shared row i+delta.
+    '''
+    def __init__(self, V, S, H, repeatRows, delta, nrows):
+        self.V = V
+        self.S = S
+        self.H = H
+        self.repeatRows = repeatRows
+        self.delta = delta
+        self.nrows = nrows
+
+    def rows(self, L, i=0, j=None):
+        '''return rows i to j of the shared list L as a new list'''
+        if j is None: j = self.nrows
+        r = self.repeatRows
+        d = self.delta
+        if i>=r: return L[i+d:j+d]
+        return L[i:min(j,r)]+L[r+d:j+d]
+
+    def window(self, n):
+        '''the window for our rows from n on, after the repeated rows'''
+        r = self.repeatRows
+        return self.__class__(self.V,self.S,self.H,r,self.delta+n-r,self.nrows-n+r)
+
+class _CellStyleLayers:
+    '''The cell style commands of a table kept as ranges of cells.
+
+    A CellStyle is only made for each distinct set of commands covering
+    a cell, so memory goes with the commands rather than the cells.
+    '''
+    def __init__(self, ncols):
+        self.ncols = ncols
+        self.cmds = []
+        self._styles = {}
+        self._changed()
+
+    def _changed(self):
+        self._bounds = None
+        self._rows = {}
+
+    def add(self, op, sc, sr, ec, er, values):
+        self.cmds.append((op, sc, sr, ec, er, values))
+        self._changed()
+
+    def _index(self):
+        #the rows at which the covering commands change and the commands between
+        starts = {}
+        ends = {}
+        for k, (op, sc, sr, ec, er, values) in enumerate(self.cmds):
+            starts.setdefault(sr,[]).append(k)
+            ends.setdefault(er+1,[]).append(k)
+        bounds = starts.keys()+[b for b in ends.keys() if b not in starts]
+        bounds.sort()
+        active = {}
+        keys = []
+        for b in bounds:
+            for k in ends.get(b,()): del active[k]
+            for k in starts.get(b,()): active[k] = 1
+            key = active.keys()
+            key.sort()
+            keys.append(tuple(key))
+        self._bounds = bounds, keys
+
+    def row(self, i):
+        '''return the list of CellStyles for row i'''
+        if self._bounds is None: self._index()
+        bounds, keys = self._bounds
+        b = bisect_right(bounds,i)
+        key = b and keys[b-1] or ()
+        R = self._rows.get(key)
+        if R is None:
+            cmds = self.cmds
+            R = self._rows[key] = [self._style(tuple([k for k in key if cmds[k][1]<=j<=cmds[k][3]]))
+                                    for j in xrange(self.ncols)]
+        return R
+
+    def _style(self, key):
+        s = self._styles.get(key)
+        if s is None:
+            s = self._styles[key] = CellStyle(repr(key))
+            cmds = self.cmds
+            for k in key:
+                op, sc, sr, ec, er, values = cmds[k]
+                _applyCellStyle(s, op, values)
+        return s
+
+class _CellStyles:
+    '''The rows of cell styles of a table; row i is row i of the layers
+    counting through ranges, a list of (start, stop) row numbers.'''
+    def __init__(self, nrows, ncols, layers=None, ranges=None):
+        self._layers = layers or _CellStyleLayers(ncols)
+        self._ranges = ranges or [(0,nrows)]
+        self._nrows = nrows
+
+    def __len__(self):
+        return self._nrows
+
+    def _map(self, i):
+        for start, stop in self._ranges:
+            n = stop-start
+            if i<n: return start+i
+            i -= n
+        raise IndexError('cell style row index out of range')
+
+    def __getitem__(self, i):
+        if isinstance(i,slice):
+            i, j, step = i.indices(self._nrows)
+            if step!=1: raise ValueError('cell style rows can only be sliced with step 1')
+            ranges = []
+            for start, stop in self._ranges:
+                n = stop-start
+                if i<n and j>0:
+                    ranges.append((start+max(i,0),start+min(j,n)))
+                i -= n
+                j -= n
+            return self.__class__(sum([b-a for a,b in ranges]),0,self._layers,ranges)
+        if i<0: i += self._nrows
+        if not 0<=i<self._nrows: raise IndexError('cell style row index out of range')
+        return self._layers.row(self._map(i))
+
+    def __add__(self, other):
+        if other._layers is not self._layers:
+            raise ValueError('cannot join the cell styles of different tables')
+        return self.__class__(self._nrows+other._nrows,0,self._layers,self._ranges+other._ranges)
+
+    def __iter__(self):
+        row = self._layers.row
+        for start, stop in self._ranges:
+            for i in xrange(start,stop):
+                yield row(i)
+
+    def add(self, op, sc, sr, ec, er, values):
+        '''apply a cell style command to rows sr..er, columns sc..ec'''
+        if sr>er or sc>ec: return
+        if min(sr,sc)<0 or er>=self._nrows or ec>=self._layers.ncols:
+            raise IndexError('cell style command %s out of range' % op)
+        i = 0
+        for start, stop in self._ranges:
+            n = stop-start
+            if sr<i+n and er>=i:
+                self._layers.add(op,sc,start+max(sr-i,0),ec,start+min(er-i,n-1),values)
+            i += n
+
+_rowWindowAttrs = ('_cellvalues','_cellStyles','_argH','_rowHeights')
+_plainTypes = frozenset((str,int,long,float))   #cells measured by _plainWidths
+_strTypes = frozenset((str,))
+
 class Table(Flowable):
     def __init__(self, data, colWidths=None, rowHeights=None, style=None,
                 repeatRows=0, repeatCols=0, splitByRow=1, emptyTableAction=None, ident=None,
@@ -212,7 +390,12 @@ class Table(Flowable):
         self._cellvalues = []
         _seqCW = isinstance(colWidths,(tuple,list))
         _seqRH = isinstance(rowHeights,(tuple,list))
-        if nrows: self._ncols = ncols = max(map(_rowLen,data))
+        if nrows:
+            if normalizedData>1:
+                #rows taken from an already checked table
+                self._ncols = ncols = len(data[0])
+            else:
+                self._ncols = ncols = max(map(_rowLen,data))
         elif colWidths and _seqCW: ncols = len(colWidths)
         else: ncols = 0
         if not emptyTableAction: emptyTableAction = rl_config.emptyTableAction
@@ -253,23 +436,18 @@ class Table(Flowable):
         if not _seqRH: rowHeights = nrows*[rowHeights]
         elif len(rowHeights) != nrows:
             raise ValueError("%s data error - %d rows in data but %d in row heights" % (self.identity(),nrows, len(rowHeights)))
-        for i,d in enumerate(data):
-            n = len(d)
-            if n!=ncols:
-                if rl_config.allowShortTableRows and isinstance(d,list):
-                    d[n:] = (ncols-n)*['']
-                else:
-                    raise ValueError("%s expected %d not %d columns in row %d!" % (self.identity(),ncols,n,i))
+        if normalizedData<2:
+            for i,d in enumerate(data):
+                n = len(d)
+                if n!=ncols:
+                    if rl_config.allowShortTableRows and isinstance(d,list):
+                        d[n:] = (ncols-n)*['']
+                    else:
+                        raise ValueError("%s expected %d not %d columns in row %d!" % (self.identity(),ncols,n,i))
         self._rowHeights = self._argH = rowHeights
         self._colWidths = self._argW = colWidths
         if cellStyles is None:
-            cellrows = []
-            for i in xrange(nrows):
-                cellcols = []
-                for j in xrange(ncols):
-                    cellcols.append(CellStyle(repr((i,j))))
-                cellrows.append(cellcols)
-            self._cellStyles = cellrows
+            self._cellStyles = _CellStyles(nrows,ncols)
         else:
             self._cellStyles = cellStyles
 
@@ -430,13 +608,21 @@ class Table(Flowable):
                 W = W[:]
             else:
                 W0 = W[:]
+            spanRows = {}
+            for c,r in spanRanges:
+                spanRows.setdefault(c,{})[r] = 1
             V = self._cellvalues
             S = self._cellStyles
+            P = self._plainWidths([j for j,w in enumerate(W) if w is None],spanRows)
             while None in W:
                 j = W.index(None) #find first unspecified column
                 w = 0
-                for i,Vi in enumerate(V):
-                    v = Vi[j]
+                M, rows = P[j]
+                for (fn,fs,lp,rp),t in M.iteritems():
+                    t = t+lp+rp
+                    if t>w: w = t
+                for i in rows:
+                    v = V[i][j]
                     s = S[i][j]
                     ji = j,i
                     span = spanRanges.get(ji,None)
@@ -474,6 +660,57 @@ class Table(Flowable):
         self._width = width
         self._width_calculated_once = 1
 
+    def _plainWidths(self,cols,spanRows={}):
+        '''Measure the string and number cells of the columns cols with one
+        stringWidths call per font, size and padding; cells of spanRows[j]
+        are left out. Returns a dict mapping each column to a dict from
+        (fontName,fontSize,leftPadding,rightPadding) to the widest text line
+        and the list of the rows still to be measured cell by cell.'''
+        V = self._cellvalues
+        runs = {}   #rows sharing a list of cell styles
+        for i,Si in enumerate(self._cellStyles):
+            try:
+                runs[id(Si)][1].append(i)
+            except KeyError:
+                runs[id(Si)] = Si,[i]
+        runs = runs.values()
+        P = {}
+        for j in cols:
+            skip = spanRows.get(j,{})
+            G = {}
+            rows = []
+            for Si,I in runs:
+                if skip:
+                    rows.extend([i for i in I if i in skip])
+                    I = [i for i in I if i not in skip]
+                s = Si[j]
+                g = G.setdefault((s.fontname,s.fontsize,s.leftPadding,s.rightPadding),{})
+                C = [V[i][j] for i in I]
+                types = set(map(type,C))
+                if types==_strTypes:
+                    g.update(dict.fromkeys(C))
+                elif types<=_plainTypes:
+                    g.update(dict.fromkeys(map(str,C)))
+                else:
+                    for i,v in izip(I,C):
+                        if v.__class__ in _plainTypes:
+                            g[str(v)] = 1
+                        else:
+                            rows.append(i)
+            M = {}
+            for k,g in G.iteritems():
+                if not g: continue
+                T = {}
+                for v in g:
+                    if '\n' in v:
+                        for x in v.split('\n'): T[x] = 1
+                    else:
+                        T[v] = 1
+                M[k] = max(getFont(k[0]).stringWidths(T.keys(),k[1]))
+            rows.sort()
+            P[j] = M, rows
+        return P
+
     def _elementWidth(self,v,s):
         if isinstance(v,(list,tuple)):
             w = 0
@@ -506,13 +743,17 @@ class Table(Flowable):
         return max([stringWidth(x,fontName,fontSize) for x in v])
 
     def _calc_height(self, availHeight, availWidth, H=None, W=None):
-        H = self._argH
+        RW = self.__dict__.get('_rowWindow')
+        if RW:
+            H, CV, CS, r, d = RW.H, RW.V, RW.S, RW.repeatRows, RW.delta
+        else:
+            H, CV, CS, r, d = self._argH, self._cellvalues, self._cellStyles, 0, 0
         if not W: W = _calc_pc(self._argW,availWidth)   #widths array
 
-        hmax = lim = len(H)
+        hmax = lim = self._nrows
         longTable = self._longTableOptimize
 
-        if None in H:
+        if longTable or None in H:
             canv = getattr(self,'canv',None)
             saved = None
             #get a handy list of any cells which span rows. should be ignored for sizing
@@ -526,14 +767,26 @@ class Table(Flowable):
                 spanRanges = {}
             if canv: saved = canv._fontname, canv._fontsize, canv._leading
             H0 = H
-            H = H[:]    #make a copy as we'll change it
+            H = []      #only the rows we look at; long tables may stop early
             self._rowHeights = H
             spanCons = {}
             FUZZ = rl_config._FUZZ
-            while None in H:
-                i = H.index(None)
-                V = self._cellvalues[i] # values for row i
-                S = self._cellStyles[i] # styles for row i
+            height = msr = 0
+            for i in xrange(lim):
+                # we can stop if we have filled up all available room
+                # and all spans are complete in H[:i]
+                if longTable and height>availHeight and i>msr:
+                    hmax = i
+                    break
+                k = i   #index in the possibly shared lists
+                if i>=r: k += d
+                h = H0[k]
+                if h is not None:
+                    H.append(h)
+                    height += h
+                    continue
+                V = CV[k] # values for row i
+                S = CS[k] # styles for row i
                 h = 0
                 j = 0
                 for j,(v, s, w) in enumerate(zip(V, S, W)): # value, style, width (lengths must match)
@@ -568,30 +821,24 @@ class Table(Flowable):
                             if r0!=r1:
                                 x = r0,r1
                                 spanCons[x] = max(spanCons.get(x,t),t)
+                                if r1>msr: msr = r1
                                 t = 0
                     if t>h: h = t   #record a new maximum
-                H[i] = h
-                # we can stop if we have filled up all available room
-                if longTable:
-                    hmax = i
-                    height = sum(H[:i])
-                    if height > availHeight:
-                        #we can terminate if all spans are complete in H[:i]
-                        if spanCons:
-                            msr = max([x[1] for x in spanCons.keys()])  #RS=[endrowspan,.....]
-                            if hmax>=msr:
-                                break
-            if None not in H: hmax = lim
+                H.append(h)
+                height += h
 
             if spanCons:
+                if RW: H0 = RW.rows(H0,0,hmax)
                 try:
                     spanFixDim(H0,H,spanCons,lim=hmax)
                 except:
                     annotateException('\nspanning problem in %s hmax=%s lim=%s avail=%s x %s\nH0=%r H=%r\nspanCons=%r' % (self.identity(),hmax,lim,availWidth,availHeight,H0,H,spanCons))
+        elif RW:
+            H = self._rowHeights = RW.rows(H)
 
-        height = self._height = sum(H[:hmax])
+        height = self._height = sum(H)
         self._rowpositions = [height]    # index 0 is actually topline; we skip when processing cells
-        for h in H[:hmax]:
+        for h in H:
             height -= h
             self._rowpositions.append(height)
         assert abs(height)<1e-8, '!!!!!%s\ninternal height error height=%r hmax=%d Sum(H[:%d])=%r\nH=%r\nrowPositions=%r' % (self.identity(),height,hmax,hmax,self._height,H[:hmax],self._rowpositions)
@@ -614,7 +861,11 @@ class Table(Flowable):
         # in sizing
         if self._spanCmds:
             self._calcSpanRanges()
-            if None in self._argH:
+            #_calc_height needs the column positions when it measures the rows
+            RW = self.__dict__.get('_rowWindow')
+            if RW: H = RW.H
+            else: H = self._argH
+            if self._longTableOptimize or None in H:
                 self._calc_width(availWidth,W=W)
 
         if self._nosplitCmds:
@@ -710,12 +961,22 @@ class Table(Flowable):
         minimums = {}
         totalMinimum = 0
         elementWidth = self._elementWidth
+        P = self._plainWidths([j for j,w in enumerate(W) if w is None or w=='*' or _endswith(w,'%')])
         for colNo in xrange(self._ncols):
             w = W[colNo]
             if w is None or w=='*' or _endswith(w,'%'):
                 siz = 1
                 final = 0
-                for rowNo in xrange(self._nrows):
+                M, rows = P[colNo]
+                for (fn,fs,lp,rp),new in M.iteritems():
+                    pad = lp+rp
+                    if new:
+                        new += pad
+                    else:
+                        new = pad
+                    new += lp+rp
+                    final = max(final, new)
+                for rowNo in rows:
                     value = self._cellvalues[rowNo][colNo]
                     style = self._cellStyles[rowNo][colNo]
                     pad = style.leftPadding+style.rightPadding
@@ -831,13 +1092,16 @@ class Table(Flowable):
         W = list(self._argW)
         width = 0
         elementWidth = self._elementWidth
-        rowNos = xrange(self._nrows)
         values = self._cellvalues
         styles = self._cellStyles
+        P = self._plainWidths([j for j,w in enumerate(W) if w is None or w=='*' or _endswith(w,'%')])
         for colNo in xrange(len(W)):
             w = W[colNo]
             if w is None or w=='*' or _endswith(w,'%'):
                 final = 0
+                M, rowNos = P[colNo]
+                for (fn,fs,lp,rp),new in M.iteritems():
+                    final = max(final, new+lp+rp)
                 for rowNo in rowNos:
                     value = values[rowNo][colNo]
                     style = styles[rowNo][colNo]
@@ -861,13 +1125,8 @@ class Table(Flowable):
         Any cell not in the key is not part of a spanned region
         """
         self._spanRanges = spanRanges = {}
-        for x in xrange(self._ncols):
-            for y in xrange(self._nrows):
-                spanRanges[x,y] = (x, y, x, y)
-        self._colSpanCells = []
-        self._rowSpanCells = []
-        csa = self._colSpanCells.append
-        rsa = self._rowSpanCells.append
+        self._colSpanCells = csc = {}
+        self._rowSpanCells = rsc = {}
         for (cmd, start, stop) in self._spanCmds:
             x0, y0 = start
             x1, y1 = stop
@@ -884,11 +1143,11 @@ class Table(Flowable):
                 if x0!=x1: #column span
                     for y in xrange(y0, y1+1):
                         for x in xrange(x0,x1+1):
-                            csa((x,y))
+                            csc[x,y] = 1
                 if y0!=y1: #row span
                     for y in xrange(y0, y1+1):
                         for x in xrange(x0,x1+1):
-                            rsa((x,y))
+                            rsc[x,y] = 1
 
                 for y in xrange(y0, y1+1):
                     for x in xrange(x0,x1+1):
@@ -904,16 +1163,11 @@ class Table(Flowable):
         'cell range', or None if it was clobbered:
         (col, row) -> (col0, row0, col1, row1)
 
-        Any cell not in the key is not part of a spanned region
+        Any cell not in the key is not part of a nosplit region
         """
         self._nosplitRanges = nosplitRanges = {}
-        for x in xrange(self._ncols):
-            for y in xrange(self._nrows):
-                nosplitRanges[x,y] = (x, y, x, y)
-        self._colNoSplitCells = []
-        self._rowNoSplitCells = []
-        csa = self._colNoSplitCells.append
-        rsa = self._rowNoSplitCells.append
+        self._colNoSplitCells = csc = {}
+        self._rowNoSplitCells = rsc = {}
         for (cmd, start, stop) in self._nosplitCmds:
             x0, y0 = start
             x1, y1 = stop
@@ -931,12 +1185,12 @@ class Table(Flowable):
                 if x0!=x1:
                     for y in xrange(y0, y1+1):
                         for x in xrange(x0,x1+1):
-                            csa((x,y))
+                            csc[x,y] = 1
                 #row span
                 if y0!=y1:
                     for y in xrange(y0, y1+1):
                         for x in xrange(x0,x1+1):
-                            rsa((x,y))
+                            rsc[x,y] = 1
 
                 for y in xrange(y0, y1+1):
                     for x in xrange(x0,x1+1):
@@ -966,6 +1220,12 @@ class Table(Flowable):
         vBlocks = {}
         hBlocks = {}
         rlim = len(rowpositions)-1
+        for row in xrange(rlim):    #cells which aren't part of a span
+            y = rowpositions[row+1]
+            height = rowpositions[row] - y
+            for col in xrange(self._ncols):
+                x = colpositions[col]
+                spanRects[col,row] = (x, y, colpositions[col+1] - x, height)
         for (coord, value) in self._spanRanges.iteritems():
             if value is None:
                 spanRects[coord] = None
@@ -994,6 +1254,7 @@ class Table(Flowable):
         self._hmax_spanRects = hmax
 
     def setStyle(self, tblstyle):
+        self.clearWrapCache()
         if not isinstance(tblstyle,TableStyle):
             tblstyle = TableStyle(tblstyle)
         for cmd in tblstyle.getCommands():
@@ -1058,12 +1319,17 @@ class Table(Flowable):
             if ec < 0: ec = ec + self._ncols
             if sr < 0: sr = sr + self._nrows
             if er < 0: er = er + self._nrows
-            for i in xrange(sr, er+1):
-                for j in xrange(sc, ec+1):
-                    _setCellStyle(self._cellStyles, i, j, op, values)
+            cellStyles = self._cellStyles
+            if isinstance(cellStyles,_CellStyles):
+                cellStyles.add(op, sc, sr, ec, er, values)
+            else:
+                for i in xrange(sr, er+1):
+                    for j in xrange(sc, ec+1):
+                        _setCellStyle(cellStyles, i, j, op, values)
 
     def _drawLines(self):
         ccap, cdash, cjoin = None, None, None
+        self._pendingLines = []
         self.canv.saveState()
         for op, (sc,sr), (ec,er), weight, color, cap, dash, join, count, space in self._linecmds:
             if isinstance(sr,basestring) and sr.startswith('split'): continue
@@ -1072,22 +1338,34 @@ class Table(Flowable):
             if sr < 0: sr = sr + self._nrows
             if er < 0: er = er + self._nrows
             if cap!=None and ccap!=cap:
+                self._flushLines()
                 self.canv.setLineCap(cap)
                 ccap = cap
             if dash is None or dash == []:
                 if cdash is not None:
+                    self._flushLines()
                     self.canv.setDash()
                     cdash = None
             elif dash != cdash:
+                self._flushLines()
                 self.canv.setDash(dash)
                 cdash = dash
             if join is not None and cjoin!=join:
+                self._flushLines()
                 self.canv.setLineJoin(join)
                 cjoin = join
             getattr(self,_LineOpMap.get(op, '_drawUnknown' ))( (sc, sr), (ec, er), weight, color, count, space)
+        self._flushLines()
         self.canv.restoreState()
         self._curcolor = None
 
+    def _flushLines(self):
+        '''stroke the segments collected since the last line state change as one path'''
+        L = self._pendingLines
+        if L:
+            self.canv.lines(L)
+            del L[:]
+
     def _drawUnknown(self,  start, end, weight, color, count, space):
         #we are only called from _drawLines which is one level up
         import sys
@@ -1113,6 +1391,8 @@ class Table(Flowable):
         self._drawVLines((sc+1, sr), (ec, er), weight, color, count, space)
 
     def _prepLine(self, weight, color):
+        if color != self._curcolor or weight != self._curweight:
+            self._flushLines()
         if color != self._curcolor:
             self.canv.setStrokeColor(color)
             self._curcolor = color
@@ -1130,7 +1410,7 @@ class Table(Flowable):
         scp = ecp[0]
         ecp = ecp[-1]
         hBlocks = getattr(self,'_hBlocks',{})
-        canvLine = self.canv.line
+        canvLine = lambda x0, y0, x1, y1, _add=self._pendingLines.append: _add((x0,y0,x1,y1))
         if count == 1:
             for y in rp:
                 _hLine(canvLine, scp, ecp, y, hBlocks)
@@ -1154,7 +1434,7 @@ class Table(Flowable):
         srp = erp[0]
         erp = erp[-1]
         vBlocks = getattr(self,'_vBlocks',{})
-        canvLine = lambda y0, x0, y1, x1, _line=self.canv.line: _line(x0,y0,x1,y1)
+        canvLine = lambda y0, x0, y1, x1, _add=self._pendingLines.append: _add((x0,y0,x1,y1))
         if count == 1:
             for x in cp:
                 _hLine(canvLine, erp, srp, x, vBlocks)
@@ -1169,9 +1449,11 @@ class Table(Flowable):
         self._drawVLines((sc+1, sr), (ec+1, er), weight, color, count, space)
 
     def wrap(self, availWidth, availHeight):
+        size = self._getCachedWrap(availWidth, availHeight)
+        if size: return size
         self._calc(availWidth, availHeight)
         self.availWidth = availWidth
-        return (self._width, self._height)
+        return self._setCachedWrap(availWidth, availHeight, (self._width, self._height))
 
     def onSplit(self,T,byRow=1):
         '''
@@ -1216,20 +1498,25 @@ class Table(Flowable):
     def _splitRows(self,availHeight):
         n=self._getFirstPossibleSplitRowPosition(availHeight)
         if n<=self.repeatRows: return []
-        lim = len(self._rowHeights)
+        lim = self._nrows
         if n==lim: return [self]
 
         repeatRows = self.repeatRows
         repeatCols = self.repeatCols
         splitByRow = self.splitByRow
-        data = self._cellvalues
+
+        #the parts share our rows rather than copying them
+        RW = self.__dict__.get('_rowWindow')
+        if not RW:
+            RW = _RowWindow(self._cellvalues,self._cellStyles,self._argH,repeatRows,0,lim)
+        rows = RW.rows
 
         #we're going to split into two superRows
         ident = self.ident
         if ident: ident = IdentStr(ident)
-        R0 = self.__class__( data[:n], colWidths=self._colWidths, rowHeights=self._argH[:n],
+        R0 = self.__class__(rows(RW.V,0,n), colWidths=self._colWidths, rowHeights=rows(RW.H,0,n),
                 repeatRows=repeatRows, repeatCols=repeatCols,
-                splitByRow=splitByRow, normalizedData=1, cellStyles=self._cellStyles[:n],
+                splitByRow=splitByRow, normalizedData=2, cellStyles=rows(RW.S,0,n),
                 ident=ident)
 
         #copy the commands
@@ -1285,26 +1572,21 @@ class Table(Flowable):
         R0._cr_0(n,self._nosplitCmds)
 
         if ident: ident = IdentStr(ident)
+        #R1 is made from just its first rows and then given the rest as a window
+        RW = RW.window(n)
+        m = repeatRows+1
+        R1 = self.__class__(rows(RW.V,0,m), colWidths=self._colWidths, rowHeights=rows(RW.H,0,m),
+                repeatRows=repeatRows, repeatCols=repeatCols,
+                splitByRow=splitByRow, normalizedData=2, cellStyles=rows(RW.S,0,m),
+                ident=ident,
+                )
+        R1._setRowWindow(RW)
         if repeatRows:
-            #R1 = slelf.__class__(data[:repeatRows]+data[n:],self._argW,
-            R1 = self.__class__(data[:repeatRows]+data[n:],colWidths=self._colWidths,
-                    rowHeights=self._argH[:repeatRows]+self._argH[n:],
-                    repeatRows=repeatRows, repeatCols=repeatCols,
-                    splitByRow=splitByRow, normalizedData=1,
-                    cellStyles=self._cellStyles[:repeatRows]+self._cellStyles[n:],
-                    ident=ident,
-                    )
             R1._cr_1_1(n,repeatRows,A)
             R1._cr_1_1(n,repeatRows,self._bkgrndcmds)
             R1._cr_1_1(n,repeatRows,self._spanCmds)
             R1._cr_1_1(n,repeatRows,self._nosplitCmds)
         else:
-            #R1 = slelf.__class__(data[n:], self._argW, self._argH[n:],
-            R1 = self.__class__(data[n:], colWidths=self._colWidths, rowHeights=self._argH[n:],
-                    repeatRows=repeatRows, repeatCols=repeatCols,
-                    splitByRow=splitByRow, normalizedData=1, cellStyles=self._cellStyles[n:],
-                    ident=ident,
-                    )
             R1._cr_1_0(n,A)
             R1._cr_1_0(n,self._bkgrndcmds)
             R1._cr_1_0(n,self._spanCmds)
@@ -1316,6 +1598,25 @@ class Table(Flowable):
         self.onSplit(R1)
         return [R0,R1]
 
+    def _setRowWindow(self,RW):
+        '''share our rows with the table we were split from'''
+        for a in _rowWindowAttrs:
+            self.__dict__.pop(a,None)
+        self._rowWindow = RW
+        self._nrows = RW.nrows
+
+    def __getattr__(self,a):
+        #the rows of a split part are only copied out when something needs them
+        if a in _rowWindowAttrs and '_rowWindow' in self.__dict__:
+            RW = self.__dict__.pop('_rowWindow')
+            self._cellvalues = RW.rows(RW.V)
+            self._cellStyles = RW.rows(RW.S)
+            self._argH = RW.rows(RW.H)
+            if '_rowHeights' not in self.__dict__:
+                self._rowHeights = self._argH
+            return self.__dict__[a]
+        raise AttributeError(a)
+
     def _getRowImpossible(impossible,cells,ranges):
         for xy in cells:
             r=ranges[xy]
@@ -1350,6 +1651,7 @@ class Table(Flowable):
         return split_at
 
     def split(self, availWidth, availHeight):
+        self.clearWrapCache()
         self._calc(availWidth, availHeight)
         if self.splitByRow:
             if not rl_config.allowTableBoundsErrors and self._width>availWidth: return []
@@ -1384,9 +1686,8 @@ class Table(Flowable):
         canv = self.canv
         colpositions = self._colpositions
         rowpositions = self._rowpositions
-        rowHeights = self._rowHeights
-        colWidths = self._colWidths
         spanRects = getattr(self,'_spanRects',None)
+        fill = None     #the fill color we last set
         for cmd, (sc, sr), (ec, er), arg in self._bkgrndcmds:
             if sc < 0: sc = sc + ncols
             if ec < 0: ec = ec + ncols
@@ -1399,33 +1700,35 @@ class Table(Flowable):
             w, h = x1-x0, y1-y0
             if hasattr(arg,'__call__'):
                 arg(self,canv, x0, y0, w, h)
+                fill = None
             elif cmd == 'ROWBACKGROUNDS':
                 #Need a list of colors to cycle through.  The arguments
                 #might be already colours, or convertible to colors, or
                 # None, or the str 'None'.
                 #It's very common to alternate a pale shade with None.
+                #All the rows of one color are filled as a single path.
                 colorCycle = map(colors.toColorOrNone, arg)
-                count = len(colorCycle)
-                rowCount = er - sr + 1
-                for i in xrange(rowCount):
-                    color = colorCycle[i%count]
-                    h = rowHeights[sr + i]
-                    if color:
+                for color, runs in _colorRuns(colorCycle, er - sr + 1):
+                    if not _sameColor(fill,color):
                         canv.setFillColor(color)
-                        canv.rect(x0, y0, w, -h, stroke=0,fill=1)
-                    y0 = y0 - h
+                        fill = color
+                    p = canv.beginPath()
+                    for i, j in runs:
+                        y = rowpositions[sr + i]
+                        p.rect(x0, y, w, rowpositions[sr + j] - y)
+                    canv.drawPath(p, stroke=0, fill=1)
             elif cmd == 'COLBACKGROUNDS':
                 #cycle through colours columnwise
                 colorCycle = map(colors.toColorOrNone, arg)
-                count = len(colorCycle)
-                colCount = ec - sc + 1
-                for i in xrange(colCount):
-                    color = colorCycle[i%count]
-                    w = colWidths[sc + i]
-                    if color:
+                for color, runs in _colorRuns(colorCycle, ec - sc + 1):
+                    if not _sameColor(fill,color):
                         canv.setFillColor(color)
-                        canv.rect(x0, y0, w, h, stroke=0,fill=1)
-                    x0 = x0 +w
+                        fill = color
+                    p = canv.beginPath()
+                    for i, j in runs:
+                        x = colpositions[sc + i]
+                        p.rect(x, y0, colpositions[sc + j] - x, h)
+                    canv.drawPath(p, stroke=0, fill=1)
             else:   #cmd=='BACKGROUND'
                 color = colors.toColorOrNone(arg)
                 if color:
@@ -1434,7 +1737,9 @@ class Table(Flowable):
                         if xywh:
                             #it's a single cell
                             x0, y0, w, h = xywh
-                    canv.setFillColor(color)
+                    if not _sameColor(fill,color):
+                        canv.setFillColor(color)
+                        fill = color
                     canv.rect(x0, y0, w, h, stroke=0,fill=1)
 
     def _drawCell(self, cellval, cellstyle, pos, size):
@@ -1530,6 +1835,123 @@ class LongTable(Table):
     '''Henning von Bargen's changes will be active'''
     _longTableOptimize = 1
 
+class StreamingTable(Flowable):
+    '''A table whose rows come from an iterator such as a database cursor or
+    csv.reader and are only read as each frame is filled.
+
+    The first repeatRows rows are the header, repeated at the top of every
+    part.  Each part is a LongTable and style is applied to it as though it
+    were a table on its own.  rowStyles is a sequence of (test, commands);
+    test(i,row) is called with the number of each body row in the whole
+    stream and the row itself, and if true the commands are applied with
+    row 0 meaning that row, eg
+
+        rowStyles=[(lambda i,row: i%2, [('BACKGROUND',(0,0),(-1,0),colors.whitesmoke)])]
+
+    Only the rows of the part being laid out are held, so memory doesn't
+    grow with the length of the stream.  Column widths which are not given
+    are fixed by the first part.  The rows can only be read once, so this
+    is for use with build rather than multiBuild.
+    '''
+    def __init__(self, rows, colWidths=None, style=None, repeatRows=0, rowStyles=(),
+                hAlign=None, vAlign=None, ident=None):
+        self._rows = iter(rows)
+        self._colWidths = colWidths
+        self._style = style
+        self._rowStyles = rowStyles
+        self.repeatRows = repeatRows
+        self.hAlign = hAlign or 'CENTER'
+        self.vAlign = vAlign or 'MIDDLE'
+        self.ident = ident
+        self._header = None
+        self._pending = []  #(row, commands) read but not yet placed
+        self._rowNo = 0     #stream number of the next body row
+        self._done = 0
+        self._part = None
+
+    def _read(self, n):
+        rows = self._rows
+        rowStyles = self._rowStyles
+        P = self._pending
+        for i in xrange(n):
+            try:
+                row = rows.next()
+            except StopIteration:
+                self._done = 1
+                break
+            row = list(row)
+            cmds = []
+            for test, C in rowStyles:
+                if test(self._rowNo,row): cmds.extend(C)
+            P.append((row,cmds))
+            self._rowNo += 1
+
+    def _makePart(self):
+        r = self.repeatRows
+        data = self._header[:]
+        extra = []
+        for i, (row, cmds) in enumerate(self._pending):
+            data.append(row)
+            i += r
+            for c in cmds:
+                (sc,sr), (ec,er) = c[1:3]
+                extra.append((c[0],(sc,sr+i),(ec,er+i))+tuple(c[3:]))
+        T = LongTable(data, colWidths=self._colWidths, style=self._style, repeatRows=r,
+                hAlign=self.hAlign, vAlign=self.vAlign, ident=self.ident)
+        if extra: T.setStyle(extra)
+        return T
+
+    def _fill(self, availWidth, availHeight):
+        '''return a part holding enough rows to overflow availHeight if there are any'''
+        part = self._part
+        if part and part[:2]==(availWidth,availHeight): return part[2]
+        if self._header is None:
+            self._header = []
+            for i in xrange(self.repeatRows):
+                try:
+                    self._header.append(list(self._rows.next()))
+                except StopIteration:
+                    self._done = 1
+                    break
+        canv = getattr(self,'canv',None)
+        while 1:
+            if self._header or self._pending:
+                T = self._makePart()
+                w, h = T.wrapOn(canv,availWidth,availHeight)
+                if h>availHeight or self._done: break
+            elif self._done:
+                T = None
+                break
+            self._read(max(32,len(self._pending)))
+        self._part = availWidth, availHeight, T
+        return T
+
+    def wrap(self, availWidth, availHeight):
+        T = self._fill(availWidth, availHeight)
+        if T is None: return 0, 0
+        self.width = T._width
+        self.height = T._height
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        T = self._fill(availWidth, availHeight)
+        if T is None: return []
+        self._colWidths = T._colWidths[:]
+        S = T.splitOn(getattr(self,'canv',None),availWidth,availHeight)
+        if not S: return []
+        R0 = S[0]
+        del self._pending[:R0._nrows-self.repeatRows]
+        self._part = None
+        if self._done and not self._pending: return [R0]
+        if hasattr(self,'_postponed'): del self._postponed
+        return [R0, self]
+
+    def draw(self):
+        T = self._part and self._part[2]
+        if T: T.drawOn(self.canv,0,0)
+        self._pending = []
+        self._part = None
+
 LINECOMMANDS = _LineOpMap.keys()
 
 def _isLineCommand(cmd):
@@ -1539,7 +1961,9 @@ def _setCellStyle(cellStyles, i, j, op, values):
     #new = CellStyle('<%d, %d>' % (i,j), cellStyles[i][j])
     #cellStyles[i][j] = new
     ## modify in place!!!
-    new = cellStyles[i][j]
+    _applyCellStyle(cellStyles[i][j], op, values)
+
+def _applyCellStyle(new, op, values):
     if op == 'FONT':
         n = len(values)
         new.fontname = values[0]
@@ -9,7 +9,7 @@ shapeChecking =             1
 defaultEncoding =           'WinAnsiEncoding'       # 'WinAnsi' or 'MacRoman'
 defaultGraphicsFontName=    'Times-Roman'           #initializer for STATE_DEFAULTS in shapes.py
 pageCompression =           1                       # default page compression mode
-useA85 =                    1                       #set to 0 to disable Ascii Base 85 stream filters
+useA85 =                    0                       #set to 1 to enable Ascii Base 85 stream filters
 defaultPageSize =           'A4'                    #default page size
 defaultImageCaching =       0                       #set to zero to remove those annoying cached images
 ZLIB_WARNINGS =             1
@@ -46,6 +46,13 @@ paraFontSizeHeightOffset=   1                       #if true paragraphs start at
 canvas_baseColor=           None                    #initialize the canvas fill and stroke colors if this is set
 ignoreContainerActions=     1                       #if true then action flowables in flowable _Containers will be ignored
 ttfAsciiReadable=           1                       #smaller subsets when set to 0
+compressionThreads=         0                       #if >0 compress page streams in this many background threads
+compressionProfile=         'default'               #'default', 'speed' or 'size' see pdfdoc.compressionProfiles
+ttfMmap=                    1                       #memory map TrueType font files rather than reading them
+ttfMetricsCache=            1                       #keep parsed TrueType metrics in the FastTTFMetrics temp folder
+wordWidthCacheSize=         10000                   #max words remembered by paragraph.wordWidthCache; 0 to disable
+paraFragCacheSize=          1000                    #max parsed paragraph texts remembered by paragraph.paraFragCache; 0 to disable
+wrapCaching=                0                       #if true Paragraph, Preformatted & Table reuse the result of an identical wrap
 
 # places to look for T1Font information
 T1SearchPath =  (
@@ -177,7 +184,14 @@ imageReaderFlags
 paraFontSizeHeightOffset
 canvas_baseColor
 ignoreContainerActions
-ttfAsciiReadable'''.split()
+ttfAsciiReadable
+compressionThreads
+compressionProfile
+ttfMmap
+ttfMetricsCache
+wordWidthCacheSize
+wrapCaching
+paraFragCacheSize'''.split()
     import os, sys
     global sys_version, _unset_
     sys_version = sys.version.split()[0]        #strip off the other garbage
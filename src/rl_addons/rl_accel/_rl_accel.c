@@ -952,7 +952,7 @@ typedef struct {
 
 static void BoxFree(BoxObject* self)
 {
-	PyMem_DEL(self);
+	PyObject_DEL(self);
 }
 
 static int Box_set_int(char* name, int* pd, PyObject *value)
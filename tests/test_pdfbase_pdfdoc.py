@@ -1,6 +1,6 @@
 from reportlab.lib.testutils import setOutDir,makeSuiteForClasses, outputfile, printLocation, NearTestCase
 setOutDir(__name__)
-import unittest,re,codecs
+import unittest,re,codecs,os
 from reportlab.pdfbase import pdfdoc
 
 class PdfdocTestCase(NearTestCase):
@@ -20,9 +20,333 @@ class PdfdocTestCase(NearTestCase):
         self.assertEquals(pdfdoc.PDFString(u'Hello\xa0World',1).format(self.doc),'(\\376\\377\\000H\\000e\\000l\\000l\\000o\\000\\240\\000W\\000o\\000r\\000l\\000d)')
         self.assertEquals(pdfdoc.PDFString(u'Hello\xa0World',0).format(self.doc),'(\xfe\xff\x00H\x00e\x00l\x00l\x00o\x00\xa0\x00W\x00o\x00r\x00l\x00d)')
 
+def _checkXref(data):
+    "return the number of objects after checking each xref offset points at its object"
+    startxref = int(data[data.rindex('startxref')+9:].split()[0])
+    lines = data[startxref:].split('trailer')[0].split()
+    assert lines[0]=='xref', 'startxref does not point at the xref'
+    first, n = int(lines[1]), int(lines[2])
+    entries = lines[3:3+3*n]
+    for i in xrange(first+1,first+n):
+        offset, gen, kind = entries[3*i:3*i+3]
+        assert kind=='n'
+        assert data[int(offset):].startswith('%d %d obj' % (i,int(gen))), 'bad offset for object %d' % i
+    return n-1
+
+class StreamingTestCase(unittest.TestCase):
+    "Tests of the streaming PDFDocument writer"
+    def _makePages(self,canv,n):
+        for i in xrange(n):
+            canv.drawString(100,700,'Streamed page %d' % i)
+            canv.bookmarkPage('P%d' % i)
+            canv.addOutlineEntry('Page %d' % i,'P%d' % i)
+            canv.showPage()
+
+    def testStreamingOutput(self):
+        from reportlab.pdfgen.canvas import Canvas
+        from StringIO import StringIO
+        f = StringIO()
+        canv = Canvas(f,streaming=1,invariant=1)
+        self._makePages(canv,10)
+        doc = canv._doc
+        self.assertEquals(len(doc.idToOffset),20)  #pages and their content streams
+        self.failIf([k for k in doc.idToObject.keys() if k.startswith('Page')])
+        canv.save()
+        data = f.getvalue()
+        self.assertEquals(_checkXref(data),len(doc.numberToId))
+        self.assertEquals(data.count('/Type /Page')-data.count('/Type /Pages'),10)
+        self.assertRaises(ValueError,canv.getpdfdata)
+
+    def testStreamingThreads(self):
+        "with compression threads pages are streamed once later pages are submitted"
+        from reportlab import rl_config
+        from reportlab.pdfgen.canvas import Canvas
+        from StringIO import StringIO
+        compressionThreads = rl_config.compressionThreads
+        rl_config.compressionThreads = 3
+        try:
+            D = []
+            for r in xrange(2):
+                f = StringIO()
+                canv = Canvas(f,streaming=1,invariant=1,pageCompression=1)
+                doc = canv._doc
+                for i in xrange(10):
+                    canv.drawString(100,700,'Threaded page %d' % i)
+                    canv.showPage()
+                    self.assertEquals(len(doc.idToOffset),2*max(0,i-2))
+                canv.save()
+                data = f.getvalue()
+                self.assertEquals(_checkXref(data),len(doc.numberToId))
+                self.assertEquals(data.count('/Type /Page')-data.count('/Type /Pages'),10)
+                D.append(data)
+        finally:
+            rl_config.compressionThreads = compressionThreads
+        self.assertEquals(D[0],D[1])
+
+    def testStreamingFile(self):
+        from reportlab.pdfgen.canvas import Canvas
+        fn = outputfile('test_pdfbase_pdfdoc_streaming.pdf')
+        canv = Canvas(fn,streaming=1)
+        self._makePages(canv,3)
+        canv.save()
+        data = open(fn,'rb').read()
+        self.assertEquals(_checkXref(data),len(canv._doc.numberToId))
+
+class DeferredFormsTestCase(unittest.TestCase):
+    "Tests of forms whose content is drawn at save time"
+    def _build(self,f,**kwds):
+        from reportlab.pdfgen.canvas import Canvas
+        canv = Canvas(f,invariant=1,pageCompression=0,**kwds)
+        canv.setDeferredValue('title',lambda canv: 'Deferred')
+        flushed = []
+        for i in xrange(5):
+            canv.setFont('Helvetica',9)
+            canv.drawDeferredString(500,30,'Page %(page)s of %(pageCount)s','right')
+            canv.drawDeferredString(72,30,'%(title)s, %(pageCount)s pages')
+            canv.showPage()
+            flushed.append(len(canv._doc.idToOffset))
+        canv.save()
+        return canv, flushed
+
+    def testPageXofY(self):
+        fn = outputfile('test_pdfbase_pdfdoc_deferred.pdf')
+        canv, flushed = self._build(fn)
+        data = open(fn,'rb').read()
+        self.assertEquals(re.findall(r'\((Page \d of \d)\) Tj',data),['Page %d of 5' % i for i in xrange(1,6)])
+        self.assertEquals(data.count('(Deferred, 5 pages) Tj'),1)
+        self.assertEquals(_checkXref(data),len(canv._doc.numberToId))
+
+    def testStreaming(self):
+        "pages using deferred forms can still be streamed"
+        from StringIO import StringIO
+        f = StringIO()
+        canv, flushed = self._build(f,streaming=1)
+        self.assertEquals(flushed,range(2,12,2))
+        data = f.getvalue()
+        self.assertEquals(_checkXref(data),len(canv._doc.numberToId))
+        self.assertEquals(re.findall(r'\((Page \d of \d)\) Tj',data),['Page %d of 5' % i for i in xrange(1,6)])
+
+class ObjectStreamsTestCase(unittest.TestCase):
+    "Tests of PDF 1.5 object streams and cross reference streams"
+    def testObjectStreams(self):
+        import zlib, struct
+        from reportlab.pdfgen.canvas import Canvas
+        canv = Canvas(outputfile('test_pdfbase_pdfdoc_objstreams.pdf'),objectStreams=1)
+        for i in xrange(150):
+            canv.drawString(100,700,'Page %d' % i)
+            canv.bookmarkPage('P%d' % i)
+            canv.addOutlineEntry('Page %d' % i,'P%d' % i)
+            canv.showPage()
+        data = canv.getpdfdata()
+        self.failUnless(data.startswith('%PDF-1.5'))
+        self.failIf('\nxref' in data or 'trailer' in data)
+        startxref = int(data[data.rindex('startxref')+9:].split()[0])
+        head, rest = re.split(r'>>\s*stream\r?\n',data[startxref:],1)
+        self.failUnless('/Type /XRef' in head)
+        size = int(re.search(r'/Size (\d+)',head).group(1))
+        xref = zlib.decompress(rest[:int(re.search(r'/Length (\d+)',head).group(1))])
+        self.assertEquals(len(xref),7*size)
+        entries = [struct.unpack('>BLH',xref[7*i:7*i+7]) for i in xrange(size)]
+        self.assertEquals(entries[0],(0,0,65535))
+        objStms = {}
+        for n,(t,f2,f3) in enumerate(entries):
+            if t==1:
+                self.failUnless(data[f2:].startswith('%d 0 obj' % n), 'bad offset for object %d' % n)
+            elif t==2:
+                objStms.setdefault(f2,[]).append(f3)
+        self.assertEquals(len(objStms),4)   #ceil(4+2*150 compressible objects/100)
+        for n,indices in objStms.iteritems():
+            self.assertEquals(entries[n][0],1)
+            self.failUnless('/Type /ObjStm' in re.split(r'>>\s*stream',data[entries[n][1]:],1)[0])
+            self.assertEquals(sorted(indices),range(len(indices)))
+
+class InterningTestCase(unittest.TestCase):
+    "Tests of sharing identical objects"
+    def _build(self,interning):
+        from reportlab.pdfgen.canvas import Canvas
+        from reportlab.lib import colors
+        canv = Canvas(outputfile('test_pdfbase_pdfdoc_interning.pdf'),invariant=1)
+        canv._doc.interning = interning
+        for name in 'AB':
+            canv.beginForm(name)
+            canv.rect(0,0,10,10)
+            canv.endForm()
+        for i in xrange(4):
+            canv.drawString(100,100,'Separator')
+            canv.showPage()
+            canv.doForm('A')
+            canv.doForm('B')
+            canv.linearGradient(0,0,100,100,(colors.red,colors.blue))
+            canv.showPage()
+        return canv.getpdfdata(), canv._doc
+
+    def testInterning(self):
+        data, doc = self._build(1)
+        data0, doc0 = self._build(0)
+        self.failUnless(len(data)<len(data0))
+        NV = doc.idToObjectNumberAndVersion
+        self.assertEquals(NV['FormXob.A'],NV['FormXob.B'])
+        self.assertEquals(NV['Sh0'],NV['Sh3'])
+        contents = [doc.idToObject['Page%d' % i].Contents for i in xrange(1,9)]
+        self.assertEquals(len(set([NV[c.__InternalName__] for c in contents[::2]])),1)
+        self.assertEquals(len(set([NV[c.__InternalName__] for c in contents[1::2]])),4)
+        self.assertEquals(_checkXref(data),len(doc.numberToId))
+        self.assertEquals(len(doc.numberToId),len(doc0.numberToId)-3-3-1-3)
+
+class CompressionThreadsTestCase(unittest.TestCase):
+    "Tests of background page stream compression"
+    def _build(self):
+        from reportlab.pdfgen.canvas import Canvas
+        canv = Canvas(outputfile('test_pdfbase_pdfdoc_threads.pdf'),invariant=1,pageCompression=1)
+        for i in xrange(20):
+            for j in xrange(50):
+                canv.drawString(72,72+12*j,'Page %d line %d' % (i,j))
+            canv.showPage()
+        return canv.getpdfdata()
+
+    def testCompressionThreads(self):
+        from reportlab import rl_config
+        compressionThreads = rl_config.compressionThreads
+        rl_config.compressionThreads = 0
+        try:
+            data0 = self._build()
+            rl_config.compressionThreads = 3
+            data = self._build()
+        finally:
+            rl_config.compressionThreads = compressionThreads
+        self.assertEquals(data,data0)
+
+    def testPoolChange(self):
+        "the old pool's threads stop when compressionThreads changes"
+        from reportlab import rl_config
+        compressionThreads = rl_config.compressionThreads
+        try:
+            rl_config.compressionThreads = 3
+            pool = pdfdoc._getCompressionPool()
+            job = pool.submit(len, 'abc')
+            rl_config.compressionThreads = 2
+            pool2 = pdfdoc._getCompressionPool()
+            self.failIf(pool2 is pool)
+            self.assertEquals(job(),3)
+            for t in pool.threads:
+                t.join(5)
+                self.failIf(t.isAlive())
+            self.assertEquals(pool2.submit(len, 'ab')(),2)
+            rl_config.compressionThreads = 0
+            self.assertEquals(pdfdoc._getCompressionPool(),None)
+            for t in pool2.threads:
+                t.join(5)
+                self.failIf(t.isAlive())
+        finally:
+            rl_config.compressionThreads = compressionThreads
+
+class BinaryStreamsTestCase(unittest.TestCase):
+    "Compare binary and ASCII85 streams for an image heavy document"
+    def _build(self,useA85,images):
+        import time
+        from reportlab import rl_config
+        from reportlab.pdfgen.canvas import Canvas
+        oldUseA85 = rl_config.useA85
+        rl_config.useA85 = useA85
+        try:
+            t0 = time.time()
+            canv = Canvas(outputfile('test_pdfbase_pdfdoc_a85_%d.pdf' % useA85))
+            for fn in images:
+                canv.drawImage(fn,72,72)
+                canv.drawString(72,36,fn)
+                canv.showPage()
+            canv.save()
+            return time.time()-t0, os.path.getsize(canv._filename)
+        finally:
+            rl_config.useA85 = oldUseA85
+
+    def testBinaryStreams(self):
+        from reportlab.lib.testutils import testsFolder
+        jpg = open(os.path.join(testsFolder,'..','docs','images','lj8100.jpg'),'rb').read()
+        images = []
+        for i in xrange(40):
+            fn = outputfile('_i_am_actually_a_jpg_%d.jpg' % i)
+            open(fn,'wb').write(jpg)
+            images.append(fn)
+        t1, n1 = self._build(1,images)
+        t0, n0 = self._build(0,images)
+        self.failUnless(n0<0.85*n1, 'binary output %d bytes, ASCII85 output %d bytes' % (n0,n1))
+        open(outputfile('test_pdfbase_pdfdoc_a85.log'),'w').write(
+            'ASCII85 %d bytes in %0.4f seconds\nbinary %d bytes in %0.4f seconds\n' % (n1,t1,n0,t0))
+
+class CompressionPolicyTestCase(unittest.TestCase):
+    "Tests of the stream compression policy"
+    def _stream(self,content,kind=None,policy=None):
+        S = pdfdoc.PDFStream(content=content,filters=[pdfdoc.PDFZCompress])
+        S.kind = kind
+        doc = pdfdoc.PDFDocument()
+        if policy: doc.compressionPolicy = policy
+        return S.format(doc)
+
+    def testDefault(self):
+        import zlib
+        content = 'BT /F1 12 Tf 100 100 Td (Hello) Tj ET\n'*20
+        self.failUnless(zlib.compress(content) in self._stream(content,'page'))
+
+    def testPolicy(self):
+        import zlib
+        policy = pdfdoc.PDFCompressionPolicy(level=1,minSize=100,font=9,cmap=0)
+        small = 'q 1 0 0 1 0 0 cm Q\n'
+        big = ''.join(['%d %d m %d %d l S\n' % (i,i*i,i*3,i+7) for i in xrange(500)])
+        f = self._stream(small,'page',policy)
+        self.failUnless(small in f)
+        self.failIf('/Filter' in f)
+        self.failUnless(zlib.compress(big,1) in self._stream(big,'page',policy))
+        self.failUnless(zlib.compress(big,9) in self._stream(big,'font',policy))
+        self.failUnless(big in self._stream(big,'cmap',policy))
+
+    def testImageLevel0(self):
+        "an image stored without compression has no /Filter"
+        class FakeImage:
+            mode = 'RGB'
+            _dataA = None
+            def jpeg_fh(self): return None
+            def getSize(self): return 2, 2
+            def getRGBData(self): return '\xff\x00\x00'*4
+            def getTransparent(self): return None
+        for level, useA85, filters in ((0,0,None),(0,1,'[ /ASCII85Decode ]'),(6,0,'[ /FlateDecode ]')):
+            from reportlab import rl_config
+            oldUseA85 = rl_config.useA85
+            rl_config.useA85 = useA85
+            try:
+                im = pdfdoc.PDFImageXObject('fake',FakeImage(),mask='auto',
+                        compressionPolicy=pdfdoc.PDFCompressionPolicy(image=level))
+            finally:
+                rl_config.useA85 = oldUseA85
+            doc = pdfdoc.PDFDocument()
+            doc.defaultStreamFilters = [pdfdoc.PDFZCompress]
+            f = im.format(doc)
+            if filters:
+                self.failUnless(('/Filter %s' % filters) in f, f)
+            else:
+                self.failIf('/Filter' in f, f)
+                self.failUnless('\xff\x00\x00'*4 in f)
+
+    def testProfiles(self):
+        from reportlab import rl_config
+        compressionProfile = rl_config.compressionProfile
+        try:
+            for profile in ('default','speed'):
+                rl_config.compressionProfile = profile
+                self.assertEquals(pdfdoc.PDFDocument().compressionPolicy,pdfdoc.compressionProfiles[profile])
+        finally:
+            rl_config.compressionProfile = compressionProfile
+
 def makeSuite():
     return makeSuiteForClasses(
         PdfdocTestCase,
+        StreamingTestCase,
+        DeferredFormsTestCase,
+        ObjectStreamsTestCase,
+        InterningTestCase,
+        CompressionThreadsTestCase,
+        BinaryStreamsTestCase,
+        CompressionPolicyTestCase,
         )
 
 #noruntests
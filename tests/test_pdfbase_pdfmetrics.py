@@ -10,7 +10,7 @@ glyph in every standard font.  Long!
 __version__='''$Id$'''
 from reportlab.lib.testutils import setOutDir,makeSuiteForClasses, outputfile, printLocation
 setOutDir(__name__)
-import unittest
+import unittest, re
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase import _fontdata
 from reportlab.pdfgen.canvas import Canvas
@@ -97,8 +97,40 @@ class PDFMetricsTestCase(unittest.TestCase):
         makeTestDoc(fontNamesToTest)
 
 
+class StandardFontCacheTestCase(unittest.TestCase):
+    "Test the formatted standard font objects are shared between documents"
+
+    def _fontObjects(self, fontName):
+        c = Canvas(outputfile('test_pdfbase_pdfmetrics_cache.pdf'))
+        c.setFont(fontName, 12)
+        c.drawString(100, 700, 'Hello World')
+        data = c.getpdfdata()
+        return re.findall(r'<< /BaseFont .*?/Type /Font >>', data, re.S)
+
+    def test0(self):
+        "identical font objects come from the cache"
+        pdfmetrics._standardFontObjects.clear()
+        first = self._fontObjects('Times-Roman')
+        self.assertEqual(len(pdfmetrics._standardFontObjects), 2)
+        self.assertEqual(first, self._fontObjects('Times-Roman'))
+        self.assertEqual(len(pdfmetrics._standardFontObjects), 2)
+        self.assert_('/BaseFont /Times-Roman' in first[1], first)
+
+    def test1(self):
+        "a changed encoding is not served from the cache"
+        font = pdfmetrics.Font('Courier-CacheTest', 'Courier', 'WinAnsiEncoding')
+        enc = font.encoding = pdfmetrics.Encoding('WinAnsiEncoding')
+        pdfmetrics.registerFont(font)
+        before = self._fontObjects('Courier-CacheTest')[1]
+        enc.frozen = 0
+        enc[65] = 'B'
+        after = self._fontObjects('Courier-CacheTest')[1]
+        self.assert_('/Differences' not in before, before)
+        self.assert_('/Differences' in after and '/B' in after, after)
+
+
 def makeSuite():
-    return makeSuiteForClasses(PDFMetricsTestCase)
+    return makeSuiteForClasses(PDFMetricsTestCase, StandardFontCacheTestCase)
 
 
 #noruntests
@@ -187,6 +187,27 @@ class TTFontFileTestCase(NearTestCase):
         self.assertNear(subset.bbox, [-183.10546875, -235.83984375, 1287.109375, 928.22265625])
         self.assertEquals(subset.stemV, 87)
 
+    def testLazyLoading(self):
+        "Tests mapped font files and on demand subsetting tables"
+        import mmap
+        ttf = TTFontFile("Vera.ttf")
+        self.assert_(isinstance(ttf._ttf_data, mmap.mmap))
+        self.failIf('hmetrics' in ttf.__dict__ or 'glyphPos' in ttf.__dict__)
+        subset = ttf.makeSubset([0x41, 0x42])
+        self.assert_('hmetrics' in ttf.__dict__ and 'glyphPos' in ttf.__dict__)
+        data = TTFOpenFile("Vera.ttf")[1].read()
+        rttf = TTFontFile(StringIO(data))
+        self.assertEquals(rttf._ttf_data, data)
+        self.assertEquals(rttf.makeSubset([0x41, 0x42]), subset)
+        self.assertEquals(rttf.charWidths, ttf.charWidths)
+        self.assertEquals(len(ttf.hmetrics), len(ttf.glyphPos)-1)
+        self.assertRaises(AttributeError, getattr, ttf, 'notThere')
+        rl_config.ttfMmap = 0
+        try:
+            self.assertEquals(TTFontFile("Vera.ttf")._ttf_data, data)
+        finally:
+            rl_config.ttfMmap = 1
+
     def testFontMaker(self):
         "Tests TTFontMaker class"
         ttf = TTFontMaker()
@@ -221,6 +242,27 @@ class TTFontFaceTestCase(unittest.TestCase):
         fontFile = doc.idToObject[fontFile.name]
         self.assert_(fontFile.content != "")
 
+    def testMetricsCache(self):
+        "Tests TTFontFace reloading its metrics from the cache"
+        rl_config.ttfMetricsCache = 0
+        try:
+            parsed = TTFontFace("VeraBd.ttf")
+        finally:
+            rl_config.ttfMetricsCache = 1
+        TTFontFace("VeraBd.ttf")    # make sure the cache is written
+        extractInfo = TTFontFile.extractInfo
+        def fail(*args): raise AssertionError('metrics were parsed again')
+        TTFontFile.extractInfo = fail
+        try:
+            cached = TTFontFace("VeraBd.ttf")
+        finally:
+            TTFontFile.extractInfo = extractInfo
+        for k in TTFontFace._metricsAttrs:
+            self.assertEquals(getattr(cached, k), getattr(parsed, k))
+        self.assertEquals(cached.makeSubset([0x41, 0x2017]), parsed.makeSubset([0x41, 0x2017]))
+        self.assertNotEqual(TTFontFace("Vera.ttf")._metricsKey(1), cached._metricsKey(1))
+        self.assertNotEqual(cached._metricsKey(0), cached._metricsKey(1))
+
 
 class TTFontTestCase(NearTestCase):
     "Tests TTFont class"
@@ -248,6 +290,24 @@ class TTFontTestCase(NearTestCase):
         expected = font.face.getCharWidth(0x2260) * 2
         self.assertNear(width,expected)
 
+    def testStringWidths(self):
+        "Test the width table and TTFont.stringWidths"
+        font = TTFont("Vera", "Vera.ttf")
+        face = font.face
+        W = face.makeWidthTable()
+        self.assertEquals(len(W), 0x10000)
+        for c in (0x41, 0x2260, 0x4e00):
+            self.assertNear(W[c]*1000./face.unitsPerEm, face.getCharWidth(c))
+        texts = ["test", u"\u2260\u4e00", "", utf8(0x20ac)*3]
+        widths = font.stringWidths(texts, 10)
+        self.assertEquals(len(widths), len(texts))
+        for t, w in zip(texts, widths):
+            if not isinstance(t,unicode): t = t.decode('utf8')
+            self.assertNear(w, 0.01*sum([face.getCharWidth(ord(c)) for c in t]))
+        pdfmetrics.registerFont(font)
+        self.assertEquals(pdfmetrics.stringWidths(texts, "Vera", 10), widths)
+        self.assertEquals(pdfmetrics.stringWidths(["test"], "Helvetica", 10), [pdfmetrics.stringWidth("test", "Helvetica", 10)])
+
     def testSplitString(self):
         "Tests TTFont.splitString"
         doc = PDFDocument()
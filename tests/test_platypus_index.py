@@ -19,7 +19,7 @@ from reportlab.platypus.doctemplate \
      import PageTemplate, BaseDocTemplate
 from reportlab.platypus.tableofcontents import SimpleIndex
 from reportlab.lib import randomtext
-import re
+import re, random
 from xml.sax.saxutils import quoteattr
 
 def myMainPageFrame(canvas, doc):
@@ -113,6 +113,64 @@ class IndexTestCase(unittest.TestCase):
     
             doc.build(story, canvasmaker=index.getCanvasMaker())
 
+    def test1(self):
+        "deferred page numbers must not need more passes and must show the final numbers"
+        P = []
+        for deferred in 0, 1:
+            random.seed(1)
+            story = []
+            index = SimpleIndex(dot=' . ', deferPageNumbers=deferred)
+            story.append(index)
+            for i in range(30):
+                story.append(Paragraph('<index item="term%d"/><index item="term%d"/>%s' % (i%7,i%5,
+                            randomtext.randomText(randomtext.PYTHON, 5)), makeBodyStyle()))
+            doc = MyDocTemplate(outputfile('test_platypus_index_deferred%d.pdf' % deferred))
+            P.append(doc.multiBuild(story, canvasmaker=index.getCanvasMaker()))
+        self.assertTrue(P[1]<=P[0],'passes %r' % P)
+        #the deferred forms must show the final page numbers
+        D = doc.canv._doc.idToObject
+        for j, (terms, pages) in enumerate(sorted(index._entries.items(),key=lambda x: [t.upper() for t in x[0]])):
+            for k, (pns, key) in enumerate(sorted(pages)):
+                form = D['FormXob.IX0.%d.%d' % (j,k)]
+                self.assertTrue(('(%s) Tj' % pns) in ''.join(form.stream))
+
+        #a term on many pages shrinks its fields to fit after the term text
+        from reportlab.platypus import tableofcontents
+        from reportlab.platypus.flowables import PageBreak
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+        calls = []
+        _draw = tableofcontents.drawDeferredPageNumbers
+        def draw(canvas, style, slots, availWidth, digits=3, dot=' . ', fontSize=None):
+            X = []
+            _translate = canvas.translate
+            def translate(dx, dy):
+                X.append(dx)
+                _translate(dx, dy)
+            canvas.translate = translate
+            try:
+                _draw(canvas, style, slots, availWidth, digits, dot, *(fontSize and (fontSize,) or ()))
+            finally:
+                del canvas.translate
+            slotw = stringWidth('0'*digits, style.fontName, fontSize or style.fontSize)
+            calls.append((canvas._curr_tx_info['cur_x'], availWidth, [x-slotw for x in X], slotw))
+        tableofcontents.drawDeferredPageNumbers = draw
+        try:
+            index = SimpleIndex(dot=' . ', deferPageNumbers=1)
+            story = [index]
+            for i in range(35):
+                story.append(Paragraph('<index item="everywhere"/>page %d' % i, makeBodyStyle()))
+                story.append(PageBreak())
+            doc = MyDocTemplate(outputfile('test_platypus_index_deferred_wide.pdf'))
+            doc.multiBuild(story, canvasmaker=index.getCanvasMaker())
+        finally:
+            tableofcontents.drawDeferredPageNumbers = _draw
+        calls = [c for c in calls if len(c[2])>=30]
+        self.assertTrue(calls)
+        for x, availWidth, X, slotw in calls:
+            for fx in X:
+                self.assertTrue(fx>=x,'field at %s before term end %s' % (fx,x))
+            self.assertTrue(X[-1]+slotw<=availWidth+1e-6)
+
 def makeSuite():
     return makeSuiteForClasses(IndexTestCase)
 
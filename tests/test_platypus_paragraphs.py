@@ -633,10 +633,218 @@ phonemic and morphological analysis.'''
         doc = MyDocTemplate(outputfile('test_platypus_paragraphs_AutoNextPageTemplate.pdf'))
         doc.build(story)
 
-#noruntests
+class WordWidthCacheTestCase(unittest.TestCase):
+    "Test the word width cache used when breaking lines"
+
+    def test0(self):
+        "cached widths match stringWidth and are reused"
+        from reportlab.platypus.paragraph import wordWidthCache, WordWidthCache
+        wordWidthCache.clear()
+        style = ParagraphStyle('normal', fontName='Helvetica', fontSize=10)
+        text = ' '.join(['the total amount due on 2012-01-31 is 1,234.56']*20)
+        P = Paragraph(text, style)
+        P.wrap(200, 1000)
+        h1 = P.height
+        hits, misses = wordWidthCache.hits, wordWidthCache.misses
+        self.assert_(hits > misses > 0, (hits, misses))
+        Paragraph(text, style).wrap(200, 1000)
+        self.assertEqual(wordWidthCache.misses, misses)
+        self.assertEqual(wordWidthCache._new[('amount','Helvetica',10,'utf8')], stringWidth('amount','Helvetica',10))
+
+        C = WordWidthCache(4)
+        for w in 'abcdefgh':
+            self.assertEqual(C.stringWidth(w,'Helvetica',10), stringWidth(w,'Helvetica',10))
+        self.assert_(len(C)<=4, len(C))
+        C.stringWidth('g','Helvetica',10)
+        self.assertEqual((C.hits, C.misses), (1, 8))
+        C = WordWidthCache(0)
+        C.stringWidth('a','Helvetica',10)
+        C.stringWidth('a','Helvetica',10)
+        self.assertEqual((len(C), C.hits, C.misses), (0, 0, 2))
+
+    def test1(self):
+        "registering a font again replaces its cached widths"
+        from reportlab.pdfbase.pdfmetrics import registerFont, Font
+        from reportlab.platypus.paragraph import wordWidthCache
+        registerFont(Font('WordWidthCacheFont','Helvetica','WinAnsiEncoding'))
+        w = wordWidthCache.stringWidth('Illinois','WordWidthCacheFont',10)
+        self.assertEqual(w, stringWidth('Illinois','Helvetica',10))
+        registerFont(Font('WordWidthCacheFont','Courier','WinAnsiEncoding'))
+        w = wordWidthCache.stringWidth('Illinois','WordWidthCacheFont',10)
+        self.assertEqual(w, stringWidth('Illinois','Courier',10))
+
+class ParaFragCacheTestCase(unittest.TestCase):
+    "Test sharing of parsed frags between paragraphs"
+
+    def test0(self):
+        "identical text and style share a parse"
+        from reportlab.platypus.paragraph import paraFragCache
+        paraFragCache.clear()
+        style = ParagraphStyle('fragcache', fontName='Helvetica', fontSize=10)
+        text = 'Total <b>amount</b> due'
+        P1 = Paragraph(text, style)
+        P2 = Paragraph(text, style)
+        self.assertEqual((paraFragCache.hits, paraFragCache.misses), (1, 1))
+        self.assertEqual(P2.text, P1.text)
+        self.assertEqual([f.__dict__ for f in P2.frags], [f.__dict__ for f in P1.frags])
+        P1.wrap(30, 1000)
+        P1.frags[0].text = 'Sub'
+        del P1.frags[1:]
+        self.assertEqual([f.text for f in P2.frags], ['Total ', 'amount', ' due'])
+        self.assertEqual([f.text for f in Paragraph(text, style).frags], ['Total ', 'amount', ' due'])
+        self.assertEqual(paraFragCache.misses, 1)
+        Paragraph(unicode(text), style)
+        self.assertEqual(paraFragCache.misses, 2)
+
+        style.textTransform = 'uppercase'
+        P3 = Paragraph(text, style)
+        self.assertEqual(P3.frags[0].text, 'TOTAL ')
+        style2 = ParagraphStyle('fragcache2', parent=style)
+        Paragraph(text, style2)
+        self.assertEqual(paraFragCache.misses, 4)
+
+        text = '<seq id="fc"/> item'
+        self.assertEqual(Paragraph(text, style).frags[0].text, '1')
+        self.assertEqual(Paragraph(text, style).frags[0].text, '2')
+
+    def test1(self):
+        "registering a font family invalidates the parses which used it"
+        from reportlab.pdfbase.pdfmetrics import registerFontFamily
+        style = ParagraphStyle('fragcache3', fontName='Helvetica', fontSize=10)
+        text = '<font face="fragcachefamily">plain <b>bold</b></font>'
+        registerFontFamily('fragcachefamily', normal='Times-Roman', bold='Times-Bold')
+        self.assertEqual([f.fontName for f in Paragraph(text, style).frags], ['Times-Roman', 'Times-Bold'])
+        registerFontFamily('fragcachefamily', normal='Courier', bold='Courier-Bold')
+        self.assertEqual([f.fontName for f in Paragraph(text, style).frags], ['Courier', 'Courier-Bold'])
+
+class WrapCacheTestCase(unittest.TestCase):
+    "Test reuse of identical wrap results"
+
+    def test0(self):
+        "repeated wraps of paragraphs and tables are answered from the cache"
+        style = ParagraphStyle('normal', fontName='Helvetica', fontSize=10, leading=12)
+        text = ' '.join(['the total amount due on 2012-01-31 is 1,234.56']*10)
+        P = Paragraph(text, style)
+        P.cacheWrap = 1
+        size = P.wrap(200, 1000)
+        blPara = P.blPara
+        self.assertEqual(P.wrap(200, 500), size)
+        self.assert_(P.blPara is blPara)
+        self.assertNotEqual(P.wrap(300, 1000), size)
+        self.assertEqual(P.wrap(200, 1000), size)
+        self.assert_(P.blPara is not blPara)
+        P.split(200, 24)
+        self.assert_('_wrapCache' not in P.__dict__)
+
+        P = Paragraph(text, style)
+        P.cacheWrap = 0
+        P.wrap(200, 1000)
+        self.assert_('_wrapCache' not in P.__dict__)
+
+        T = Table([['a', Paragraph(text, style)]], colWidths=[20, 200])
+        T.cacheWrap = 1
+        size = T.wrap(400, 1000)
+        self.assertEqual(T._wrapCache, ((400, 1000), size))
+        T.setStyle([('FONTSIZE', (0,0), (-1,-1), 20)])
+        self.assert_('_wrapCache' not in T.__dict__)
+        self.assertEqual(T.wrap(400, 1000), size)
+
+class KnuthPlassTestCase(unittest.TestCase):
+    "Test total fit line breaking with wordWrap='KP'"
+
+    def words(self, P):
+        blPara = P.blPara
+        if blPara.kind==0:
+            return join([join(l[1]) for l in blPara.lines])
+        return join([join([w.text for w in l.words],'') for l in blPara.lines])
+
+    def lines(self, P):
+        if P.blPara.kind==0:
+            return [l[0] for l in P.blPara.lines]
+        return [l.extraSpace for l in P.blPara.lines]
+
+    def test0(self):
+        "KP lines fit and keep the words of the greedy ones"
+        from reportlab.lib.randomtext import randomText, PYTHON
+        style = ParagraphStyle('kp', fontName='Times-Roman', fontSize=10, leading=12, alignment=TA_JUSTIFY)
+        kpStyle = ParagraphStyle('kp1', parent=style, wordWrap='KP')
+        texts = [randomText(PYTHON, 5) for i in xrange(10)]
+        texts += ['<b>%s</b> and <i>%s</i><br/>then %s' % (t[:100], t[100:200], t[200:]) for t in texts[:5]]
+        for t in texts:
+            for bulletText in (None, 'xx'):
+                P = Paragraph(t, style, bulletText=bulletText)
+                P.wrap(200, 10000)
+                Q = Paragraph(t, kpStyle, bulletText=bulletText)
+                Q.wrap(200, 10000)
+                self.assertEqual(split(self.words(Q)), split(self.words(P)))
+                self.assertEqual(Q.blPara.kind, P.blPara.kind)
+                for e in self.lines(Q):
+                    self.assert_(e>-1e-6, e)
+
+        story = [Paragraph(t, kpStyle) for t in texts]
+        doc = MyDocTemplate(outputfile('test_platypus_paragraphs_kp.pdf'))
+        doc.build(story)
+
+    def test1(self):
+        "words are hyphenated at the points given by style.hyphenation"
+        def hyphenator(word):
+            return [i for i in xrange(3,len(word)-2,3)]
+        style = ParagraphStyle('kp', fontName='Courier', fontSize=10, leading=12, wordWrap='KP', hyphenation=hyphenator)
+        text = 'aaaaaaaaaaaaaaaaaaaaaaa bbbbbbbbbbbbbbbbbbbbbbbbbbb cccccccccccccccccccccccccc ddd'
+        for t in (text, '<b>%s</b> <i>ccc</i>' % text):
+            P = Paragraph(t, style)
+            P.wrap(120, 1000)
+            L = split(self.words(P))
+            self.assertEqual(join(L,'').replace('-',''), t.replace(' ','').replace('<b>','').replace('</b>','').replace('<i>','').replace('</i>',''))
+            self.assert_([w for w in L if w.endswith('-')], L)
+            for e in self.lines(P):
+                self.assert_(e>-1e-6, e)
+
+    def test2(self):
+        "ragged or one line KP paragraphs are broken by breakLines"
+        from reportlab.lib.randomtext import randomText, PYTHON
+        style = ParagraphStyle('kp', fontName='Times-Roman', fontSize=10, leading=12)
+        kpStyle = ParagraphStyle('kp1', parent=style, wordWrap='KP')
+        justified = ParagraphStyle('kp2', parent=kpStyle, alignment=TA_JUSTIFY)
+        calls = []
+        def breakLines(*args):
+            calls.append(args)
+            return Paragraph.breakLines(P, *args)
+        for t, s in ((randomText(PYTHON, 5), kpStyle), ('a short one', justified), ('<b>a short</b> one', justified)):
+            P = Paragraph(t, s)
+            P.breakLines = breakLines
+            P.wrap(200, 10000)
+            Q = Paragraph(t, style)
+            Q.wrap(200, 10000)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(self.words(P), self.words(Q))
+            self.assertEqual(self.lines(P), self.lines(Q))
+            del calls[:]
+
+    def testSpeed(self):
+        "time greedy and KP breaking and compare the line counts and unused space"
+        from time import clock
+        from reportlab.lib.randomtext import randomText, PYTHON
+        texts = [randomText(PYTHON, 5) for i in xrange(50)]
+        L = []
+        for wordWrap in (None, 'KP'):
+            style = ParagraphStyle('kp', fontName='Times-Roman', fontSize=10, leading=12, alignment=TA_JUSTIFY, wordWrap=wordWrap)
+            best = None
+            for r in xrange(3):
+                t = clock()
+                P = [Paragraph(text, style) for text in texts]
+                for p in P:
+                    p.wrap(250, 10000)
+                t = clock() - t
+                if best is None or t<best: best = t
+            n = sum([len(p.blPara.lines) for p in P])
+            slack = sum([sum([e*e for e in self.lines(p)[:-1]]) for p in P])
+            L.append('%s: %.1f paragraphs/s, %d lines, rms slack %.2f' % (wordWrap or 'greedy', len(texts)/best, n, (slack/(n-len(P)))**0.5))
+        open(outputfile('test_platypus_paragraphs_kp.log'), 'w').write('\n'.join(L)+'\n')
+
 def makeSuite():
     return makeSuiteForClasses(ParagraphCorners,SplitFrameParagraphTest,FragmentTestCase, ParagraphSplitTestCase, ULTestCase, JustifyTestCase,
-            AutoLeadingTestCase)
+            AutoLeadingTestCase, WordWidthCacheTestCase, ParaFragCacheTestCase, WrapCacheTestCase, KnuthPlassTestCase)
 
 #noruntests
 if __name__ == "__main__":
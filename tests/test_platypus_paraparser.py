@@ -114,8 +114,73 @@ class ParaParserTestCase(unittest.TestCase):
         from reportlab.platypus.paragraph import Paragraph
         p = Paragraph(txt, self.style)
 
+def fragKey(fragList):
+    "comparable form of a frag list"
+    def key(v):
+        if hasattr(v,'__dict__'): return v.__class__.__name__, sorted([(k,key(x)) for k,x in v.__dict__.items()])
+        return v
+    return fragList and map(key,fragList)
+
+class FastParseTestCase(unittest.TestCase):
+    "Test the fast tokenizer gives the same frags as the full parser"
+
+    def setUp(self):
+        ParaParserTestCase.setUp.im_func(self)
+
+    def parse(self, txt, fast):
+        parser = ParaParser()
+        parser.fastParse = fast
+        style, frags, bFrags = parser.parse(txt, self.style)
+        return fragKey(frags), fragKey(bFrags), parser.errors
+
+    def testSame(self):
+        "frags from the fast path match the full parser"
+        for txt in ("Hello World",
+                    u"Hello \xa9 <b>World</b>",
+                    "<para>Hello <b>bold <i>both</i></b><br/>next</para>",
+                    "<para leading='20' fontSize=\"14\">sized</para>",
+                    "H<sub>2</sub>O and e<super>x</super> <strike>no</strike> <u>yes</u>",
+                    "<font name=Courier size=8 color='red'>code</font> &amp; &lt;b&gt; &#169; &#xa9; &alpha;",
+                    "<bullet>&bull;</bullet><strong>Item</strong> <em>one</em>",
+                    '<a href="http://www.reportlab.com" color="blue">link</a><a name="here"/>',
+                    "<greek>abc</greek> <span size=20>big</span>",
+                    ):
+            self.assertEqual(self.parse(txt, 1), self.parse(txt, 0), txt)
+
+    def testFallback(self):
+        "unusual markup is left to the full parser"
+        parser = ParaParser()
+        for txt in ("1 & 2", "a < b", "<b>x</i>", "<b>unclosed", "&amp no semicolon",
+                    "<unknown>x</unknown>", "<![CDATA[<b>]]>", "<!-- note -->x",
+                    "<font size=1 size=2>x</font>", "<B>caps</B>"):
+            self.assertEqual(parser._fastTokenize('<para>%s</para>' % txt), None, txt)
+            self.assertEqual(self.parse(txt, 1), self.parse(txt, 0), txt)
+        self.assertEqual(parser._fastTokenize('<para>a <br/>&amp;</para>'),
+                [(1,'para',{}), (0,'a '), (1,'br',{}), (2,'br'), (3,'amp'), (2,'para')])
+
+    def testSpeed(self):
+        "time both parsers on plain and lightly marked up paragraphs"
+        from time import clock
+        plain = 'The quick brown fox jumps over the lazy dog, amount 1,234.56 due on 2012-01-31. '*4
+        marked = 'The <b>quick</b> brown fox jumps over the <i>lazy</i> dog, amount <font color="red">1,234.56</font> due on 2012-01-31 &amp; later.<br/>'*2
+        parser = ParaParser()
+        L = []
+        n = 200
+        for name, txt in (('plain',plain),('marked',marked)):
+            for fast in (0, 1):
+                parser.fastParse = fast
+                best = None
+                for r in xrange(3):
+                    t = clock()
+                    for i in xrange(n):
+                        parser.parse(txt, self.style)
+                    t = clock() - t
+                    if best is None or t<best: best = t
+                L.append('%s %s: %.1f us/paragraph' % (name, fast and 'fast' or 'full', best*1e6/n))
+        open(outputfile('test_platypus_paraparser_speed.log'), 'w').write('\n'.join(L)+'\n')
+
 def makeSuite():
-    return makeSuiteForClasses(ParaParserTestCase)
+    return makeSuiteForClasses(ParaParserTestCase, FastParseTestCase)
 
 #noruntests
 if __name__ == "__main__":
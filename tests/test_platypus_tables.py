@@ -844,6 +844,135 @@ class TablesTestCase(unittest.TestCase):
         "Make a document full of tables"
         old_tables_test()
 
+    def test2(self):
+        "split parts of long tables share their rows"
+        from reportlab.platypus import LongTable
+        data = [['Name','Value']]+[['Row %d' % i, str(i)] for i in xrange(2000)]
+        style = [('GRID',(0,0),(-1,-1),0.5,colors.grey),('SPAN',(0,10),(0,12)),
+                ('ROWBACKGROUNDS',(0,1),(-1,-1),[colors.white,colors.lightgrey])]
+        t = LongTable(data,repeatRows=1,style=style)
+        t.wrap(400,500)
+        R0, R1 = t.split(400,500)
+        n = R0._nrows
+        self.assertEquals(R0._cellvalues,data[:n])
+        self.assert_(R1._rowWindow.V is t._cellvalues)
+        self.assertEquals(R1._nrows,len(data)-n+1)
+        R2, R3 = R1.split(400,500)
+        self.assertEquals(R2._cellvalues,data[:1]+data[n:n+R2._nrows-1])
+        self.assert_(R3._rowWindow.V is t._cellvalues)
+        self.assertEquals(R3._cellvalues,data[:1]+data[n+R2._nrows-1:])
+        self.assert_('_rowWindow' not in R3.__dict__)
+
+        #and lay out just like ordinary tables
+        pdfs = []
+        for cls in Table, LongTable:
+            fn = outputfile('test_platypus_tables_long_%s.pdf' % cls.__name__)
+            SimpleDocTemplate(fn,invariant=1).build([cls(data,repeatRows=1,style=style)])
+            pdfs.append(open(fn,'rb').read())
+        self.assertEquals(pdfs[0],pdfs[1])
+
+        #fixed row heights with spans
+        data = [[str(i),'b'] for i in xrange(100)]
+        for cls in Table, LongTable:
+            for colWidths in None, 60:
+                t = cls(data,colWidths=colWidths,rowHeights=18,style=[('SPAN',(0,0),(1,0)),('SPAN',(0,50),(0,52))])
+                SimpleDocTemplate(outputfile('test_platypus_tables_long_fixed_%s.pdf' % cls.__name__),invariant=1).build([t])
+                t = cls(data,colWidths=colWidths,rowHeights=18,style=[('SPAN',(0,0),(1,0))])
+                t.wrap(400,500)
+                R0, R1 = t.split(400,500)
+                self.assertEquals(R0._rowHeights,[18]*R0._nrows)
+                R1.wrap(400,2000)
+                self.assertEquals(R1._height,18*R1._nrows)
+
+    def test3(self):
+        "cell styles are kept per style command not per cell"
+        data = [[str(i*j) for j in xrange(20)] for i in xrange(1000)]
+        t = Table(data,repeatRows=1,style=[('FONT',(0,0),(-1,0),'Helvetica-Bold',12),
+                ('ALIGN',(1,1),(-1,-1),'RIGHT'),('TEXTCOLOR',(0,500),(2,-1),colors.red)])
+        S = t._cellStyles
+        self.assert_(S[1][1] is S[999][19])
+        self.assert_(S[0][0] is S[0][19])
+        self.assertEquals((S[0][0].fontname,S[0][0].fontsize,S[0][0].leading),('Helvetica-Bold',12,12*1.2))
+        self.assertEquals((S[600][0].alignment,S[600][1].alignment),('LEFT','RIGHT'))
+        self.assertEquals((S[499][2].color,S[500][2].color,S[500][3].color),('black',colors.red,'black'))
+        t.wrap(400,500)
+        R0, R1 = t.split(400,500)
+        n = R0._nrows
+        self.assertEquals(len(R1._cellStyles),1000-n+1)
+        self.assert_(R1._cellStyles[0][0] is S[0][0])
+        self.assert_(R1._cellStyles[500-n+1][2] is S[500][2])
+        self.assertRaises(IndexError,t.setStyle,[('FONTSIZE',(0,0),(0,1000),8)])
+
+    def test4(self):
+        "tables can be streamed from an iterator"
+        from reportlab.platypus import StreamingTable, LongTable
+        read = [0]
+        def rows(n):
+            yield ['Name','Value']
+            for i in xrange(n):
+                read[0] += 1
+                yield ('Row %d' % i, str(i))
+        lag = []
+        class Doc(SimpleDocTemplate):
+            def afterPage(self):
+                lag.append(read[0]-self.page*50)
+        style = [('GRID',(0,0),(-1,-1),0.5,colors.grey),('FONT',(0,0),(-1,0),'Helvetica-Bold')]
+        rowStyles = [(lambda i,row: i%2, [('BACKGROUND',(0,0),(-1,0),colors.lightgrey)]),
+                    (lambda i,row: row[1].endswith('7'), [('TEXTCOLOR',(1,0),(1,0),colors.red)])]
+        fn = outputfile('test_platypus_tables_streaming.pdf')
+        doc = Doc(fn,invariant=1,pageCompression=0)
+        doc.build([StreamingTable(rows(2000),style=style,repeatRows=1,rowStyles=rowStyles)])
+        self.assertEquals(read[0],2000)
+        self.assert_(max(lag)<50,'rows read too far ahead %r' % max(lag))
+        pdf = open(fn,'rb').read()
+        self.assert_('(Row 1999) Tj' in pdf)
+        self.assertEquals(pdf.count('(Name) Tj'),doc.page)
+
+        #parts break where a LongTable would
+        doc2 = SimpleDocTemplate(outputfile('test_platypus_tables_streaming_long.pdf'))
+        doc2.build([LongTable(list(rows(2000)),style=style,repeatRows=1)])
+        self.assertEquals(doc.page,doc2.page)
+
+        doc.build([StreamingTable(rows(0),repeatRows=1)])
+        doc.build([StreamingTable(rows(0))])
+
+
+    def test5(self):
+        "string and number columns are measured in batches"
+        data = [['row %d' % i, i*1.5, 'two\nlines %d' % (i%7), i%2 and Spacer(30,10) or None]
+                for i in xrange(200)]
+        data[5][0] = 'a much longer spanned string'
+        style = [('FONT',(0,0),(-1,0),'Helvetica-Bold',12),('FONTSIZE',(1,100),(1,-1),6),
+                 ('LEFTPADDING',(2,0),(2,-1),20),('SPAN',(0,5),(1,5))]
+        t = Table(data,style=style)
+        t.wrap(500,100000)
+        V = t._cellvalues
+        S = t._cellStyles
+        def cellWidths(j):
+            return [t._elementWidth(V[i][j],S[i][j])+S[i][j].leftPadding+S[i][j].rightPadding for i in xrange(200) if (j,i)!=(1,5)]
+        W0 = t._colWidths
+        self.assertEquals(W0[2],max(cellWidths(2)))
+        self.assert_(W0[1]>=max(cellWidths(1)))
+        self.assert_(W0[0]+W0[1]>=t._elementWidth(data[5][0],S[5][0])+12)
+        M, rows = t._plainWidths([3])[3]
+        self.assertEquals(rows,range(1,200,2))
+
+    def test6(self):
+        "row backgrounds and grid lines are drawn as one path per color and line state"
+        from reportlab.pdfgen.canvas import Canvas
+        data = [[str(i)]*4 for i in xrange(20)]
+        t = Table(data,style=[('ROWBACKGROUNDS',(0,0),(-1,-1),[colors.red,colors.red,None]),
+                ('GRID',(0,0),(-1,-1),0.5,colors.grey),('LINEBELOW',(0,0),(-1,0),1,colors.blue)])
+        t.wrap(400,800)
+        c = Canvas(outputfile('test_platypus_tables_paths.pdf'))
+        n = len(c._code)
+        t.drawOn(c,0,0)
+        code = ' '.join(c._code[n:])
+        ops = code.split()
+        self.assertEquals(code.count('1 0 0 rg'),1)
+        self.assertEquals((ops.count('re'),ops.count('f')+ops.count('f*')),(7,1))
+        self.assertEquals(ops.count('S'),2)
+        self.assertEquals(ops.count('m'),20+1+5+1)
 
 def makeSuite():
     return makeSuiteForClasses(TablesTestCase)
@@ -0,0 +1,118 @@
+#Copyright ReportLab Europe Ltd. 2000-2012
+#see license.txt for license details
+"""Tests for page templates and batch building in reportlab.platypus.doctemplate
+"""
+__version__='''$Id$'''
+from reportlab.lib.testutils import setOutDir,makeSuiteForClasses, outputfile, printLocation
+setOutDir(__name__)
+import unittest, re
+from reportlab.platypus.doctemplate import buildBatch, BatchStats
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+
+def letterhead(canv, doc):
+    canv.saveState()
+    canv.setFont('Times-Bold', 14)
+    canv.drawString(inch, 10.5*inch, 'ACME Widgets Ltd')
+    canv.setStrokeColor(colors.blue)
+    canv.line(inch, 10.4*inch, 7.5*inch, 10.4*inch)
+    canv.restoreState()
+
+def imageLetterhead(canv, doc):
+    letterhead(canv, doc)
+    canv.setFillAlpha(0.5)
+    canv.rect(inch, inch, inch, inch, fill=1)
+
+class StaticOnPageTestCase(unittest.TestCase):
+    "Test recording of static onPage output into a form"
+
+    def build(self, pt, name, pages=3):
+        doc = BaseDocTemplate(outputfile(name), pagesize=(8.5*inch, 11*inch), pageTemplates=[pt], invariant=1, pageCompression=0)
+        style = getSampleStyleSheet()['BodyText']
+        story = []
+        for i in xrange(pages):
+            story.append(Paragraph('Body text on page %d' % (i+1), style))
+            story.append(PageBreak())
+        doc.build(story[:-1])
+        return open(outputfile(name),'rb').read()
+
+    def template(self, onPage=letterhead, staticOnPage=1):
+        return PageTemplate('main', [Frame(inch, inch, 6.5*inch, 9*inch)], onPage=onPage, staticOnPage=staticOnPage)
+
+    def test0(self):
+        "the letterhead is drawn once and used on every page"
+        pt = self.template()
+        data = self.build(pt, 'test_platypus_templates_static.pdf', pages=3)
+        self.assertEqual(data.count('ACME Widgets Ltd'), 1)
+        self.assertEqual(len(re.findall(r'/FormXob\.PageTemplate\.static\d+ Do', data)), 3)
+        data = self.build(self.template(staticOnPage=0), 'test_platypus_templates_plain.pdf', pages=3)
+        self.assertEqual(data.count('ACME Widgets Ltd'), 3)
+
+    def test1(self):
+        "a recording is replayed in a later build without calling onPage"
+        calls = []
+        def onPage(canv, doc):
+            calls.append(doc.page)
+            letterhead(canv, doc)
+        pt = self.template(onPage)
+        first = self.build(pt, 'test_platypus_templates_static1.pdf')
+        second = self.build(pt, 'test_platypus_templates_static2.pdf')
+        self.assertEqual(calls, [1])
+        self.assertEqual(first, second)
+
+    def test2(self):
+        "output using per document resources is recorded again for each build"
+        calls = []
+        def onPage(canv, doc):
+            calls.append(doc.page)
+            imageLetterhead(canv, doc)
+        pt = self.template(onPage)
+        self.build(pt, 'test_platypus_templates_static3.pdf')
+        self.build(pt, 'test_platypus_templates_static4.pdf')
+        self.assertEqual(calls, [1, 1])
+
+def batchStory():
+    style = getSampleStyleSheet()['BodyText']
+    return [Paragraph('Batch built document', style), PageBreak(), Paragraph('Second page', style)]
+
+def badBatchStory():
+    raise ValueError('no story here')
+
+class BuildBatchTestCase(unittest.TestCase):
+    "Test building independent documents in a process pool"
+
+    def run_batch(self, processes):
+        jobs = [(batchStory, None), (badBatchStory, None),
+                (batchStory, outputfile('test_platypus_templates_batch.pdf'))]
+        stats = BatchStats()
+        R = list(buildBatch(jobs, processes=processes, stats=stats, docKwds=dict(invariant=1)))
+        R.sort(key=lambda r: r.index)
+        self.assertEqual(len(R), 3)
+        self.assertEqual(R[0].error, None)
+        self.assert_(R[0].data.startswith('%PDF') and R[0].size==len(R[0].data))
+        self.assertEqual(R[0].pages, 2)
+        self.assertEqual(R[1].error, 'ValueError: no story here')
+        self.assert_('badBatchStory' in R[1].traceback)
+        self.assertEqual(R[2].data, None)
+        self.assertEqual(open(R[2].target,'rb').read(), R[0].data)
+        self.assertEqual((stats.jobs, stats.failed, stats.pages), (3, 1, 4))
+        self.assertEqual(stats.bytes, 2*R[0].size)
+        return R
+
+    def test0(self):
+        "jobs run in worker processes"
+        self.run_batch(2)
+
+    def test1(self):
+        "jobs run serially in this process"
+        self.run_batch(0)
+
+def makeSuite():
+    return makeSuiteForClasses(StaticOnPageTestCase, BuildBatchTestCase)
+
+#noruntests
+if __name__ == "__main__":
+    unittest.TextTestRunner().run(makeSuite())
+    printLocation()
@@ -343,6 +343,115 @@ class TocTestCase(unittest.TestCase):
         doc = MyDocTemplate(outputfile('test_platypus_toc_simple.pdf'))
         doc.build(S)
 
+    def test3(self):
+        "incremental multiBuild must make the same document as full passes"
+        class KeyedDocTemplate(MyDocTemplate):
+            def afterFlowable(self, flowable):
+                if isinstance(flowable,Paragraph) and flowable.style.name[:7]=='Heading':
+                    key = 'h%s' % self.seq.nextf('heading')
+                    self.canv.bookmarkPage(key)
+                    self.notify('TOCEntry', (int(flowable.style.name[7:]), flowable.getPlainText(), self.page, key))
+
+        def makeStory(tocAtEnd):
+            random.seed(3)
+            toc = tableofcontents.TableOfContents()
+            toc.levelStyles = [makeTocHeaderStyle(i, tableofcontents.delta, tableofcontents.epsilon) for i in range(2)]
+            S = []
+            if not tocAtEnd: S.extend([toc,PageBreak()])
+            for i in range(20):
+                S.append(Paragraph('Chapter %d' % (i+1), makeHeaderStyle(i%2)))
+                for j in range(4):
+                    S.append(Paragraph(randomtext.randomText(randomtext.PYTHON, 8), makeBodyStyle()))
+            if tocAtEnd: S.extend([PageBreak(),toc])
+            return S
+
+        for tocAtEnd in (0,1):
+            data = []
+            for incremental in (0,1):
+                fn = outputfile('test_platypus_toc_incremental%d.pdf' % incremental)
+                doc = KeyedDocTemplate(fn,invariant=1)
+                passes = doc.multiBuild(makeStory(tocAtEnd),incremental=incremental)
+                data.append((passes,open(fn,'rb').read()))
+            self.assertEqual(data[0][0],data[1][0])
+            self.assertTrue(data[0][1]==data[1][1],'incremental multiBuild output differs (tocAtEnd=%d)' % tocAtEnd)
+
+    def test5(self):
+        "incremental multiBuild with template cycles, kept groups, tables and an index"
+        from reportlab.platypus import NextPageTemplate, KeepTogether, Table, CondPageBreak
+        class TwoTemplateDocTemplate(BaseDocTemplate):
+            def __init__(self, filename, **kw):
+                BaseDocTemplate.__init__(self, filename, **kw)
+                self.addPageTemplates([
+                    PageTemplate('one',[Frame(2.5*cm, 2.5*cm, 15*cm, 25*cm, id='F1')]),
+                    PageTemplate('two',[Frame(2.5*cm, 2.5*cm, 7.3*cm, 25*cm, id='L'),
+                                        Frame(10.2*cm, 2.5*cm, 7.3*cm, 25*cm, id='R')])])
+            def afterFlowable(self, flowable):
+                if isinstance(flowable,Paragraph) and flowable.style.name[:7]=='Heading':
+                    key = 'h%s' % self.seq.nextf('heading')
+                    self.canv.bookmarkPage(key)
+                    self.notify('TOCEntry', (0, flowable.getPlainText(), self.page, key))
+
+        headerStyle = makeHeaderStyle(0)
+        headerStyle.keepWithNext = 1
+        bodyStyle = makeBodyStyle()
+        def makeStory(tocAtEnd, cycle, extra):
+            random.seed(3)
+            toc = tableofcontents.TableOfContents()
+            toc.levelStyles = [makeTocHeaderStyle(0, tableofcontents.delta, tableofcontents.epsilon)]
+            index = tableofcontents.SimpleIndex()
+            S = []
+            if not tocAtEnd: S.extend([toc,PageBreak()])
+            if cycle: S.append(NextPageTemplate(['two','one']))
+            for i in range(12):
+                if not cycle and i%4==1: S.append(NextPageTemplate(i%8==1 and 'two' or 'one'))
+                S.append(Paragraph('Chapter %d' % i, headerStyle))
+                S.append(KeepTogether([Paragraph('<index item="term%d"/>%s' % (random.randint(0,9),
+                                randomtext.randomText(randomtext.PYTHON, 6)), bodyStyle)
+                                for k in range(random.randint(1,4))]))
+                if extra:
+                    S.append(Table([['Head','H2']]+[['r%d' % k, str(k*i)] for k in range(random.randint(5,60))],
+                                repeatRows=1))
+                    S.append(CondPageBreak(random.randint(2,10)*cm))
+                for k in range(random.randint(1,5)):
+                    S.append(Paragraph(randomtext.randomText(randomtext.PYTHON, random.randint(3,9)), bodyStyle))
+                if random.random()<0.3: S.append(PageBreak())
+            S.extend([PageBreak(),index])
+            if tocAtEnd: S.extend([PageBreak(),toc])
+            return S, index
+
+        for tocAtEnd in (0,1):
+            for cycle in (0,1):
+                for extra in (0,1):
+                    data = []
+                    for incremental in (0,1):
+                        fn = outputfile('test_platypus_toc_incremental_mixed%d.pdf' % incremental)
+                        doc = TwoTemplateDocTemplate(fn,invariant=1)
+                        story, index = makeStory(tocAtEnd,cycle,extra)
+                        passes = doc.multiBuild(story,canvasmaker=index.getCanvasMaker(),incremental=incremental)
+                        data.append((passes,open(fn,'rb').read()))
+                    self.assertTrue(data[0][1]==data[1][1],
+                        'incremental multiBuild output differs (tocAtEnd=%d cycle=%d extra=%d)' % (tocAtEnd,cycle,extra))
+
+    def test4(self):
+        "a preloaded table of contents with deferred page numbers needs one pass"
+        headerStyle = makeHeaderStyle(0)
+        toc = tableofcontents.TableOfContents()
+        toc.levelStyles = [makeTocHeaderStyle(0, tableofcontents.delta, tableofcontents.epsilon)]
+        toc.deferPageNumbers = 1
+        story = [toc]
+        for i in range(30):
+            story.append(PageBreak())
+            story.append(Paragraph('This is chapter %d' % (i+1), headerStyle))
+            for j in range(random.randint(1,3)):
+                story.append(Paragraph(randomtext.randomText(randomtext.PYTHON, 5), makeBodyStyle()))
+        #the page numbers are guesses which get fixed when the document is saved
+        toc.addEntries([(0, 'This is chapter %d' % (i+1), 0) for i in range(30)])
+        doc = MyDocTemplate(outputfile('test_platypus_toc_deferred.pdf'))
+        self.assertEqual(doc.multiBuild(story),1)
+        D = doc.canv._doc.idToObject
+        for i, (level, text, pageNum, key) in enumerate(toc._entries):
+            self.assertTrue(('(%d) Tj' % pageNum) in ''.join(D['FormXob.TOC0.%d' % i].stream))
+
 def makeSuite():
     return makeSuiteForClasses(TocTestCase)
 